@@ -0,0 +1,109 @@
+"""
+Budget threshold alerts, evaluated on write.
+
+A movement write already refreshes the category totals of the months it
+touched, in the same transaction (anomalies.py, category_month_totals). This
+in-transaction listener runs right after it and compares those totals with the
+budgets of the month: one joined query per touched month, no rescan of the
+movements and no polling. A budget write re-checks the current month.
+
+The first time a category reaches 80% and 100% of its limit in a month a
+notification is recorded; the unique key on notifications keeps it to once per
+month even with concurrent writers. With BUDGET_ALERT_EMAILS=1 every new alert
+is also mailed to the family, through a background job queued in the same
+transaction.
+"""
+import os
+from datetime import date
+
+from sqlalchemy import select, and_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+import anomalies  # registers the month totals listener first: alerts read its rows
+import changes, models, scheduler
+
+THRESHOLDS = (80, 100)
+KIND = "budget_threshold"
+EMAILS_ENABLED = os.getenv("BUDGET_ALERT_EMAILS", "0").lower() in ("1", "true", "yes")
+
+
+def _insert(db: Session):
+    """INSERT ... ON CONFLICT DO NOTHING for the session's database."""
+    dialect = postgresql if db.get_bind(models.Notification).dialect.name == "postgresql" else sqlite
+    return dialect.insert(models.Notification).on_conflict_do_nothing()
+
+
+def message(category: str, year: int, month: int, threshold: int, spent_cents: int, limit_cents: int) -> str:
+    amounts = f"{spent_cents / 100:.2f} € su {limit_cents / 100:.2f} €"
+    if threshold >= 100:
+        return f"Budget {category} superato per {month:02d}/{year}: {amounts}"
+    return f"Budget {category} al {threshold}% per {month:02d}/{year}: {amounts}"
+
+
+def check_month(db: Session, family_id: int, index: int):
+    """Record the thresholds crossed in month `index` (year * 12 + month - 1). Returns the new alerts."""
+    year, month = divmod(index, 12)
+    month += 1
+    spending = db.execute(
+        select(models.Budget.category, models.Budget.amount_cents, models.CategoryMonthTotal.expense_cents)
+        .join(models.CategoryMonthTotal, and_(
+            models.CategoryMonthTotal.family_id == models.Budget.family_id,
+            models.CategoryMonthTotal.category == models.Budget.category,
+            models.CategoryMonthTotal.month_index == index,
+        ))
+        .where(
+            models.Budget.family_id == family_id, # Filter by family
+            models.Budget.applies_in(month),
+            models.Budget.amount_cents > 0,
+        )
+    ).all()
+
+    rows = []
+    for category, limit_cents, spent_cents in spending:
+        for threshold in THRESHOLDS:
+            if spent_cents * 100 >= limit_cents * threshold:
+                rows.append(dict(
+                    family_id=family_id, kind=KIND, category=category, year=year, month=month,
+                    threshold=threshold, spent_cents=spent_cents, limit_cents=limit_cents,
+                    message=message(category, year, month, threshold, spent_cents, limit_cents),
+                    is_read=False,
+                ))
+    if not rows:
+        return []
+    # Already notified thresholds are skipped by the unique key
+    created = db.execute(
+        _insert(db).values(rows).returning(models.Notification.id, models.Notification.category, models.Notification.threshold)
+    ).all()
+    # Jumping past several thresholds at once alerts only for the highest one
+    highest = {}
+    for row in created:
+        if row.threshold > highest.get(row.category, (0, None))[0]:
+            highest[row.category] = (row.threshold, row.id)
+    superseded = [row.id for row in created if highest[row.category][1] != row.id]
+    if superseded:
+        db.execute(
+            models.Notification.__table__.update()
+            .where(models.Notification.id.in_(superseded))
+            .values(is_read=True)
+        )
+    alerts = [notification_id for _, notification_id in highest.values()]
+    if EMAILS_ENABLED:
+        for notification_id in alerts:
+            # family_id: with per-family tenancy the notification is in the family database
+            scheduler.enqueue(db, "send_budget_alert_email", {"notification_id": notification_id, "family_id": family_id})
+    return alerts
+
+
+def _on_change(db: Session, change: changes.Change):
+    current = anomalies.month_index(date.today())
+    if change.entity == changes.MOVEMENT and change.dates:
+        # Past months are closed: only the current and future months can still be acted on
+        for index in sorted({anomalies.month_index(day) for day in change.dates}):
+            if index >= current:
+                check_month(db, change.family_id, index)
+    elif change.entity == changes.BUDGET:
+        check_month(db, change.family_id, current)
+
+
+changes.listen(_on_change, in_transaction=True)
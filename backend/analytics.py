@@ -0,0 +1,203 @@
+"""
+Spending time series.
+
+A series is computed with one GROUP BY over a date-bucket expression, then laid
+out as dense, zero-filled arrays (one value per bucket of the requested range).
+Planned recurring occurrences are projected in Python (see projection.py) and
+added to the same buckets.
+
+Results are cached per family and query. A write invalidates only the cached
+series whose range contains one of the dates it touched (see changes.py). The
+cache is per process: with several workers, each one invalidates on its own
+writes only.
+"""
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import select, func, cast, Integer, literal
+from sqlalchemy.orm import Session
+
+import changes, models, projection
+from schemas import Money
+
+GRANULARITIES = ("day", "week", "month", "quarter", "year")
+GROUPS = {
+    "category": models.Movement.category,
+    "type": models.Movement.type,
+    "user_id": models.Movement.user_id,
+}
+MAX_BUCKETS = 3700  # ten years of days
+CACHE_MAX_ENTRIES = 512
+
+
+# ---------------------------------------------------------------------------
+# Buckets
+# ---------------------------------------------------------------------------
+
+def bucket_start(day: date, granularity: str) -> date:
+    """First day of the bucket containing `day` (weeks start on Monday)."""
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    if granularity == "quarter":
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    return date(day.year, 1, 1)
+
+
+_STEPS = {
+    "day": relativedelta(days=1),
+    "week": relativedelta(weeks=1),
+    "month": relativedelta(months=1),
+    "quarter": relativedelta(months=3),
+    "year": relativedelta(years=1),
+}
+
+
+def buckets(start: date, end: date, granularity: str):
+    first = bucket_start(start, granularity)
+    result = []
+    # Index-based stepping keeps month ends from drifting (31 Jan + 1 month + 1 month)
+    while True:
+        current = first + _STEPS[granularity] * len(result)
+        if current > end:
+            return result
+        result.append(current)
+
+
+def bucket_expression(column, granularity: str, dialect: str):
+    """SQL expression giving the first day of the bucket as 'YYYY-MM-DD'."""
+    if dialect == "postgresql":
+        unit = "week" if granularity == "week" else granularity
+        return func.to_char(func.date_trunc(unit, column), "YYYY-MM-DD")
+    # SQLite
+    if granularity == "day":
+        return func.date(column)
+    if granularity == "week":
+        return func.date(column, "-6 days", "weekday 1")  # Monday on or before the date
+    if granularity == "month":
+        return func.strftime("%Y-%m-01", column)
+    if granularity == "quarter":
+        months_back = (cast(func.strftime("%m", column), Integer) - 1) % 3
+        return func.date(column, "start of month", func.printf("-%d months", months_back))
+    return func.strftime("%Y-01-01", column)
+
+
+# ---------------------------------------------------------------------------
+# Series
+# ---------------------------------------------------------------------------
+
+def compute_series(db: Session, family_id: int, granularity: str = "month", start: date = None,
+                   end: date = None, group_by: str = None, split: bool = False, type: str = "EXPENSE"):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    if group_by is not None and group_by not in GROUPS:
+        raise ValueError(f"group_by must be one of {', '.join(GROUPS)}")
+    end = end or date.today()
+    start = start or bucket_start(end - relativedelta(years=1) + timedelta(days=1), granularity)
+    if start > end:
+        raise ValueError("start must not be after end")
+    keys = buckets(start, end, granularity)
+    if len(keys) > MAX_BUCKETS:
+        raise ValueError(f"Too many buckets ({len(keys)}), max {MAX_BUCKETS}: use a coarser granularity")
+    if group_by == "type":
+        type = None  # both types, one series each
+
+    cache_key = (family_id, date.today(), granularity, start, end, group_by, split, type)
+    cached, generation = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    bucket = bucket_expression(models.Movement.date, granularity, db.get_bind().dialect.name).label("bucket")
+    group = GROUPS[group_by].label("group") if group_by else literal("total").label("group")
+    stmt = (
+        select(bucket, group, models.Movement.is_planned, func.sum(models.Movement.amount_cents))
+        .where(
+            models.Movement.family_id == family_id, # Filter by family
+            models.Movement.date.between(start, end),
+        )
+        .group_by(bucket, group, models.Movement.is_planned)
+    )
+    if type:
+        stmt = stmt.where(models.Movement.type == type)
+
+    # group -> (actual cents per bucket, planned cents per bucket)
+    index = {key: i for i, key in enumerate(keys)}
+    series = {}
+
+    def add(group_value, bucket_day, is_planned, cents):
+        actual, planned = series.setdefault(group_value, ([0] * len(keys), [0] * len(keys)))
+        (planned if is_planned else actual)[index[bucket_day]] += cents
+
+    for bucket_text, group_value, is_planned, cents in db.execute(stmt):
+        add(group_value, date.fromisoformat(bucket_text), is_planned, cents or 0)
+
+    # Planned recurring occurrences are always expenses
+    if type in (None, "EXPENSE"):
+        for occurrence in projection.project(db, family_id, start, end):
+            group_value = getattr(occurrence, group_by) if group_by else "total"
+            add(group_value, bucket_start(occurrence.date, granularity), True, occurrence.amount_cents)
+
+    result = {
+        "granularity": granularity,
+        "start": start,
+        "end": end,
+        "group_by": group_by,
+        "buckets": keys,
+        "series": [
+            _series_entry(group_value, actual, planned, split)
+            for group_value, (actual, planned) in sorted(series.items(), key=lambda item: str(item[0]))
+        ],
+    }
+    _cache_put(cache_key, result, generation)
+    return result
+
+
+def _series_entry(key, actual, planned, split):
+    entry = {"key": key, "total": [Money.from_cents(a + p) for a, p in zip(actual, planned)]}
+    if split:
+        entry["actual"] = [Money.from_cents(cents) for cents in actual]
+        entry["planned"] = [Money.from_cents(cents) for cents in planned]
+    return entry
+
+
+# ---------------------------------------------------------------------------
+# Cache
+# ---------------------------------------------------------------------------
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+# Bumped on every invalidation of a family: a series computed while a write
+# committed is not stored
+_generations = {}
+
+
+def _cache_get(key):
+    with _cache_lock:
+        result = _cache.get(key)
+        if result is not None:
+            _cache.move_to_end(key)
+        return result, _generations.get(key[0], 0)
+
+
+def _cache_put(key, result, generation):
+    with _cache_lock:
+        if _generations.get(key[0], 0) != generation:
+            return
+        _cache[key] = result
+        while len(_cache) > CACHE_MAX_ENTRIES:
+            _cache.popitem(last=False)
+
+
+@changes.listen
+def _invalidate(change: changes.Change):
+    if change.entity not in (changes.MOVEMENT, changes.RECURRING):
+        return
+    with _cache_lock:
+        _generations[change.family_id] = _generations.get(change.family_id, 0) + 1
+        for key in [key for key in _cache if key[0] == change.family_id and change.touches(key[3], key[4])]:
+            del _cache[key]
@@ -0,0 +1,280 @@
+"""
+Spending anomalies per category.
+
+Two derived tables back the detector:
+- category_month_totals: actual expenses per family, category and month. A
+  movement write refreshes the months it touched, inside the same transaction.
+- category_stats: per family and category, the EWMA mean and variance of the
+  monthly totals of complete months (months without expenses count as 0).
+
+A write in the current month only refreshes that month's totals. A write in a
+past month refolds the family's statistics from its monthly totals (a few
+hundred numbers at most), never from the movements. Reading the anomalies of
+the current month is then two small queries; if the month rolled over since
+the last fold, the missing months are folded on the fly from the totals too.
+
+`backfill()` builds both tables for existing data with one grouped query and
+an EWMA computed on NumPy arrays across every family and category at once.
+
+Usage:
+    python anomalies.py backfill
+"""
+import math
+import sys
+from datetime import date
+
+import numpy as np
+from sqlalchemy import select, delete, insert, func
+from sqlalchemy.orm import Session
+
+import changes, models
+from database import unit_of_work
+from schemas import Money
+
+ALPHA = 0.3              # weight of the newest month in the EWMA
+MIN_MONTHS = 3           # history needed before a category can be anomalous
+MIN_RATIO = 1.5          # this month is at least 1.5x the usual...
+MIN_SIGMAS = 2.0         # ...and 2 standard deviations above it...
+MIN_EXCESS_CENTS = 2000  # ...and at least 20 EUR more
+
+
+def month_index(day: date) -> int:
+    return day.year * 12 + day.month - 1
+
+
+def month_bounds(index: int):
+    year, month = divmod(index, 12)
+    start = date(year, month + 1, 1)
+    end = date(year + (month + 1) // 12, (month + 1) % 12 + 1, 1)
+    return start, end  # end exclusive
+
+
+# ---------------------------------------------------------------------------
+# EWMA
+# ---------------------------------------------------------------------------
+
+def ewma(matrix: np.ndarray, first: np.ndarray):
+    """
+    EWMA over the columns (months) of `matrix`, one row per series, starting at
+    column first[row]. Returns (mean, variance, months) per row.
+    """
+    rows, columns = matrix.shape
+    mean = np.zeros(rows)
+    variance = np.zeros(rows)
+    count = np.zeros(rows, dtype=np.int64)
+    for column in range(columns):
+        x = matrix[:, column]
+        started = first <= column
+        fresh = started & (count == 0)
+        diff = x - mean
+        increment = ALPHA * diff
+        # Incremental EWMA variance (West / Finch): var = (1 - a) * (var + diff * a * diff)
+        new_mean = np.where(fresh, x, mean + increment)
+        new_variance = np.where(fresh, 0.0, (1 - ALPHA) * (variance + diff * increment))
+        mean = np.where(started, new_mean, mean)
+        variance = np.where(started, new_variance, variance)
+        count = count + started
+    return mean, variance, count
+
+
+def _states(totals, until: int):
+    """
+    Statistics folded up to month `until` from (key, month_index, cents) rows.
+    Returns {key: (first_month, months, mean, variance)}.
+    """
+    totals = [row for row in totals if row[1] <= until]
+    if not totals:
+        return {}
+    keys = sorted({row[0] for row in totals}, key=str)
+    position = {key: i for i, key in enumerate(keys)}
+    origin = min(row[1] for row in totals)
+    matrix = np.zeros((len(keys), until - origin + 1))
+    rows = np.array([position[row[0]] for row in totals])
+    columns = np.array([row[1] - origin for row in totals])
+    np.add.at(matrix, (rows, columns), np.array([row[2] for row in totals], dtype=np.float64))
+    first = np.full(len(keys), matrix.shape[1])
+    np.minimum.at(first, rows, columns)
+
+    mean, variance, count = ewma(matrix, first)
+    return {
+        key: (origin + int(first[i]), int(count[i]), float(mean[i]), float(variance[i]))
+        for i, key in enumerate(keys)
+    }
+
+
+# ---------------------------------------------------------------------------
+# Incremental maintenance
+# ---------------------------------------------------------------------------
+
+def refresh_month_totals(db: Session, family_id: int, index: int):
+    """Recompute one month's totals of a family from its movements (indexed range)."""
+    start, end = month_bounds(index)
+    db.execute(delete(models.CategoryMonthTotal).where(
+        models.CategoryMonthTotal.family_id == family_id,
+        models.CategoryMonthTotal.month_index == index,
+    ))
+    db.execute(
+        insert(models.CategoryMonthTotal).from_select(
+            ["family_id", "category", "month_index", "expense_cents"],
+            select(models.Movement.family_id, models.Movement.category, index, func.sum(models.Movement.amount_cents))
+            .where(
+                models.Movement.family_id == family_id,
+                models.Movement.date >= start,
+                models.Movement.date < end,
+                models.Movement.type == "EXPENSE",
+                models.Movement.is_planned == False,
+                models.Movement.category.is_not(None),
+            )
+            .group_by(models.Movement.family_id, models.Movement.category)
+        )
+    )
+
+
+def refold(db: Session, family_id: int, until: int):
+    """Recompute a family's statistics up to month `until` from its monthly totals."""
+    totals = db.execute(
+        select(models.CategoryMonthTotal.category, models.CategoryMonthTotal.month_index,
+               models.CategoryMonthTotal.expense_cents)
+        .where(models.CategoryMonthTotal.family_id == family_id)
+    ).all()
+    db.execute(delete(models.CategoryStats).where(models.CategoryStats.family_id == family_id))
+    rows = [
+        dict(family_id=family_id, category=category, first_month=first, last_month=until,
+             months=count, mean_cents=mean, variance=variance)
+        for category, (first, count, mean, variance) in _states(totals, until).items()
+    ]
+    if rows:
+        db.execute(insert(models.CategoryStats), rows)
+
+
+def _on_movement_change(db: Session, change: changes.Change):
+    if change.entity != changes.MOVEMENT or not change.dates:
+        return
+    touched = sorted({month_index(day) for day in change.dates})
+    for index in touched:
+        refresh_month_totals(db, change.family_id, index)
+    current = month_index(date.today())
+    if touched[0] < current:
+        # A complete month changed: its statistics are stale from there on
+        refold(db, change.family_id, current - 1)
+
+
+changes.listen(_on_movement_change, in_transaction=True)
+
+
+# ---------------------------------------------------------------------------
+# Detection
+# ---------------------------------------------------------------------------
+
+def detect(db: Session, family_id: int, year: int = None, month: int = None, today: date = None):
+    """Categories whose spending in the month is well above their usual level."""
+    if (year is None) != (month is None):
+        raise ValueError("year and month must be given together")
+    today = today or date.today()
+    target = (year * 12 + month - 1) if year is not None else month_index(today)
+
+    stats = {
+        row.category: (row.first_month, row.months, row.mean_cents, row.variance)
+        for row in db.execute(
+            select(models.CategoryStats).where(
+                models.CategoryStats.family_id == family_id,
+                models.CategoryStats.last_month == target - 1,
+            )
+        ).scalars()
+    }
+    if stats:
+        totals = db.execute(
+            select(models.CategoryMonthTotal.category, models.CategoryMonthTotal.expense_cents).where(
+                models.CategoryMonthTotal.family_id == family_id,
+                models.CategoryMonthTotal.month_index == target,
+            )
+        ).all()
+    else:
+        # Statistics folded up to another month (month rolled over, or a past month
+        # was asked): fold from the monthly totals, still without touching movements
+        history = db.execute(
+            select(models.CategoryMonthTotal.category, models.CategoryMonthTotal.month_index,
+                   models.CategoryMonthTotal.expense_cents)
+            .where(models.CategoryMonthTotal.family_id == family_id, models.CategoryMonthTotal.month_index <= target)
+        ).all()
+        stats = _states(history, target - 1)
+        totals = [(category, cents) for category, index, cents in history if index == target]
+
+    anomalies = []
+    for category, cents in totals:
+        if category not in stats:
+            continue
+        first, count, mean, variance = stats[category]
+        std = math.sqrt(max(variance, 0.0))
+        if count < MIN_MONTHS or cents < mean * MIN_RATIO or cents - mean < max(MIN_SIGMAS * std, MIN_EXCESS_CENTS):
+            continue
+        anomalies.append({
+            "category": category,
+            "amount": Money.from_cents(cents),
+            "usual": Money.from_cents(round(mean)),
+            "ratio": round(cents / mean, 1) if mean > 0 else None,
+            "z_score": round((cents - mean) / std, 1) if std > 0 else None,
+            "months_of_history": count,
+        })
+    anomalies.sort(key=lambda item: (item["ratio"] is None, -(item["ratio"] or 0)))
+    year_num, month_num = divmod(target, 12)
+    return {"period": {"month": month_num + 1, "year": year_num}, "anomalies": anomalies}
+
+
+# ---------------------------------------------------------------------------
+# Batch
+# ---------------------------------------------------------------------------
+
+def fold_all(db: Session, today: date = None):
+    """Bring every family's statistics up to the last complete month."""
+    until = month_index(today or date.today()) - 1
+    families = db.execute(
+        select(models.CategoryStats.family_id).where(models.CategoryStats.last_month < until).distinct()
+    ).scalars().all()
+    with unit_of_work(db):
+        for family_id in families:
+            refold(db, family_id, until)
+    return len(families)
+
+
+def backfill(db: Session, today: date = None):
+    """Build monthly totals and statistics for all existing data in one vectorised pass."""
+    until = month_index(today or date.today()) - 1
+    year_of = func.extract("year", models.Movement.date)
+    month_of = func.extract("month", models.Movement.date)
+    rows = db.execute(
+        select(models.Movement.family_id, models.Movement.category, year_of, month_of, func.sum(models.Movement.amount_cents))
+        .where(
+            models.Movement.type == "EXPENSE",
+            models.Movement.is_planned == False,
+            models.Movement.category.is_not(None),
+        )
+        .group_by(models.Movement.family_id, models.Movement.category, year_of, month_of)
+    ).all()
+    totals = [((family_id, category), int(year) * 12 + int(month) - 1, cents) for family_id, category, year, month, cents in rows]
+
+    with unit_of_work(db):
+        db.execute(delete(models.CategoryMonthTotal))
+        db.execute(delete(models.CategoryStats))
+        if totals:
+            db.execute(insert(models.CategoryMonthTotal), [
+                dict(family_id=key[0], category=key[1], month_index=index, expense_cents=cents)
+                for key, index, cents in totals
+            ])
+        states = _states(totals, until)
+        if states:
+            db.execute(insert(models.CategoryStats), [
+                dict(family_id=key[0], category=key[1], first_month=first, last_month=until,
+                     months=count, mean_cents=mean, variance=variance)
+                for key, (first, count, mean, variance) in states.items()
+            ])
+    return len(totals)
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    if len(sys.argv) > 1 and sys.argv[1] == "backfill":
+        with SessionLocal() as session:
+            print(f"{backfill(session)} category-months processed")
+    else:
+        print(__doc__)
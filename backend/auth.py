@@ -1,10 +1,13 @@
 from datetime import datetime, timedelta
 from typing import Optional
+import secrets
+import threading
+import time
 from jose import JWTError, jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
-import models, schemas, crud
+import models, schemas, crud, tenancy, querystats
 from database import get_db
 from hashing import verify_password, get_password_hash
 import os
@@ -14,6 +17,12 @@ SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# /api/events: EventSource cannot send headers, and the access token must not
+# end up in URLs (access logs, proxies, browser history). The client trades it
+# for a short-lived, single-use stream ticket instead.
+STREAM_TICKET_AUDIENCE = "events"
+STREAM_TICKET_SECONDS = 30
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/token")
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -26,7 +35,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def user_from_token(token: str, db: Session) -> models.User:
+    """The user a bearer token belongs to; binds `db` to the user's family."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -41,11 +51,66 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = crud.get_user_by_username(db, username=token_data.username)
+    return _bind_user(db, token_data.username, credentials_exception)
+
+def _bind_user(db: Session, username: str, credentials_exception: HTTPException) -> models.User:
+    user = crud.get_user_by_username(db, username=username)
     if user is None:
         raise credentials_exception
+
+    # Per-family tenancy: route family-owned tables to the family database
+    tenancy.bind_session(db, user.family_id)
+    querystats.set_family(user.family_id)
     return user
 
+def create_stream_ticket(user: models.User) -> str:
+    return create_access_token(
+        {"sub": user.username, "aud": STREAM_TICKET_AUDIENCE, "jti": secrets.token_urlsafe(16)},
+        expires_delta=timedelta(seconds=STREAM_TICKET_SECONDS),
+    )
+
+_redeemed_tickets = {}  # jti -> expiry (epoch seconds), kept until the ticket expires anyway
+_tickets_lock = threading.Lock()
+
+def redeem_stream_ticket(ticket: str, db: Session) -> models.User:
+    """
+    The user a stream ticket was issued to; binds `db` to the user's family.
+    A ticket is accepted once: replays within its lifetime are refused by the
+    worker that redeemed it (each worker keeps its own list).
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired stream ticket",
+    )
+    try:
+        payload = jwt.decode(ticket, SECRET_KEY, algorithms=[ALGORITHM], audience=STREAM_TICKET_AUDIENCE)
+    except JWTError:
+        raise credentials_exception
+    jti, username = payload.get("jti"), payload.get("sub")
+    # An access token (no audience) is not a ticket
+    if payload.get("aud") != STREAM_TICKET_AUDIENCE or not jti or not username:
+        raise credentials_exception
+
+    now = time.time()
+    with _tickets_lock:
+        for used, expires in list(_redeemed_tickets.items()):
+            if expires < now:
+                del _redeemed_tickets[used]
+        if jti in _redeemed_tickets:
+            raise credentials_exception
+        _redeemed_tickets[jti] = payload["exp"]
+    return _bind_user(db, username, credentials_exception)
+
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    batch_user = request.scope.get("batch_user")
+    if batch_user is not None:
+        # Sub-request of /api/batch: the token was checked once for the whole batch
+        user = db.merge(batch_user, load=False)
+        tenancy.bind_session(db, user.family_id)
+        querystats.set_family(user.family_id)
+        return user
+    return user_from_token(token, db)
+
 async def get_current_active_user(current_user: models.User = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
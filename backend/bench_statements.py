@@ -0,0 +1,89 @@
+"""
+Micro-benchmark: per-call overhead of the hot crud lookups, ORM Query API
+(rebuilt on every call) versus the cached lambda statements used by crud.
+
+Usage: python bench_statements.py [calls]
+"""
+import sys
+import time
+import warnings
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, extract
+from sqlalchemy.pool import StaticPool
+
+from database import Base, SessionLocal
+import crud, models
+
+warnings.filterwarnings("ignore")
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+Base.metadata.create_all(bind=engine)
+
+
+# Previous implementations, kept here as the baseline
+def query_user_by_username(db, username):
+    return db.query(models.User).filter(models.User.username == username).first()
+
+def query_movements(db, family_id, skip=0, limit=20, month=None, year=None):
+    query = db.query(models.Movement).filter(models.Movement.family_id == family_id)
+    if month is not None and year is not None:
+        query = query.filter(
+            extract('year', models.Movement.date) == year,
+            extract('month', models.Movement.date) == month
+        )
+    return query.order_by(models.Movement.date.desc(), models.Movement.id.desc()).offset(skip).limit(limit).all()
+
+def query_categories(db, family_id):
+    return db.query(models.Category).filter(models.Category.family_id == family_id).all()
+
+def query_budgets(db, family_id):
+    return db.query(models.Budget).filter(models.Budget.family_id == family_id).all()
+
+
+def seed(db):
+    db.add(models.Family(id=1, name="Bench"))
+    db.add(models.User(username="bench", hashed_password="x", family_id=1))
+    for i in range(8):
+        db.add(models.Category(name=f"Cat {i}", family_id=1))
+        db.add(models.Budget(category=f"Cat {i}", amount=100, family_id=1))
+    start = date(2024, 1, 1)
+    for i in range(500):
+        db.add(models.Movement(type="EXPENSE", date=start + timedelta(days=i % 365), amount=10,
+                               category=f"Cat {i % 8}", family_id=1))
+    db.commit()
+
+
+def timed(label, fn, calls):
+    fn()  # warm up: the first call compiles and caches
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    per_call = (time.perf_counter() - start) / calls * 1e6
+    print(f"  {label:<10} {per_call:8.1f} µs/call")
+    return per_call
+
+
+def main(calls):
+    db = SessionLocal(bind=engine)
+    seed(db)
+    cases = [
+        ("get_user_by_username",
+         lambda: query_user_by_username(db, "bench"), lambda: crud.get_user_by_username(db, "bench")),
+        ("get_movements (month)",
+         lambda: query_movements(db, 1, month=3, year=2024), lambda: crud.get_movements(db, 1, limit=20, month=3, year=2024)),
+        ("get_categories",
+         lambda: query_categories(db, 1), lambda: crud.get_categories(db, 1)),
+        ("get_budgets",
+         lambda: query_budgets(db, 1), lambda: crud.get_budgets(db, 1)),
+    ]
+    for name, before, after in cases:
+        print(name)
+        t_before = timed("before", before, calls)
+        t_after = timed("after", after, calls)
+        print(f"  saved      {t_before - t_after:8.1f} µs/call ({(1 - t_after / t_before) * 100:.0f}%)")
+    db.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,72 @@
+"""
+Write notifications.
+
+crud publishes a Change for every write to family data. Derived data (caches,
+statistics, live feeds) subscribes here instead of being wired into crud:
+
+- `listen(fn, in_transaction=True)`: fn(db, change) runs immediately, inside the
+  writer's transaction, so derived rows commit or roll back with the write.
+- `listen(fn)`: fn(change) runs once the transaction has committed; changes of
+  a rolled back transaction are dropped.
+"""
+import traceback
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+MOVEMENT = "movement"
+RECURRING = "recurring"
+BUDGET = "budget"
+CATEGORY = "category"
+GOAL = "goal"
+
+
+@dataclass(frozen=True)
+class Change:
+    family_id: int
+    entity: str
+    action: str  # create, update, delete
+    ids: Tuple[int, ...] = ()
+    # Movement dates touched by the write (old and new); None when any date may be affected
+    dates: Optional[Tuple[date, ...]] = ()
+
+    def touches(self, start: date = None, end: date = None) -> bool:
+        """True if the change may affect data dated within [start, end]."""
+        if self.dates is None:
+            return True
+        return any((start is None or d >= start) and (end is None or d <= end) for d in self.dates)
+
+
+_in_transaction = []
+_after_commit = []
+
+
+def listen(fn, in_transaction: bool = False):
+    (_in_transaction if in_transaction else _after_commit).append(fn)
+    return fn
+
+
+def publish(db: Session, change: Change):
+    for fn in _in_transaction:
+        fn(db, change)
+    db.info.setdefault("pending_changes", []).append(change)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch(session):
+    pending = session.info.pop("pending_changes", None)
+    for change in pending or ():
+        for fn in _after_commit:
+            try:
+                fn(change)
+            except Exception:
+                # The write is committed: a failing subscriber must not turn it into an error
+                traceback.print_exc()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("pending_changes", None)
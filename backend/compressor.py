@@ -0,0 +1,137 @@
+"""
+HTTP response compression.
+
+CompressionMiddleware compresses JSON, text and Arrow responses of at least
+COMPRESSION_MIN_BYTES with the best encoding the client accepts
+(Accept-Encoding, q-values honoured):
+
+- br     if the `brotli` package is installed
+- zstd   if the `zstandard` package is installed
+- gzip   always
+
+Responses that already carry a Content-Encoding are left alone: that is how
+responsecache.py serves the compressed variants it keeps next to each cached
+body, so a cache hit is never recompressed. A response compressed here gets
+the encoding added to its ETag (`"abc"` -> `"abc-gzip"`), as responsecache.py
+does for its variants. Only responses with a
+Content-Length (complete in memory upstream) are compressed; streams without
+one, like the Server-Sent Events of /api/events, pass through unbuffered.
+"""
+import gzip
+import os
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+ENABLED = os.getenv("COMPRESSION_ENABLED", "1").lower() not in ("0", "false", "no")
+MIN_SIZE = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+
+# Levels tuned for dynamic responses: most of the gain for little CPU
+_COMPRESSORS = {"gzip": lambda body: gzip.compress(body, compresslevel=6, mtime=0)}
+if zstandard is not None:
+    _COMPRESSORS["zstd"] = lambda body: zstandard.ZstdCompressor(level=3).compress(body)
+if brotli is not None:
+    _COMPRESSORS["br"] = lambda body: brotli.compress(body, quality=4)
+
+# Server preference when the client accepts several with the same q-value
+PREFERENCE = [encoding for encoding in ("br", "zstd", "gzip") if encoding in _COMPRESSORS]
+
+COMPRESSIBLE_TYPES = ("application/json", "application/javascript", "application/vnd.apache.arrow.stream", "text/")
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """The encoding to use for this Accept-Encoding header, None for identity."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    wildcard = weights.get("*", 0.0)
+    candidates = [(weights.get(encoding, wildcard), -rank, encoding) for rank, encoding in enumerate(PREFERENCE)]
+    q, _, encoding = max(candidates, default=(0.0, 0, None))
+    return encoding if q > 0 else None
+
+
+def compressible(content_type: Optional[str]) -> bool:
+    content_type = (content_type or "").lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith("text/event-stream")
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    return _COMPRESSORS[encoding](body)
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """The ETag of the `encoding` variant: each encoding is its own representation."""
+    return etag[:-1] + "-" + encoding + '"' if etag.endswith('"') else etag
+
+
+def _add_vary(headers):
+    vary = [value for name, value in headers if name == b"vary"]
+    if not any(b"accept-encoding" in value.lower() for value in vary):
+        headers.append((b"vary", b"Accept-Encoding"))
+
+
+class CompressionMiddleware:
+    def __init__(self, app, min_size: int = MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate(dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1"))
+        start = None
+        chunks = []
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                headers = [(name.lower(), value) for name, value in message.get("headers", [])]
+                values = dict(headers)
+                if (b"content-encoding" in values or b"content-length" not in values
+                        or not compressible(values.get(b"content-type", b"").decode("latin-1"))):
+                    # Already encoded, streamed (no length: SSE, generators) or binary: as is
+                    await send(message)
+                    return
+                start = dict(message, headers=headers)  # held until the whole body is in
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            body = b"".join(chunks)
+            headers = start["headers"]
+            _add_vary(headers)
+            if encoding is not None and len(body) >= self.min_size:
+                body = compress(body, encoding)
+                # A validator of the plain body must not validate the compressed one
+                headers = [
+                    (name, encoded_etag(value.decode("latin-1"), encoding).encode("latin-1") if name == b"etag" else value)
+                    for name, value in headers if name != b"content-length"
+                ]
+                headers += [(b"content-encoding", encoding.encode()), (b"content-length", str(len(body)).encode())]
+            await send(dict(start, headers=headers))
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,85 @@
+"""
+Shared test fixtures: an in-memory database per test module, a session on
+it, and factories for the rows most tests start from.
+"""
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+from database import Base, SessionLocal
+import crud, refcache, schemas, tenancy
+
+
+@pytest.fixture(autouse=True)
+def _clear_reference_cache():
+    # Every test module has its own in-memory database, with family ids starting at 1
+    refcache.clear()
+    yield
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = SessionLocal(bind=engine)
+    yield session
+    session.close()
+
+
+@pytest.fixture(scope="module")
+def override_get_db(engine):
+    """A get_db replacement on the test database, for app.dependency_overrides."""
+    def get_test_db():
+        session = SessionLocal(bind=engine)
+        try:
+            yield session
+        finally:
+            session.close()
+    return get_test_db
+
+
+@pytest.fixture
+def family(db, request):
+    return crud.create_family(db, schemas.FamilyCreate(name=request.node.name))
+
+
+@pytest.fixture
+def add_movement(db):
+    """add_movement(family_id, amount, day=..., category=..., type=..., user_id=...) -> the created movement."""
+    def add(family_id, amount, day=date(2025, 3, 1), category="Casa", type="EXPENSE", user_id=1, **fields):
+        movement = schemas.MovementCreate(type=type, date=day, amount=amount, category=category, **fields)
+        return crud.create_movement(db, movement, user_id=user_id, family_id=family_id)
+    return add
+
+
+@pytest.fixture
+def statements(engine):
+    """The SQL statements run on the test database during the test."""
+    executed = []
+
+    def record(conn, cursor, sql, *args):
+        executed.append(sql)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(engine, "before_cursor_execute", record)
+
+
+@pytest.fixture
+def per_family(monkeypatch, tmp_path):
+    """TENANCY_MODE=per_family, with the family databases in tmp_path. Yields the engine router."""
+    monkeypatch.setattr(tenancy, "TENANCY_MODE", "per_family")
+    monkeypatch.setattr(tenancy, "TENANTS_DIR", str(tmp_path))
+    router = tenancy.TenantEngineRouter()
+    monkeypatch.setattr(tenancy, "router", router)
+    yield router
+    for family_id in router.open_engines():
+        router.dispose(family_id)
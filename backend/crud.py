@@ -1,15 +1,41 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract
-import models, schemas
-from datetime import datetime
+from sqlalchemy import func, extract, insert, update, delete, select, bindparam, and_, case
+import models, schemas, recurrence, projection, changes, refcache
+from datetime import datetime, date
+import calendar
+from database import unit_of_work
 from hashing import get_password_hash
 
+# Statement cache for hot lookups: each statement is built once, with bound parameters
+# for the values, so its compiled SQL is reused instead of being rebuilt on every call.
+_statements = {}
+
+def _cached_statement(key, build):
+    stmt = _statements.get(key)
+    if stmt is None:
+        stmt = _statements[key] = build()
+    return stmt
+
+def _by_family(model):
+    return _cached_statement(
+        (model.__name__, "family"),
+        lambda: select(model).where(model.family_id == bindparam("family_id"))
+    )
+
 # Users
+def _changed(db: Session, family_id: int, entity: str, action: str, ids=(), dates=()):
+    """Publish a write to family data (see changes.py); call inside the unit of work."""
+    changes.publish(db, changes.Change(family_id, entity, action, tuple(ids), tuple(dates) if dates is not None else None))
+
 def get_user(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.id == user_id).first()
+    stmt = _cached_statement("user_by_id", lambda: select(models.User).where(models.User.id == bindparam("user_id")))
+    return db.execute(stmt, {"user_id": user_id}).scalars().first()
 
 def get_user_by_username(db: Session, username: str):
-    return db.query(models.User).filter(models.User.username == username).first()
+    stmt = _cached_statement(
+        "user_by_username", lambda: select(models.User).where(models.User.username == bindparam("username"))
+    )
+    return db.execute(stmt, {"username": username}).scalars().first()
 
 def create_user(db: Session, user: schemas.UserCreate, is_superuser: bool = False):
     hashed_password = get_password_hash(user.password)
@@ -22,9 +48,8 @@ def create_user(db: Session, user: schemas.UserCreate, is_superuser: bool = Fals
         is_superuser=is_superuser,
         family_id=user.family_id # NEW
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    with unit_of_work(db):
+        db.add(db_user)
     return db_user
 
 def get_users(db: Session, skip: int = 0, limit: int = 100, family_id: int = None): # NEW family_id
@@ -34,91 +59,145 @@ def get_users(db: Session, skip: int = 0, limit: int = 100, family_id: int = Non
     return query.offset(skip).limit(limit).all()
 
 def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate):
-    db_user = get_user(db, user_id)
-    if not db_user:
-        return None
-    
-    if user_update.username is not None:
-        db_user.username = user_update.username
-    if user_update.email is not None:
-        db_user.email = user_update.email
-    if user_update.first_name is not None:
-        db_user.first_name = user_update.first_name
-    if user_update.last_name is not None:
-        db_user.last_name = user_update.last_name
+    values = {}
+    for field in ["username", "email", "first_name", "last_name", "is_active", "is_superuser", "family_id"]:
+        value = getattr(user_update, field)
+        if value is not None:
+            values[field] = value
     if user_update.password is not None:
-        db_user.hashed_password = get_password_hash(user_update.password)
-    if user_update.is_active is not None:
-        db_user.is_active = user_update.is_active
-    if user_update.is_superuser is not None:
-        db_user.is_superuser = user_update.is_superuser
-    if user_update.family_id is not None: # NEW
-        db_user.family_id = user_update.family_id
-        
-    db.commit()
-    db.refresh(db_user)
-    return db_user
+        values["hashed_password"] = get_password_hash(user_update.password)
+
+    if not values:
+        return get_user(db, user_id)
+
+    with unit_of_work(db):
+        return db.execute(
+            update(models.User).where(models.User.id == user_id).values(**values).returning(models.User)
+        ).scalars().first()
 
 def delete_user(db: Session, user_id: int):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
-    if db_user:
-        db.delete(db_user)
-        db.commit()
-    return db_user
+    with unit_of_work(db):
+        return db.execute(
+            delete(models.User).where(models.User.id == user_id).returning(models.User)
+        ).scalars().first()
 
 # Families (NEW)
 def create_family(db: Session, family: schemas.FamilyCreate):
     db_family = models.Family(name=family.name)
-    db.add(db_family)
-    db.commit()
-    db.refresh(db_family)
+    with unit_of_work(db):
+        db.add(db_family)
     return db_family
 
 def get_families(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Family).offset(skip).limit(limit).all()
 
 def get_family(db: Session, family_id: int):
-    return db.query(models.Family).filter(models.Family.id == family_id).first()
+    stmt = _cached_statement("family_by_id", lambda: select(models.Family).where(models.Family.id == bindparam("family_id")))
+    return db.execute(stmt, {"family_id": family_id}).scalars().first()
 
 # Movements
+# Columns of a movement as plain rows, named and ordered like schemas.Movement (see fastjson.py)
+MOVEMENT_ROW = (
+    models.Movement.type, models.Movement.date, models.Movement.amount.label("amount"),
+    models.Movement.category, models.Movement.description, models.Movement.is_planned,
+    models.Movement.is_confirmed, models.Movement.from_recurring_id, models.Movement.id,
+    models.Movement.created_at, models.Movement.user_id, models.Movement.family_id,
+    models.Movement.created_by_user_id, models.Movement.last_modified_by_user_id,
+    models.Movement.last_modified_at,
+)
+MOVEMENT_KEYS = tuple(column.key for column in MOVEMENT_ROW)
+_MOVEMENT_COLUMNS = dict(zip(MOVEMENT_KEYS, MOVEMENT_ROW))
+
 def get_movements(db: Session, family_id: int, skip: int = 0, limit: int = 100, 
                   month: int = None, year: int = None, 
                   start_date: date = None, end_date: date = None,
                   category: str = None, type: str = None,
-                  include_planned: bool = True): # NEW family_id
-    query = db.query(models.Movement).filter(models.Movement.family_id == family_id) # Filter by family
+                  include_planned: bool = True, as_rows: bool = False, fields: tuple = None): # NEW family_id
+    """
+    Movements as ORM objects, or as MOVEMENT_ROW tuples with as_rows (no ORM loading).
+    With as_rows, `fields` (keys of MOVEMENT_KEYS) selects only those columns, in that order,
+    followed by date and id when missing (needed to merge the planned occurrences).
+    """
+    # One cached statement per combination of active filters; unused parameters are ignored
+    filters = (
+        bool(start_date), bool(end_date), month is not None and year is not None,
+        bool(category), bool(type), not include_planned,
+    )
+    stmt = _cached_statement(("movements", as_rows) + filters,
+                             lambda: _build_movements_statement(*filters, columns=MOVEMENT_ROW if as_rows else None))
+    keys = MOVEMENT_KEYS
+    if as_rows and fields and tuple(fields) != MOVEMENT_KEYS:
+        keys = tuple(fields) + tuple(key for key in ("date", "id") if key not in fields)
+        stmt = stmt.with_only_columns(*(_MOVEMENT_COLUMNS[key] for key in keys))
+    fetch = (lambda params: db.execute(stmt, params).all()) if as_rows else (lambda params: db.execute(stmt, params).scalars().all())
+    params = {
+        "family_id": family_id, "skip": skip, "limit": limit,
+        "start_date": start_date, "end_date": end_date,
+        "month": month, "year": year,
+        "category": category, "type": type,
+    }
+    if not include_planned or (type and type != "EXPENSE"):
+        return fetch(params)
+
+    # Merge the projected recurring occurrences of the period, then page the merged list
+    rows = fetch({**params, "skip": 0, "limit": skip + limit})
+    period_start, period_end = start_date, end_date
+    if month is not None and year is not None:
+        month_start, month_end = _month_bounds(year, month)
+        period_start = max(period_start, month_start) if period_start else month_start
+        period_end = min(period_end, month_end) if period_end else month_end
+    projected = projection.project(db, family_id, period_start, period_end, category)
+    if not projected:
+        return rows[skip:]
+    merged = sorted(rows + projected, key=lambda m: (m.date, m.id), reverse=True)[skip:skip + limit]
+    if as_rows:
+        merged = [
+            tuple(getattr(m, key) for key in keys) if isinstance(m, projection.ProjectedMovement) else m
+            for m in merged
+        ]
+    return merged
+
+def _month_bounds(year: int, month: int):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+def _build_movements_statement(by_start, by_end, by_month, by_category, by_type, actual_only, columns=None):
+    stmt = select(*(columns or (models.Movement,))).where(models.Movement.family_id == bindparam("family_id")) # Filter by family
     
     # Date filters
-    if start_date:
-        query = query.filter(models.Movement.date >= start_date)
-    if end_date:
-        query = query.filter(models.Movement.date <= end_date)
+    if by_start:
+        stmt = stmt.where(models.Movement.date >= bindparam("start_date"))
+    if by_end:
+        stmt = stmt.where(models.Movement.date <= bindparam("end_date"))
         
     # Month/Year filter (legacy but useful)
-    if month is not None and year is not None:
-        query = query.filter(
-            extract('year', models.Movement.date) == year,
-            extract('month', models.Movement.date) == month
+    if by_month:
+        stmt = stmt.where(
+            extract('year', models.Movement.date) == bindparam("year"),
+            extract('month', models.Movement.date) == bindparam("month")
         )
         
     # Category filter
-    if category:
-        query = query.filter(models.Movement.category == category)
+    if by_category:
+        stmt = stmt.where(models.Movement.category == bindparam("category"))
         
     # Type filter
-    if type:
-        query = query.filter(models.Movement.type == type)
+    if by_type:
+        stmt = stmt.where(models.Movement.type == bindparam("type"))
         
-    if not include_planned:
-        query = query.filter(models.Movement.is_planned == False)
+    if actual_only:
+        stmt = stmt.where(models.Movement.is_planned == False)
         
-    return query.order_by(models.Movement.date.desc(), models.Movement.id.desc()).offset(skip).limit(limit).all()
+    return stmt.order_by(models.Movement.date.desc(), models.Movement.id.desc()).offset(bindparam("skip")).limit(bindparam("limit"))
 
 def get_available_years(db: Session, family_id: int): # NEW family_id
     """Get list of years that have movements data, plus current year"""
     from datetime import date
     years_with_data = db.query(extract('year', models.Movement.date).label('year')).filter(models.Movement.family_id == family_id).distinct().all() # Filter by family
     years = {int(year[0]) for year in years_with_data}
+    # Years covered by the recurring expenses' planned occurrences
+    for rule in projection.active_rules(db, family_id):
+        rule_start, rule_end = recurrence.rule_bounds(rule)
+        years.update(range(rule_start.year, rule_end.year + 1))
     years.add(date.today().year)  # Always include current year
     return sorted(list(years))
 
@@ -132,212 +211,316 @@ def create_movement(db: Session, movement: schemas.MovementCreate, user_id: int,
     movement_dict['last_modified_at'] = datetime.utcnow()
     
     db_movement = models.Movement(**movement_dict)
-    db.add(db_movement)
-    db.commit()
-    db.refresh(db_movement)
+    with unit_of_work(db):
+        db.add(db_movement)
+        db.flush()
+        _changed(db, family_id, changes.MOVEMENT, "create", [db_movement.id], [db_movement.date])
     return db_movement
 
 def update_movement(db: Session, movement_id: int, movement: schemas.MovementCreate, family_id: int, user_id: int = None): # NEW user_id
     from datetime import datetime
-    db_movement = db.query(models.Movement).filter(models.Movement.id == movement_id, models.Movement.family_id == family_id).first() # Filter by family
-    if db_movement:
-        db_movement.type = movement.type
-        db_movement.amount = movement.amount
-        db_movement.category = movement.category
-        db_movement.date = movement.date
-        db_movement.description = movement.description
-        db_movement.is_planned = movement.is_planned
-        db_movement.from_recurring_id = movement.from_recurring_id
-        db_movement.is_confirmed = movement.is_confirmed
-        
-        # Update audit fields
-        if user_id:
-            db_movement.last_modified_by_user_id = user_id
-            db_movement.last_modified_at = datetime.utcnow()
-        
-        db.commit()
-        db.refresh(db_movement)
+    values = dict(
+        type=movement.type,
+        amount=movement.amount,
+        category=movement.category,
+        date=movement.date,
+        description=movement.description,
+        is_planned=movement.is_planned,
+        from_recurring_id=movement.from_recurring_id,
+        is_confirmed=movement.is_confirmed,
+    )
+    # Update audit fields (the timestamp is also the watermark of the analytics snapshots)
+    values['last_modified_at'] = datetime.utcnow()
+    if user_id:
+        values['last_modified_by_user_id'] = user_id
+
+    # The previous date is read first so the change covers both the old and the new period
+    with unit_of_work(db):
+        old_date = db.execute(
+            select(models.Movement.date).where(models.Movement.id == movement_id, models.Movement.family_id == family_id) # Filter by family
+        ).scalar()
+        if old_date is None:
+            return None
+        db_movement = db.execute(
+            update(models.Movement)
+            .where(models.Movement.id == movement_id, models.Movement.family_id == family_id) # Filter by family
+            .values(**values)
+            .returning(models.Movement)
+        ).scalars().first()
+        _changed(db, family_id, changes.MOVEMENT, "update", [movement_id], {old_date, db_movement.date})
     return db_movement
 
 def delete_movement(db: Session, movement_id: int, family_id: int): # NEW family_id
-    db_movement = db.query(models.Movement).filter(models.Movement.id == movement_id, models.Movement.family_id == family_id).first() # Filter by family
-    if db_movement:
-        db.delete(db_movement)
-        db.commit()
+    with unit_of_work(db):
+        db_movement = db.execute(
+            delete(models.Movement)
+            .where(models.Movement.id == movement_id, models.Movement.family_id == family_id) # Filter by family
+            .returning(models.Movement)
+        ).scalars().first()
+        if db_movement:
+            _changed(db, family_id, changes.MOVEMENT, "delete", [movement_id], [db_movement.date])
     return db_movement
 
 # Budgets
 def get_budgets(db: Session, family_id: int): # NEW family_id
-    return db.query(models.Budget).filter(models.Budget.family_id == family_id).all() # Filter by family
+    """Family budgets from the reference-data cache (immutable snapshots)"""
+    return refcache.budgets(db, family_id)
+
+def get_budgets_for_month(db: Session, month: int, family_id: int):
+    """Budgets that apply in `month` (bit test on the cached month masks)"""
+    return [budget for budget in refcache.budgets(db, family_id) if budget.applies_in(month)]
 
 def create_or_update_budget(db: Session, budget: schemas.BudgetCreate, family_id: int): # NEW family_id
-    import json
-    db_budget = db.query(models.Budget).filter(models.Budget.category == budget.category, models.Budget.family_id == family_id).first() # Filter by family
-    if db_budget:
-        db_budget.amount = budget.amount
-        db_budget.applicable_months = json.dumps(budget.applicable_months) if budget.applicable_months else None
-    else:
-        budget_dict = budget.dict()
-        budget_dict['applicable_months'] = json.dumps(budget.applicable_months) if budget.applicable_months else None
-        budget_dict['family_id'] = family_id # Set family_id
-        db_budget = models.Budget(**budget_dict)
-        db.add(db_budget)
-    db.commit()
-    db.refresh(db_budget)
+    with unit_of_work(db):
+        db_budget = db.query(models.Budget).filter(models.Budget.category == budget.category, models.Budget.family_id == family_id).first() # Filter by family
+        action = "update" if db_budget else "create"
+        if db_budget:
+            db_budget.amount = budget.amount
+            db_budget.applicable_months = budget.applicable_months  # stored as the month mask
+        else:
+            budget_dict = budget.dict()
+            budget_dict['family_id'] = family_id # Set family_id
+            db_budget = models.Budget(**budget_dict)
+            db.add(db_budget)
+        db.flush()
+        _changed(db, family_id, changes.BUDGET, action, [db_budget.id])
     return db_budget
 
 # Dashboard Aggregates
-def get_monthly_aggregates(db: Session, year: int, month: int, family_id: int): # NEW family_id
-    income = db.query(func.sum(models.Movement.amount)).filter(
-        models.Movement.family_id == family_id, # Filter by family
-        models.Movement.type == "INCOME",
+# Amounts are summed as integer cents in SQL and converted to Money only in the result.
+def get_monthly_aggregates(db: Session, year: int, month: int, family_id: int, today: date = None): # NEW family_id
+    """Month income/expense and the balance as of `today` (default: the real today)"""
+    today = today or date.today()
+    cents = models.Movement.amount_cents
+    is_income = models.Movement.type == "INCOME"
+    is_expense = models.Movement.type == "EXPENSE"
+    in_month = and_(
         extract('year', models.Movement.date) == year,
         extract('month', models.Movement.date) == month
-    ).scalar() or 0.0
-
-    expense = db.query(func.sum(models.Movement.amount)).filter(
-        models.Movement.family_id == family_id, # Filter by family
-        models.Movement.type == "EXPENSE",
-        extract('year', models.Movement.date) == year,
-        extract('month', models.Movement.date) == month
-    ).scalar() or 0.0
-
-    # Calculate TOTAL balance (All time up to today)
-    from datetime import date as dt_date
-    today = dt_date.today()
-    
-    total_income = db.query(func.sum(models.Movement.amount)).filter(
-        models.Movement.family_id == family_id,
-        models.Movement.type == "INCOME",
-        models.Movement.date <= today  # NEW: Only movements up to today
-    ).scalar() or 0.0
-
-    total_expense = db.query(func.sum(models.Movement.amount)).filter(
-        models.Movement.family_id == family_id,
-        models.Movement.type == "EXPENSE",
-        models.Movement.date <= today  # NEW: Only movements up to today
-    ).scalar() or 0.0
-
-    return {"income": income, "expense": expense, "balance": total_income - total_expense}
+    )
+    up_to_today = models.Movement.date <= today  # NEW: Only movements up to today
+
+    # One pass over the family's movements: month totals and TOTAL balance (all time up to today)
+    income, expense, total_income, total_expense = db.query(
+        func.sum(case((and_(is_income, in_month), cents), else_=0)),
+        func.sum(case((and_(is_expense, in_month), cents), else_=0)),
+        func.sum(case((and_(is_income, up_to_today), cents), else_=0)),
+        func.sum(case((and_(is_expense, up_to_today), cents), else_=0)),
+    ).filter(models.Movement.family_id == family_id).one() # Filter by family
+
+    # Planned recurring occurrences count as expenses of their month and, up to today, of the balance
+    month_start, month_end = _month_bounds(year, month)
+    projected_month = projected_to_today = 0
+    for planned in projection.project(db, family_id, None, max(month_end, today)):
+        if month_start <= planned.date <= month_end:
+            projected_month += planned.amount_cents
+        if planned.date <= today:
+            projected_to_today += planned.amount_cents
+
+    return {
+        "income": schemas.Money.from_cents(income or 0),
+        "expense": schemas.Money.from_cents((expense or 0) + projected_month),
+        "balance": schemas.Money.from_cents((total_income or 0) - (total_expense or 0) - projected_to_today),
+    }
 
 def get_expenses_by_category(db: Session, year: int, month: int, family_id: int): # NEW family_id
-    return db.query(models.Movement.category, func.sum(models.Movement.amount)).filter(
+    rows = db.query(models.Movement.category, func.sum(models.Movement.amount_cents)).filter(
         models.Movement.family_id == family_id, # Filter by family
         models.Movement.type == "EXPENSE",
         extract('year', models.Movement.date) == year,
         extract('month', models.Movement.date) == month
     ).group_by(models.Movement.category).all()
+    totals = dict(rows)
+    for category, cents in projection.totals_by_category(projection.project(db, family_id, *_month_bounds(year, month))).items():
+        totals[category] = totals.get(category, 0) + cents
+    return [(category, schemas.Money.from_cents(cents)) for category, cents in totals.items()]
 
 def get_budget_status(db: Session, year: int, month: int, family_id: int): # NEW family_id
-    import json
-    budgets = db.query(models.Budget).filter(models.Budget.family_id == family_id).all() # Filter by family
+    budgets = get_budgets_for_month(db, month, family_id)
     
-    # Get actual expenses (is_planned = False)
-    actual_expenses = db.query(models.Movement.category, func.sum(models.Movement.amount)).filter(
+    # Actual (is_planned = False) and planned (is_planned = True) expenses in one grouped query
+    expenses = db.query(models.Movement.category, models.Movement.is_planned, func.sum(models.Movement.amount_cents)).filter(
         models.Movement.family_id == family_id, # Filter by family
         models.Movement.type == "EXPENSE",
-        models.Movement.is_planned == False,
         extract('year', models.Movement.date) == year,
         extract('month', models.Movement.date) == month
-    ).group_by(models.Movement.category).all()
+    ).group_by(models.Movement.category, models.Movement.is_planned).all()
     
-    # Get planned expenses (is_planned = True)
-    planned_expenses = db.query(models.Movement.category, func.sum(models.Movement.amount)).filter(
-        models.Movement.family_id == family_id, # Filter by family
-        models.Movement.type == "EXPENSE",
-        models.Movement.is_planned == True,
-        extract('year', models.Movement.date) == year,
-        extract('month', models.Movement.date) == month
-    ).group_by(models.Movement.category).all()
-    
-    # Create dicts for quick lookup
-    actual_dict = {category: float(amount) for category, amount in actual_expenses}
-    planned_dict = {category: float(amount) for category, amount in planned_expenses}
+    # Create dicts for quick lookup (integer cents)
+    actual_dict = {}
+    planned_dict = {}
+    for category, is_planned, cents in expenses:
+        target = planned_dict if is_planned else actual_dict
+        target[category] = target.get(category, 0) + cents
+    for category, cents in projection.totals_by_category(projection.project(db, family_id, *_month_bounds(year, month))).items():
+        planned_dict[category] = planned_dict.get(category, 0) + cents
     
     budget_status = []
     for budget in budgets:
-        # Check if budget applies to this month
-        if budget.applicable_months:
-            applicable = json.loads(budget.applicable_months)
-            if month not in applicable:
-                continue  # Skip this budget for this month
-        
-        actual_spent = actual_dict.get(budget.category, 0.0)
-        planned_spent = planned_dict.get(budget.category, 0.0)
+        actual_spent = actual_dict.get(budget.category, 0)
+        planned_spent = planned_dict.get(budget.category, 0)
         total_spent = actual_spent + planned_spent
-        limit = float(budget.amount)
+        limit = budget.amount_cents or 0
         remaining = limit - total_spent
         percentage = (total_spent / limit * 100) if limit > 0 else 0
         actual_percentage = (actual_spent / limit * 100) if limit > 0 else 0
         
         budget_status.append({
             "category": budget.category,
-            "limit": limit,
-            "spent": actual_spent,
-            "planned": planned_spent,
-            "total_spent": total_spent,
-            "remaining": remaining,
+            "limit": schemas.Money.from_cents(limit),
+            "spent": schemas.Money.from_cents(actual_spent),
+            "planned": schemas.Money.from_cents(planned_spent),
+            "total_spent": schemas.Money.from_cents(total_spent),
+            "remaining": schemas.Money.from_cents(remaining),
             "percentage": round(percentage, 1),
             "actual_percentage": round(actual_percentage, 1)
         })
     
     return budget_status
 
+def get_budget_matrix(db: Session, year: int, family_id: int):
+    """
+    Limit, actual, planned and remaining for every category x month of a year.
+    Expenses come from one query grouped by category, month and is_planned.
+    """
+    month_of = extract('month', models.Movement.date)
+    expenses = db.execute(
+        select(models.Movement.category, month_of, models.Movement.is_planned, func.sum(models.Movement.amount_cents))
+        .where(
+            models.Movement.family_id == family_id, # Filter by family
+            models.Movement.type == "EXPENSE",
+            models.Movement.date.between(date(year, 1, 1), date(year, 12, 31))
+        )
+        .group_by(models.Movement.category, month_of, models.Movement.is_planned)
+    ).all()
+
+    # (category, month) -> cents
+    actual, planned = {}, {}
+    for category, month, is_planned, cents in expenses:
+        target = planned if is_planned else actual
+        target[(category, int(month))] = target.get((category, int(month)), 0) + cents
+    for occurrence in projection.project(db, family_id, date(year, 1, 1), date(year, 12, 31)):
+        key = (occurrence.category, occurrence.date.month)
+        planned[key] = planned.get(key, 0) + occurrence.amount_cents
+
+    budgets = {budget.category: budget for budget in get_budgets(db, family_id)}
+    categories = sorted(set(budgets) | {category for category, _ in actual} | {category for category, _ in planned})
+
+    rows = []
+    totals = [dict(limit=0, actual=0, planned=0) for _ in range(12)]
+    for category in categories:
+        budget = budgets.get(category)
+        months = []
+        for month in range(1, 13):
+            applies = budget is not None and bool(budget.applicable_months_mask & (1 << (month - 1)))
+            limit = (budget.amount_cents or 0) if applies else 0
+            spent = actual.get((category, month), 0)
+            planned_spent = planned.get((category, month), 0)
+            total = totals[month - 1]
+            total["limit"] += limit
+            total["actual"] += spent
+            total["planned"] += planned_spent
+            months.append({
+                "month": month,
+                "has_budget": applies,
+                "limit": schemas.Money.from_cents(limit),
+                "actual": schemas.Money.from_cents(spent),
+                "planned": schemas.Money.from_cents(planned_spent),
+                "remaining": schemas.Money.from_cents(limit - spent - planned_spent),
+            })
+        rows.append({"category": category, "months": months})
+
+    return {
+        "year": year,
+        "categories": rows,
+        "totals": [
+            {
+                "month": month,
+                "limit": schemas.Money.from_cents(total["limit"]),
+                "actual": schemas.Money.from_cents(total["actual"]),
+                "planned": schemas.Money.from_cents(total["planned"]),
+                "remaining": schemas.Money.from_cents(total["limit"] - total["actual"] - total["planned"]),
+            }
+            for month, total in enumerate(totals, start=1)
+        ],
+    }
+
 def get_budget(db: Session, budget_id: int, family_id: int): # NEW family_id
-    return db.query(models.Budget).filter(models.Budget.id == budget_id, models.Budget.family_id == family_id).first() # Filter by family
+    stmt = _cached_statement(
+        "budget_by_id", lambda: _by_family(models.Budget).where(models.Budget.id == bindparam("budget_id"))
+    )
+    return db.execute(stmt, {"budget_id": budget_id, "family_id": family_id}).scalars().first() # Filter by family
 
 def delete_budget(db: Session, budget_id: int, family_id: int): # NEW family_id
-    db_budget = db.query(models.Budget).filter(models.Budget.id == budget_id, models.Budget.family_id == family_id).first() # Filter by family
-    if db_budget:
-        db.delete(db_budget)
-        db.commit()
+    with unit_of_work(db):
+        db_budget = db.execute(
+            delete(models.Budget)
+            .where(models.Budget.id == budget_id, models.Budget.family_id == family_id) # Filter by family
+            .returning(models.Budget)
+        ).scalars().first()
+        if db_budget:
+            _changed(db, family_id, changes.BUDGET, "delete", [budget_id])
     return db_budget
 
 def bulk_update_movement_category(db: Session, old_category: str, new_category: str, family_id: int): # NEW family_id
-    movements = db.query(models.Movement).filter(models.Movement.category == old_category, models.Movement.family_id == family_id).all() # Filter by family
-    for movement in movements:
-        movement.category = new_category
-    db.commit()
-    return len(movements)
+    with unit_of_work(db):
+        moved = db.execute(
+            update(models.Movement)
+            .where(models.Movement.category == old_category, models.Movement.family_id == family_id) # Filter by family
+            .values(category=new_category, last_modified_at=datetime.utcnow())
+            .returning(models.Movement.id, models.Movement.date)
+        ).all()
+        if moved:
+            _changed(db, family_id, changes.MOVEMENT, "update", [row.id for row in moved], {row.date for row in moved})
+    return len(moved)
 
 # Categories
 def get_categories(db: Session, family_id: int): # NEW family_id
-    return db.query(models.Category).filter(models.Category.family_id == family_id).all() # Filter by family
+    return refcache.categories(db, family_id)
 
 def create_category(db: Session, category: schemas.CategoryCreate, family_id: int): # NEW family_id
     db_category = models.Category(**category.dict(), family_id=family_id) # Set family_id
-    db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
+    with unit_of_work(db):
+        db.add(db_category)
+        db.flush()
+        _changed(db, family_id, changes.CATEGORY, "create", [db_category.id])
     return db_category
 
 def update_category(db: Session, category_id: int, category: schemas.CategoryCreate, family_id: int): # NEW family_id
-    db_category = db.query(models.Category).filter(models.Category.id == category_id, models.Category.family_id == family_id).first() # Filter by family
-    if db_category:
-        db_category.name = category.name
-        db_category.icon = category.icon
-        db_category.color = category.color
-        db.commit()
-        db.refresh(db_category)
+    with unit_of_work(db):
+        db_category = db.execute(
+            update(models.Category)
+            .where(models.Category.id == category_id, models.Category.family_id == family_id) # Filter by family
+            .values(name=category.name, icon=category.icon, color=category.color)
+            .returning(models.Category)
+        ).scalars().first()
+        if db_category:
+            _changed(db, family_id, changes.CATEGORY, "update", [category_id])
     return db_category
 
 def delete_category(db: Session, category_id: int, family_id: int): # NEW family_id
-    db_category = db.query(models.Category).filter(models.Category.id == category_id, models.Category.family_id == family_id).first() # Filter by family
-    if db_category:
-        db.delete(db_category)
-        db.commit()
+    with unit_of_work(db):
+        db_category = db.execute(
+            delete(models.Category)
+            .where(models.Category.id == category_id, models.Category.family_id == family_id) # Filter by family
+            .returning(models.Category)
+        ).scalars().first()
+        if db_category:
+            # Detach movements, as the ORM cascade used to do
+            db.execute(
+                update(models.Movement).where(models.Movement.category_id == category_id).values(category_id=None)
+            )
+            _changed(db, family_id, changes.CATEGORY, "delete", [category_id])
     return db_category
 
 # RecurringExpenses
 def get_recurring_expenses(db: Session, family_id: int, user_id: int = None): # NEW family_id
     """Get all active recurring expenses for family"""
-    query = db.query(models.RecurringExpense).filter(models.RecurringExpense.is_active == True, models.RecurringExpense.family_id == family_id) # Filter by family
-    if user_id:
-        query = query.filter(models.RecurringExpense.user_id == user_id)
-    return query.all()
+    rules = refcache.recurring(db, family_id)
+    return [rule for rule in rules if rule.user_id == user_id] if user_id else list(rules)
 
 def create_recurring_expense(db: Session, recurring: schemas.RecurringExpenseCreate, user_id: int, family_id: int): # NEW family_id
-    """Create recurring expense and generate movements"""
+    """Create recurring expense; its planned occurrences are projected, not stored"""
     import json
     recurring_dict = recurring.dict()
     recurring_dict['applicable_months'] = json.dumps(recurring.applicable_months) if recurring.applicable_months else None
@@ -345,150 +528,151 @@ def create_recurring_expense(db: Session, recurring: schemas.RecurringExpenseCre
     recurring_dict['family_id'] = family_id # Set family_id
     
     db_recurring = models.RecurringExpense(**recurring_dict)
-    db.add(db_recurring)
-    db.commit()
-    db.refresh(db_recurring)
-    
-    # Generate movements for applicable months
-    generate_recurring_movements(db, db_recurring)
-    
+    with unit_of_work(db):
+        db.add(db_recurring)
+        db.flush()
+        # Projected occurrences may appear in any period
+        _changed(db, family_id, changes.RECURRING, "create", [db_recurring.id], dates=None)
     return db_recurring
 
-def generate_recurring_movements(db: Session, recurring: models.RecurringExpense):
-    """Generate planned movements from recurring expense based on date range"""
-    import json
-    from datetime import date
-    from dateutil.relativedelta import relativedelta
-    
-    today = date.today()
-    start = recurring.start_date or today
-    # Use end_date from recurring if set, otherwise 1 year ahead
-    end = recurring.end_date or (start + relativedelta(years=1))
-    
-    # Get day of month (default to 1 if not set)
-    day_of_month = recurring.day_of_month or 1
-    
-    # Generate movements month by month
-    current = start
-    while current <= end:
-        # Create date for this month with specified day
-        try:
-            # Handle months with fewer days (e.g., Feb 30 → Feb 28/29)
-            movement_day = min(day_of_month, 28 if current.month == 2 else 31)
-            movement_date = date(current.year, current.month, movement_day)
-        except ValueError:
-            # Fallback to last valid day of month
-            movement_date = date(current.year, current.month, 1) + relativedelta(months=1, days=-1)
-        
-        # Check if movement already exists for this month
-        existing = db.query(models.Movement).filter(
-            models.Movement.from_recurring_id == recurring.id,
-            extract('year', models.Movement.date) == current.year,
-            extract('month', models.Movement.date) == current.month
-        ).first()
-        
-        if not existing:
-            # Create movement for this month
-            movement = models.Movement(
-                type="EXPENSE",
-                date=movement_date,
-                amount=recurring.amount,
-                category=recurring.category,
-                description=f"[Ricorrente] {recurring.name}" + (f" - {recurring.description}" if recurring.description else ""),
-                is_planned=True,
-                is_confirmed=False,  # Not confirmed yet
-                from_recurring_id=recurring.id,
-                user_id=recurring.user_id,
-                family_id=recurring.family_id # Set family_id
-            )
-            db.add(movement)
-        
-        current = current + relativedelta(months=1)
-    
-    db.commit()
-
-def confirm_recurring_movement(db: Session, movement_id: int, family_id: int): # NEW family_id
-    """Confirm a recurring movement (mark as paid)"""
-    movement = db.query(models.Movement).filter(models.Movement.id == movement_id, models.Movement.family_id == family_id).first() # Filter by family
-    if movement and movement.from_recurring_id:
-        movement.is_confirmed = True
-        movement.is_planned = False  # No longer "planned", it's actual
-        db.commit()
-        db.refresh(movement)
+def confirm_recurring_occurrence(db: Session, recurring_id: int, occurrence_date: date, family_id: int, user_id: int = None): # NEW family_id
+    """Confirm a planned occurrence (mark as paid): this is when its Movement row is written"""
+    db_recurring = db.execute(
+        select(models.RecurringExpense).where(
+            models.RecurringExpense.id == recurring_id,
+            models.RecurringExpense.family_id == family_id, # Filter by family
+            models.RecurringExpense.is_active == True
+        )
+    ).scalars().first()
+    if not db_recurring or occurrence_date not in recurrence.occurrences(db_recurring, occurrence_date, occurrence_date):
+        return None
+
+    # Already confirmed: return the existing movement of that occurrence
+    if db_recurring.recurrence_type == recurrence.WEEKLY:
+        window = (occurrence_date, occurrence_date)
+    else:
+        window = _month_bounds(occurrence_date.year, occurrence_date.month)
+    existing = db.execute(
+        select(models.Movement).where(
+            models.Movement.from_recurring_id == recurring_id,
+            models.Movement.date.between(*window)
+        )
+    ).scalars().first()
+    if existing:
+        return existing
+
+    movement = models.Movement(
+        type="EXPENSE",
+        date=occurrence_date,
+        amount_cents=db_recurring.amount_cents,
+        category=db_recurring.category,
+        description=projection.describe(db_recurring),
+        is_planned=False,  # Confirmed: it's actual
+        is_confirmed=True,
+        from_recurring_id=db_recurring.id,
+        user_id=db_recurring.user_id,
+        family_id=family_id,
+        created_by_user_id=user_id,
+        last_modified_by_user_id=user_id,
+        last_modified_at=datetime.utcnow()
+    )
+    with unit_of_work(db):
+        db.add(movement)
+        db.flush()
+        _changed(db, family_id, changes.MOVEMENT, "create", [movement.id], [movement.date])
     return movement
 
 def delete_recurring_expense(db: Session, recurring_id: int, family_id: int): # NEW family_id
-    """Soft delete recurring expense and remove unconfirmed movements"""
-    recurring = db.query(models.RecurringExpense).filter(models.RecurringExpense.id == recurring_id, models.RecurringExpense.family_id == family_id).first() # Filter by family
-    if recurring:
-        recurring.is_active = False
-        
-        # Delete unconfirmed movements
-        db.query(models.Movement).filter(
-            models.Movement.from_recurring_id == recurring_id,
-            models.Movement.is_confirmed == False
-        ).delete()
-        
-        db.commit()
-    return recurring
+    """Soft delete recurring expense; its projection stops, confirmed movements remain"""
+    with unit_of_work(db):
+        db_recurring = db.execute(
+            update(models.RecurringExpense)
+            .where(models.RecurringExpense.id == recurring_id, models.RecurringExpense.family_id == family_id) # Filter by family
+            .values(is_active=False)
+            .returning(models.RecurringExpense)
+        ).scalars().first()
+        if db_recurring:
+            _changed(db, family_id, changes.RECURRING, "delete", [recurring_id], dates=None)
+    return db_recurring
 
 def update_recurring_expense(db: Session, recurring_id: int, recurring: schemas.RecurringExpenseCreate, family_id: int): # NEW family_id
-    """Update recurring expense and regenerate unconfirmed movements"""
+    """Update recurring expense; the projection follows the new definition"""
     import json
-    db_recurring = db.query(models.RecurringExpense).filter(models.RecurringExpense.id == recurring_id, models.RecurringExpense.family_id == family_id).first() # Filter by family
-    if db_recurring:
-        # Update fields
-        db_recurring.name = recurring.name
-        db_recurring.amount = recurring.amount
-        db_recurring.category = recurring.category
-        db_recurring.description = recurring.description
-        db_recurring.recurrence_type = recurring.recurrence_type
-        db_recurring.applicable_months = json.dumps(recurring.applicable_months) if recurring.applicable_months else None
-        db_recurring.day_of_month = recurring.day_of_month
-        db_recurring.start_date = recurring.start_date
-        db_recurring.end_date = recurring.end_date
-        
-        # Delete old unconfirmed movements
-        db.query(models.Movement).filter(
-            models.Movement.from_recurring_id == recurring_id,
-            models.Movement.is_confirmed == False
-        ).delete()
-        
-        db.commit()
-        db.refresh(db_recurring)
-        
-        # Regenerate movements
-        generate_recurring_movements(db, db_recurring)
-        
+    with unit_of_work(db):
+        db_recurring = db.execute(
+            update(models.RecurringExpense)
+            .where(models.RecurringExpense.id == recurring_id, models.RecurringExpense.family_id == family_id) # Filter by family
+            .values(
+                name=recurring.name,
+                amount=recurring.amount,
+                category=recurring.category,
+                description=recurring.description,
+                recurrence_type=recurring.recurrence_type,
+                applicable_months=json.dumps(recurring.applicable_months) if recurring.applicable_months else None,
+                day_of_month=recurring.day_of_month,
+                start_date=recurring.start_date,
+                end_date=recurring.end_date,
+            )
+            .returning(models.RecurringExpense)
+        ).scalars().first()
+        if db_recurring:
+            _changed(db, family_id, changes.RECURRING, "update", [recurring_id], dates=None)
     return db_recurring
 
 # Savings Goals
 def get_savings_goals(db: Session, family_id: int):
-    return db.query(models.SavingsGoal).filter(models.SavingsGoal.family_id == family_id).all()
+    return db.execute(_by_family(models.SavingsGoal), {"family_id": family_id}).scalars().all()
 
 def create_savings_goal(db: Session, goal: schemas.SavingsGoalCreate, family_id: int):
     db_goal = models.SavingsGoal(**goal.dict(), family_id=family_id)
-    db.add(db_goal)
-    db.commit()
-    db.refresh(db_goal)
+    with unit_of_work(db):
+        db.add(db_goal)
+        db.flush()
+        _changed(db, family_id, changes.GOAL, "create", [db_goal.id])
     return db_goal
 
 def update_savings_goal(db: Session, goal_id: int, goal_update: schemas.SavingsGoalUpdate, family_id: int):
-    db_goal = db.query(models.SavingsGoal).filter(models.SavingsGoal.id == goal_id, models.SavingsGoal.family_id == family_id).first()
-    if not db_goal:
-        return None
-    
     update_data = goal_update.dict(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_goal, key, value)
-        
-    db.commit()
-    db.refresh(db_goal)
+    if not update_data:
+        return db.query(models.SavingsGoal).filter(models.SavingsGoal.id == goal_id, models.SavingsGoal.family_id == family_id).first()
+
+    with unit_of_work(db):
+        db_goal = db.execute(
+            update(models.SavingsGoal)
+            .where(models.SavingsGoal.id == goal_id, models.SavingsGoal.family_id == family_id)
+            .values(**update_data)
+            .returning(models.SavingsGoal)
+        ).scalars().first()
+        if db_goal:
+            _changed(db, family_id, changes.GOAL, "update", [goal_id])
     return db_goal
 
 def delete_savings_goal(db: Session, goal_id: int, family_id: int):
-    db_goal = db.query(models.SavingsGoal).filter(models.SavingsGoal.id == goal_id, models.SavingsGoal.family_id == family_id).first()
-    if db_goal:
-        db.delete(db_goal)
-        db.commit()
+    with unit_of_work(db):
+        db_goal = db.execute(
+            delete(models.SavingsGoal)
+            .where(models.SavingsGoal.id == goal_id, models.SavingsGoal.family_id == family_id)
+            .returning(models.SavingsGoal)
+        ).scalars().first()
+        if db_goal:
+            _changed(db, family_id, changes.GOAL, "delete", [goal_id])
     return db_goal
+
+# Notifications (created by alerts.py)
+def get_notifications(db: Session, family_id: int, unread_only: bool = False, limit: int = 50):
+    stmt = select(models.Notification).where(models.Notification.family_id == family_id) # Filter by family
+    if unread_only:
+        stmt = stmt.where(models.Notification.is_read == False)
+    return db.execute(stmt.order_by(models.Notification.id.desc()).limit(limit)).scalars().all()
+
+def mark_notifications_read(db: Session, family_id: int, notification_id: int = None):
+    """Mark one notification, or all of the family's, as read. Returns how many changed."""
+    stmt = (
+        update(models.Notification)
+        .where(models.Notification.family_id == family_id, models.Notification.is_read == False) # Filter by family
+        .values(is_read=True)
+    )
+    if notification_id is not None:
+        stmt = stmt.where(models.Notification.id == notification_id)
+    with unit_of_work(db):
+        return db.execute(stmt).rowcount
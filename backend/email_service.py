@@ -94,3 +94,37 @@ def send_password_reset_email(db: Session, user_email: str, reset_token: str, us
     """
     
     return send_email(db, user_email, "Reset Password - SpeseCasa", html_content)
+
+def send_budget_alert_email(db: Session, user_email: str, username: str, message: str) -> bool:
+    """Send a budget threshold alert to a family member"""
+    html_content = f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <style>
+            body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+            .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+            .header {{ background: linear-gradient(135deg, #f59e0b 0%, #ef4444 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
+            .content {{ background: #f9fafb; padding: 30px; border-radius: 0 0 10px 10px; }}
+            .footer {{ text-align: center; color: #64748b; font-size: 12px; margin-top: 20px; }}
+        </style>
+    </head>
+    <body>
+        <div class="container">
+            <div class="header">
+                <h1>⚠️ Avviso Budget</h1>
+            </div>
+            <div class="content">
+                <p>Ciao <strong>{username}</strong>,</p>
+                <p>{message}</p>
+                <p>Apri SpeseCasa per controllare i movimenti del mese.</p>
+            </div>
+            <div class="footer">
+                <p>© 2025 SpeseCasa Lite | Gestione Spese Personali</p>
+            </div>
+        </div>
+    </body>
+    </html>
+    """
+
+    return send_email(db, user_email, "Avviso Budget - SpeseCasa", html_content)
@@ -0,0 +1,198 @@
+"""
+Live change feed (Server-Sent Events).
+
+Every committed change (see changes.py) becomes an event in its family's ring
+buffer and is pushed to the family's open streams, so clients refresh only
+the entity and periods that changed:
+
+    id: <boot>-<n>
+    event: change
+    data: {"entity": "movement", "action": "update", "ids": [12], "periods": ["2025-03"]}
+
+`periods` lists the months touched ("YYYY-MM"); null means any period.
+
+A client reconnecting with Last-Event-ID gets the events it missed from the
+ring buffer. If they are no longer there (buffer wrapped, or the id comes from
+another process or an earlier run), it gets a `reset` event instead and should
+reload everything. A connection whose queue fills up (client not reading) is
+sent `reset` and closed, so a slow client never holds more than
+QUEUE_MAX_EVENTS events in memory.
+
+Events are per process: with several workers, a stream only sees the writes
+handled by its own worker.
+"""
+import asyncio
+import itertools
+import json
+import os
+import threading
+import uuid
+from collections import deque
+from dataclasses import dataclass
+
+import changes, metrics
+
+RING_SIZE = int(os.getenv("EVENTS_RING_SIZE", "500"))
+QUEUE_MAX_EVENTS = 256
+MAX_CONNECTIONS_PER_FAMILY = int(os.getenv("EVENTS_MAX_CONNECTIONS_PER_FAMILY", "20"))
+HEARTBEAT_SECONDS = 15
+RETRY_MILLISECONDS = 3000
+
+BOOT_ID = uuid.uuid4().hex[:8]
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    family_id: int
+    data: dict
+
+    @property
+    def event_id(self) -> str:
+        return f"{BOOT_ID}-{self.id}"
+
+
+def event_data(change: changes.Change) -> dict:
+    periods = None if change.dates is None else sorted({f"{d.year}-{d.month:02d}" for d in change.dates})
+    return {"entity": change.entity, "action": change.action, "ids": list(change.ids), "periods": periods}
+
+
+def format_event(event_id: str, name: str, data) -> str:
+    return f"id: {event_id}\nevent: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+_OVERFLOW = object()
+
+
+class Subscription:
+    """One open stream: an asyncio queue fed from the writers' threads."""
+
+    def __init__(self, hub, family_id: int, loop: asyncio.AbstractEventLoop, max_events: int = QUEUE_MAX_EVENTS):
+        self.hub = hub
+        self.family_id = family_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_events + 1)  # + the overflow marker
+        self.max_events = max_events
+        self.closed = False
+
+    def push(self, event: Event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            self.closed = True  # event loop gone
+
+    def _put(self, event):
+        if self.closed:
+            return
+        if self.queue.qsize() >= self.max_events:
+            # Too far behind: drop the backlog, tell the client to reload
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(_OVERFLOW)
+            self.closed = True
+            return
+        self.queue.put_nowait(event)
+
+
+class TooManyConnections(Exception):
+    pass
+
+
+class Hub:
+    def __init__(self, ring_size: int = RING_SIZE, max_connections: int = MAX_CONNECTIONS_PER_FAMILY):
+        self.ring_size = ring_size
+        self.max_connections = max_connections
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.last_id = 0
+        self._rings = {}
+        self._evicted = {}  # family -> id of the newest event dropped from its ring
+        self._subscribers = {}
+
+    def publish(self, change: changes.Change) -> Event:
+        with self._lock:
+            event = Event(next(self._ids), change.family_id, event_data(change))
+            self.last_id = event.id
+            ring = self._rings.setdefault(change.family_id, deque(maxlen=self.ring_size))
+            if len(ring) == ring.maxlen:
+                self._evicted[change.family_id] = ring[0].id
+            ring.append(event)
+            subscribers = list(self._subscribers.get(change.family_id, ()))
+        for subscription in subscribers:
+            subscription.push(event)
+        return event
+
+    def subscribe(self, family_id: int, loop: asyncio.AbstractEventLoop, last_event_id: str = None):
+        """
+        Register a stream. Returns (subscription, replay): the events after
+        last_event_id, or None when they cannot be replayed (send a reset).
+        Registration and replay happen under one lock: nothing is lost or doubled.
+        """
+        with self._lock:
+            subscribers = self._subscribers.setdefault(family_id, set())
+            if len(subscribers) >= self.max_connections:
+                raise TooManyConnections(f"Max {self.max_connections} live connections per family")
+            subscription = Subscription(self, family_id, loop)
+            subscribers.add(subscription)
+            metrics.SSE_CONNECTIONS.inc()
+            return subscription, self._replay(family_id, last_event_id)
+
+    def _replay(self, family_id: int, last_event_id: str):
+        if not last_event_id:
+            return []
+        boot, _, number = last_event_id.partition("-")
+        if boot != BOOT_ID or not number.isdigit() or int(number) > self.last_id:
+            return None
+        last = int(number)
+        if self._evicted.get(family_id, 0) > last:
+            return None  # some of the missed events are gone
+        return [event for event in self._rings.get(family_id, ()) if event.id > last]
+
+    def unsubscribe(self, subscription: Subscription):
+        subscription.closed = True
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.family_id)
+            if subscribers and subscription in subscribers:
+                subscribers.discard(subscription)
+                metrics.SSE_CONNECTIONS.dec()
+                if not subscribers:
+                    del self._subscribers[subscription.family_id]
+
+    def connections(self, family_id: int) -> int:
+        with self._lock:
+            return len(self._subscribers.get(family_id, ()))
+
+
+hub = Hub()
+
+
+@changes.listen
+def _publish(change: changes.Change):
+    hub.publish(change)
+
+
+def _reset(hub: Hub) -> str:
+    # A client reloading everything now only needs the events after this point
+    return format_event(f"{BOOT_ID}-{hub.last_id}", "reset", {})
+
+
+async def stream(subscription: Subscription, replay, heartbeat_seconds: float = HEARTBEAT_SECONDS):
+    """SSE body: replay (or reset), then live events with heartbeat comments."""
+    try:
+        yield f"retry: {RETRY_MILLISECONDS}\n\n"
+        if replay is None:
+            yield _reset(subscription.hub)
+        for event in replay or ():
+            yield format_event(event.event_id, "change", event.data)
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            if event is _OVERFLOW:
+                yield _reset(subscription.hub)
+                return
+            yield format_event(event.event_id, "change", event.data)
+    finally:
+        subscription.hub.unsubscribe(subscription)
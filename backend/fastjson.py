@@ -0,0 +1,65 @@
+"""
+Fast path for large list responses.
+
+    keys = fastjson.select_fields(fields, crud.MOVEMENT_KEYS)
+    return fastjson.rows_response(keys, crud.get_movements(db, ..., as_rows=True, fields=keys), format)
+
+The rows are plain column tuples (no ORM objects), encoded with orjson
+straight into the response body: no pydantic validation and no
+jsonable_encoder pass, so the endpoint declares response_model=None and
+documents its shapes with `responses=` instead. The keys must be those of the
+documented schema, in the same order, so the JSON is byte-for-byte the one of
+the validated path (test_fastjson.py checks it for movements). Values after
+the last key in a row are ignored.
+
+- `?fields=id,date,amount` keeps only those keys (pushed down into the SELECT).
+- `?format=columnar` returns {"columns": [...], "data": {column: [values]}}:
+  each key is written once instead of once per row.
+"""
+from typing import Optional
+
+import orjson
+from fastapi import Response
+
+import querystats
+
+FORMATS = ("rows", "columnar")
+
+
+def _default(value):
+    # orjson only encodes exact floats: schemas.Money is a float subclass
+    if isinstance(value, float):
+        return float(value)
+    raise TypeError
+
+
+def select_fields(fields: Optional[str], keys) -> tuple:
+    """The keys requested with `?fields=a,b`, in the order of `keys`; all of them when not given."""
+    if fields is None:
+        return tuple(keys)
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    if not requested:
+        raise ValueError("No fields requested")
+    unknown = requested.difference(keys)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return tuple(key for key in keys if key in requested)
+
+
+def check_format(format: str):
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format: {format} (expected one of {', '.join(FORMATS)})")
+
+
+def dumps(keys, rows, format: str = "rows") -> bytes:
+    check_format(format)
+    with querystats.serializing():
+        if format == "columnar":
+            columns = list(zip(*rows)) or [()] * len(keys)
+            content = {"columns": list(keys), "data": {key: list(values) for key, values in zip(keys, columns)}}
+            return orjson.dumps(content, default=_default)
+        return orjson.dumps([dict(zip(keys, row)) for row in rows], default=_default)
+
+
+def rows_response(keys, rows, format: str = "rows") -> Response:
+    return Response(dumps(keys, rows, format), media_type="application/json")
@@ -0,0 +1,222 @@
+"""
+Cash-flow forecast.
+
+The projected balance starts from the balance as of `today`
+(crud.get_monthly_aggregates) and adds, day by day:
+- scheduled flows: planned recurring occurrences (projection.py) and movements
+  already entered with a future date;
+- seasonal flows: for each category, the average of the same calendar month
+  over the history window (movements up to `today`), for income and for
+  expenses not coming from a recurring expense (those are already scheduled).
+  Only what a category has not yet spent/received in a month is still
+  expected: movements already entered for that month, past or future-dated,
+  are taken off its average so they are not counted twice.
+
+Everything is computed on NumPy arrays indexed by day: one grouped query for
+the history, then array arithmetic, no per-day Python loop.
+"""
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import select, func, extract
+from sqlalchemy.orm import Session
+
+import changes, crud, models, projection
+from schemas import Money
+
+GRANULARITIES = ("daily", "monthly")
+DEFAULT_HISTORY_YEARS = 3
+CACHE_MAX_ENTRIES = 256
+
+# Seasonal averages only change when the history does
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_generations = {}
+
+
+@changes.listen
+def _invalidate(change: changes.Change):
+    if change.entity != changes.MOVEMENT:
+        return
+    with _cache_lock:
+        _generations[change.family_id] = _generations.get(change.family_id, 0) + 1
+        for key in [key for key in _cache if key[0] == change.family_id]:
+            del _cache[key]
+
+
+def _month_index(days: np.ndarray) -> np.ndarray:
+    """Months since year 0 (year * 12 + month - 1) of datetime64[D] values."""
+    return days.astype("datetime64[M]").astype(np.int64) + 1970 * 12
+
+
+def seasonal_averages(db: Session, family_id: int, today: date, history_years: int):
+    """Cached per family and day until a movement of the family changes."""
+    key = (family_id, today, history_years)
+    with _cache_lock:
+        cached = _cache.get(key)
+        generation = _generations.get(family_id, 0)
+    if cached is not None:
+        return cached
+    result = _seasonal_averages(db, family_id, today, history_years)
+    with _cache_lock:
+        if _generations.get(family_id, 0) == generation:
+            _cache[key] = result
+            while len(_cache) > CACHE_MAX_ENTRIES:
+                _cache.popitem(last=False)
+    return result
+
+
+def _seasonal_averages(db: Session, family_id: int, today: date, history_years: int):
+    """
+    Per-category average of each calendar month over the history window, in cents.
+
+    Returns (keys, averages[len(keys), 12], realised[len(keys)]): the (type, category)
+    pairs, their monthly averages, and what each has already realised in the current
+    month up to `today`. Movements after `today` are not history.
+    """
+    history_start = date(today.year - history_years, today.month, 1)
+    year_of = extract("year", models.Movement.date)
+    month_of = extract("month", models.Movement.date)
+    rows = db.execute(
+        select(models.Movement.type, models.Movement.category, year_of, month_of,
+               func.sum(models.Movement.amount_cents), func.min(models.Movement.date))
+        .where(
+            models.Movement.family_id == family_id, # Filter by family
+            models.Movement.date.between(history_start, today),
+            models.Movement.is_planned == False,
+            models.Movement.from_recurring_id.is_(None),  # recurring flows are scheduled separately
+        )
+        .group_by(models.Movement.type, models.Movement.category, year_of, month_of)
+    ).all()
+    if not rows:
+        return [], np.zeros((0, 12)), np.zeros(0)
+
+    types, categories, years, months, cents, firsts = zip(*rows)
+    ordered = sorted(set(zip(types, categories)), key=str)
+    keys = {key: i for i, key in enumerate(ordered)}
+    key_index = np.array([keys[key] for key in zip(types, categories)])
+    month_number = np.array(months, dtype=np.int64) - 1
+    index = np.array(years, dtype=np.int64) * 12 + month_number
+    cents = np.array(cents, dtype=np.float64)
+    current = today.year * 12 + today.month - 1
+
+    # Complete months of history, from the family's first month with data to last month
+    first = min(firsts)
+    counts = np.bincount(np.arange(first.year * 12 + first.month - 1, current) % 12, minlength=12)
+    past = index < current
+    totals = np.zeros((len(keys), 12))
+    np.add.at(totals, (key_index[past], month_number[past]), cents[past])
+    averages = np.divide(totals, counts, out=np.zeros_like(totals), where=counts > 0)
+
+    realised = np.zeros(len(keys))
+    np.add.at(realised, key_index[index == current], cents[index == current])
+    return ordered, averages, realised
+
+
+def compute_forecast(db: Session, family_id: int, months: int = 12, granularity: str = "monthly",
+                     history_years: int = DEFAULT_HISTORY_YEARS, today: date = None):
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    today = today or date.today()
+    first_day = today + timedelta(days=1)
+    end = today + relativedelta(months=months)
+    n_days = (end - today).days
+
+    start_balance = crud.get_monthly_aggregates(db, today.year, today.month, family_id, today=today)["balance"].cents
+
+    days = np.datetime64(first_day, "D") + np.arange(n_days)
+    month_index = _month_index(days)
+    days_in_month = (
+        (days.astype("datetime64[M]") + 1).astype("datetime64[D]") - days.astype("datetime64[M]").astype("datetime64[D]")
+    ).astype(np.int64)
+
+    # Scheduled flows: recurring occurrences and future-dated movements
+    income = np.zeros(n_days, dtype=np.int64)
+    expense = np.zeros(n_days, dtype=np.int64)
+    planned = projection.project(db, family_id, first_day, end)
+    if planned:
+        offsets = np.array([(occurrence.date - first_day).days for occurrence in planned])
+        np.add.at(expense, offsets, np.array([occurrence.amount_cents for occurrence in planned], dtype=np.int64))
+    scheduled = db.execute(
+        select(models.Movement.date, models.Movement.type, models.Movement.amount_cents).where(
+            models.Movement.family_id == family_id, # Filter by family
+            models.Movement.date.between(first_day, end),
+        )
+    ).all()
+    if scheduled:
+        offsets = np.array([(row.date - first_day).days for row in scheduled])
+        cents = np.array([row.amount_cents for row in scheduled], dtype=np.int64)
+        is_income = np.array([row.type == "INCOME" for row in scheduled])
+        np.add.at(income, offsets[is_income], cents[is_income])
+        np.add.at(expense, offsets[~is_income], cents[~is_income])
+
+    # Seasonal flows: per category and month of the horizon, the average less what is
+    # already entered for that month (realised so far, or future-dated and scheduled above)
+    keys, averages, realised = seasonal_averages(db, family_id, today, history_years)
+    current = today.year * 12 + today.month - 1
+    horizon, position = np.unique(month_index, return_inverse=True)
+    booked = np.zeros((len(keys), len(horizon)))
+    booked[:, horizon == current] += realised[:, None]
+    if keys:
+        key_of = {key: i for i, key in enumerate(keys)}
+        year_of = extract("year", models.Movement.date)
+        month_of = extract("month", models.Movement.date)
+        future = db.execute(
+            select(models.Movement.type, models.Movement.category, year_of, month_of,
+                   func.sum(models.Movement.amount_cents))
+            .where(
+                models.Movement.family_id == family_id, # Filter by family
+                models.Movement.date.between(first_day, end),
+                models.Movement.is_planned == False,
+                models.Movement.from_recurring_id.is_(None),
+            )
+            .group_by(models.Movement.type, models.Movement.category, year_of, month_of)
+        ).all()
+        for type_, category, year, month, cents in future:
+            if (type_, category) in key_of:
+                booked[key_of[type_, category], np.searchsorted(horizon, year * 12 + month - 1)] += cents
+    expected = np.maximum(averages[:, horizon % 12] - booked, 0)
+    is_income = np.array([key[0] == "INCOME" for key in keys], dtype=bool)
+    # Spread evenly over the days of each month; in the current month over the days left
+    spread_days = days_in_month.astype(np.float64)
+    in_current_month = month_index == current
+    spread_days[in_current_month] = in_current_month.sum()
+    seasonal_income = expected[is_income].sum(axis=0)[position] / spread_days
+    seasonal_expense = expected[~is_income].sum(axis=0)[position] / spread_days
+
+    daily_income = income + seasonal_income
+    daily_expense = expense + seasonal_expense
+    balance = start_balance + np.cumsum(daily_income - daily_expense)
+
+    if granularity == "monthly":
+        # Month boundaries: first day index of every month in the horizon
+        starts = np.flatnonzero(np.r_[True, month_index[1:] != month_index[:-1]])
+        ends = np.r_[starts[1:], n_days] - 1
+        period_dates = days[ends]
+        period_income = np.add.reduceat(daily_income, starts)
+        period_expense = np.add.reduceat(daily_expense, starts)
+        period_balance = balance[ends]
+    else:
+        period_dates, period_income, period_expense, period_balance = days, daily_income, daily_expense, balance
+
+    def money(values):
+        return [Money.from_cents(int(cents)) for cents in np.rint(values)]
+
+    lowest = int(np.argmin(balance)) if n_days else None
+    return {
+        "as_of": today,
+        "granularity": granularity,
+        "months": months,
+        "start_balance": Money.from_cents(start_balance),
+        "dates": period_dates.astype(object).tolist(),
+        "income": money(period_income),
+        "expense": money(period_expense),
+        "balance": money(period_balance),
+        "lowest": {
+            "date": days[lowest].astype(object),
+            "balance": Money.from_cents(int(np.rint(balance[lowest]))),
+        } if lowest is not None else None,
+    }
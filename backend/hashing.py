@@ -1,9 +1,26 @@
+import time
+from contextlib import contextmanager
+
 from passlib.context import CryptContext
 
+import metrics
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+@contextmanager
+def _measured(operation):
+    metrics.PASSWORD_HASH_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.PASSWORD_HASH_IN_FLIGHT.dec()
+        metrics.PASSWORD_HASH_SECONDS.labels(operation).observe(time.perf_counter() - start)
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    with _measured("verify"):
+        return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    with _measured("hash"):
+        return pwd_context.hash(password)
@@ -1,13 +1,14 @@
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine
-from models import Base, Family, User
+from models import Family, User
+import migrator
 from hashing import get_password_hash
 
 def initialize_database():
     """Initialize database with Family and Admin user"""
-    # Create all tables
-    Base.metadata.create_all(bind=engine)
-    print("Database tables created.")
+    # Create or upgrade all tables
+    migrator.upgrade(engine)
+    print("Database schema up to date.")
     
     db = SessionLocal()
     try:
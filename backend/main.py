@@ -3,17 +3,33 @@ from fastapi.middleware.cors import CORSMiddleware
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
-from database import engine, Base
-from routers import movements, budgets, dashboard, auth, users, categories, config, recurring, families, search, goals
+from database import engine
+from routers import movements, budgets, dashboard, auth, users, categories, config, recurring, families, search, goals, jobs, analytics, forecast, notifications, events, sync, batch, debug
+from routers import metrics as metrics_router
+import migrator
+import compressor
+import querystats
+import metrics
+import scheduler
+import os
 
-Base.metadata.create_all(bind=engine)
+# Schema is managed by migrator.py; AUTO_MIGRATE=1 applies pending steps at startup
+if os.getenv("AUTO_MIGRATE", "0") == "1":
+    migrator.upgrade(engine)
+else:
+    migrator.verify_schema(engine)
 
 # Rate limiting
 limiter = Limiter(key_func=get_remote_address)
 
 app = FastAPI(title="SpeseCasa Lite API")
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+def rate_limit_exceeded(request: Request, exc: RateLimitExceeded):
+    metrics.RATE_LIMITED.labels(metrics.route_name(request.scope)).inc()
+    return _rate_limit_exceeded_handler(request, exc)
+
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded)
 
 # Security headers middleware
 @app.middleware("http")
@@ -25,6 +41,9 @@ async def add_security_headers(request: Request, call_next):
     response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
     return response
 
+# gzip (br/zstd when installed) for JSON and text responses; streamed responses pass through
+app.add_middleware(compressor.CompressionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -33,6 +52,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus series per route (GET /metrics); inside QueryStatsMiddleware to read its SQL counts
+app.add_middleware(metrics.MetricsMiddleware)
+
+# SQL count and time per request: Server-Timing header and /api/debug/queries
+app.add_middleware(querystats.QueryStatsMiddleware)
+
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(families.router)  # NEW: Family management
@@ -44,6 +69,26 @@ app.include_router(config.router)
 app.include_router(recurring.router)
 app.include_router(search.router)  # NEW: Global search
 app.include_router(goals.router)   # NEW: Savings Goals
+app.include_router(jobs.router)    # Background jobs (superadmin)
+app.include_router(analytics.router)
+app.include_router(forecast.router)
+app.include_router(notifications.router)  # Budget alerts
+app.include_router(events.router)  # Live change feed (SSE)
+app.include_router(sync.router)    # Delta sync for offline clients
+app.include_router(batch.router)   # Several GETs in one request
+app.include_router(debug.router)   # Query stats per route (superadmin)
+app.include_router(metrics_router.router)  # Prometheus exposition
+
+# Background jobs run in every worker; leases in the jobs table keep each run on one worker
+@app.on_event("startup")
+def start_scheduler():
+    if scheduler.SCHEDULER_ENABLED:
+        scheduler.scheduler.start()
+
+@app.on_event("shutdown")
+def stop_scheduler():
+    scheduler.scheduler.stop()
+    metrics.mark_process_dead()
 
 @app.get("/")
 def read_root():
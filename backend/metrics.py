@@ -0,0 +1,146 @@
+"""
+Prometheus metrics, exposed on GET /metrics.
+
+MetricsMiddleware records, per route template (`/api/movements/{movement_id}`,
+never the raw path): request count by status, a latency histogram, and the
+SQL statements and time measured by querystats.py. Requests in flight, the
+SQLAlchemy pool, rate-limit rejections, password hashing and the SSE
+connections have their own series.
+
+Other subsystems register their series with the factories below (names get
+the `spesecasa_` prefix) and update them inline:
+
+    HITS = metrics.counter("refcache_events_total", "Reference cache events", ["collection", "event"])
+    HITS.labels("budgets", "hit").inc()
+
+Several uvicorn workers: set PROMETHEUS_MULTIPROC_DIR to an empty directory
+shared by the workers (`python metrics.py prepare` empties it before start).
+Each worker then writes its values there and /metrics, whichever worker
+answers, aggregates all of them. Without it, /metrics only covers the worker
+that serves the scrape.
+
+METRICS_TOKEN, when set, must be sent as `Authorization: Bearer <token>`.
+"""
+import os
+import shutil
+import sys
+import time
+
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess
+
+import querystats, tenancy
+from database import engine
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+TOKEN = os.getenv("METRICS_TOKEN")
+PREFIX = "spesecasa_"
+
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)  # unlabelled series open their files at import
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def counter(name: str, documentation: str, labels=()) -> Counter:
+    return Counter(PREFIX + name, documentation, list(labels))
+
+
+def gauge(name: str, documentation: str, labels=()) -> Gauge:
+    # livesum: in multiprocess mode, the sum over the running workers
+    return Gauge(PREFIX + name, documentation, list(labels), multiprocess_mode="livesum")
+
+
+def histogram(name: str, documentation: str, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+    return Histogram(PREFIX + name, documentation, list(labels), buckets=buckets)
+
+
+REQUESTS = counter("http_requests_total", "HTTP requests", ["method", "route", "status"])
+LATENCY = histogram("http_request_duration_seconds", "HTTP request latency", ["method", "route"])
+IN_FLIGHT = gauge("http_requests_in_flight", "HTTP requests being served")
+DB_STATEMENTS = counter("db_statements_total", "SQL statements run by HTTP requests", ["method", "route"])
+DB_SECONDS = counter("db_seconds_total", "Time spent in SQL by HTTP requests", ["method", "route"])
+N_PLUS_ONE = counter("db_n_plus_one_requests_total", "Requests with an N+1 suspect (see querystats.py)", ["method", "route"])
+POOL_CHECKED_OUT = gauge("db_pool_checked_out", "Connections in use from the main engine pool")
+POOL_SIZE = gauge("db_pool_size", "Size of the main engine pool")
+POOL_OVERFLOW = gauge("db_pool_overflow", "Overflow connections of the main engine pool (negative until the pool is full)")
+TENANT_ENGINES = gauge("db_tenant_engines", "Open per-family engines (TENANCY_MODE=per_family)")
+RATE_LIMITED = counter("rate_limited_total", "Requests rejected by the rate limiter", ["route"])
+PASSWORD_HASH_SECONDS = histogram("password_hash_seconds", "bcrypt hash and verify time", ["operation"],
+                                  buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0))
+PASSWORD_HASH_IN_FLIGHT = gauge("password_hash_in_flight", "bcrypt hashes and verifications running or waiting")
+SSE_CONNECTIONS = gauge("sse_connections", "Open /api/events streams")
+
+
+def route_name(scope) -> str:
+    route = scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
+def update_pool_gauges():
+    pool = engine.pool
+    for gauge_, read in ((POOL_CHECKED_OUT, "checkedout"), (POOL_SIZE, "size"), (POOL_OVERFLOW, "overflow")):
+        if hasattr(pool, read):
+            gauge_.set(getattr(pool, read)())
+    TENANT_ENGINES.set(len(tenancy.router.open_engines()))
+
+
+def render() -> bytes:
+    update_pool_gauges()
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def mark_process_dead():
+    """Drop this worker's live gauges from the aggregation (call on shutdown)."""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.dec()
+            method, route = scope["method"], route_name(scope)
+            REQUESTS.labels(method, route, str(status)).inc()
+            LATENCY.labels(method, route).observe(time.perf_counter() - start)
+            stats = querystats.current()
+            if stats is not None:
+                DB_STATEMENTS.labels(method, route).inc(stats.queries)
+                DB_SECONDS.labels(method, route).inc(stats.db_seconds)
+                if stats.suspects():
+                    N_PLUS_ONE.labels(method, route).inc()
+            update_pool_gauges()
+
+
+def prepare():
+    """Empty PROMETHEUS_MULTIPROC_DIR: values of a previous run must not be aggregated."""
+    if MULTIPROC_DIR:
+        shutil.rmtree(MULTIPROC_DIR, ignore_errors=True)
+        os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["prepare"]:
+        sys.exit("Usage: python metrics.py prepare")
+    prepare()
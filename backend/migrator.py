@@ -0,0 +1,408 @@
+"""
+Versioned schema migrations.
+
+Every schema change is an ordered, idempotent step registered with @migration.
+Applied steps are recorded in the `schema_version` table, so each step runs once
+per database. Data backfills go through `MigrationContext.backfill` (and deletes
+through `purge`), which process large tables in bounded id ranges (one short transaction per chunk), reports
+progress and resumes from the last completed chunk if interrupted.
+
+Usage:
+    python migrator.py            # apply pending migrations
+    python migrator.py status     # show current and expected version
+"""
+import sys
+from datetime import datetime
+
+from sqlalchemy import (
+    MetaData, Table, Column, Integer, String, DateTime, Boolean, inspect, select, func, text,
+)
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateTable
+
+from database import Base, engine as default_engine
+import models  # noqa: F401  (registers the tables on Base.metadata)
+
+BACKFILL_CHUNK_SIZE = 1000
+
+_meta = MetaData()
+
+schema_version_table = Table(
+    "schema_version", _meta,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+backfill_progress_table = Table(
+    "schema_backfill_progress", _meta,
+    Column("name", String, primary_key=True),
+    Column("last_id", Integer, nullable=False, default=0),
+    Column("done", Boolean, nullable=False, default=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+_MIGRATIONS = []
+
+
+def migration(version: int, description: str):
+    """Register a migration step. Steps run in version order and must be idempotent."""
+    def decorator(fn):
+        if any(existing[0] == version for existing in _MIGRATIONS):
+            raise ValueError(f"Duplicate migration version {version}")
+        _MIGRATIONS.append((version, description, fn))
+        _MIGRATIONS.sort(key=lambda step: step[0])
+        return fn
+    return decorator
+
+
+class MigrationContext:
+    """Helpers handed to each migration step."""
+
+    def __init__(self, engine, tables=None, progress=print):
+        self.engine = engine
+        # Tables this database holds (all of them, or the family tables of a tenant database)
+        self.tables = set(tables) if tables is not None else set(Base.metadata.tables)
+        self.progress = progress or (lambda message: None)
+
+    def manages(self, table: str) -> bool:
+        return table in self.tables
+
+    def has_table(self, table: str) -> bool:
+        return inspect(self.engine).has_table(table)
+
+    def columns(self, table: str) -> set:
+        return {column["name"] for column in inspect(self.engine).get_columns(table)}
+
+    def nullable(self, table: str, column: str) -> bool:
+        return next(c["nullable"] for c in inspect(self.engine).get_columns(table) if c["name"] == column)
+
+    def execute(self, sql: str, params: dict = None):
+        with self.engine.begin() as conn:
+            return conn.execute(text(sql), params or {})
+
+    def add_column(self, table: str, column: str, ddl: str) -> bool:
+        """Add a column if the table is managed here and lacks it. Returns True if added."""
+        if not self.manages(table) or not self.has_table(table) or column in self.columns(table):
+            return False
+        self.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+        self.progress(f"   + {table}.{column}")
+        return True
+
+    def rebuild(self, table: str):
+        """
+        Recreate `table` as models.py declares it, keeping its rows and indexes.
+
+        SQLite cannot change the constraints of an existing column (no ALTER
+        COLUMN): the rows are copied into a new table, which then takes the old
+        one's name. Copy, drop and rename commit together.
+        """
+        model = Base.metadata.tables[table]
+        existing = self.columns(table)
+        columns = ", ".join(column.name for column in model.columns if column.name in existing)
+        indexes = self.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :table AND sql IS NOT NULL",
+            {"table": table},
+        ).scalars().all()
+        new_table = f"_rebuild_{table}"
+        create = str(CreateTable(model).compile(dialect=self.engine.dialect)).strip()
+        create = create.replace(f"CREATE TABLE {table} (", f"CREATE TABLE {new_table} (", 1)
+
+        self.execute(f"DROP TABLE IF EXISTS {new_table}")  # left over by an interrupted run
+        with self.engine.begin() as conn:
+            conn.execute(text(create))
+            conn.execute(text(f"INSERT INTO {new_table} ({columns}) SELECT {columns} FROM {table}"))
+            conn.execute(text(f"DROP TABLE {table}"))
+            conn.execute(text(f"ALTER TABLE {new_table} RENAME TO {table}"))
+            for sql in indexes:
+                conn.execute(text(sql))
+        self.progress(f"   ~ {table} rebuilt")
+
+    def backfill_pending(self, name: str) -> bool:
+        """True if a backfill was started but not completed (e.g. the process was killed)."""
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(backfill_progress_table.c.done).where(backfill_progress_table.c.name == name)
+            ).first()
+        return row is not None and not row[0]
+
+    def backfill(self, name: str, table: str, set_sql: str, where_sql: str = "1 = 1",
+                 params: dict = None, chunk_size: int = BACKFILL_CHUNK_SIZE) -> int:
+        """
+        Run `UPDATE table SET set_sql WHERE where_sql` in chunks of `chunk_size` ids.
+
+        Each chunk commits on its own so the database is never locked for the whole
+        table, and the last processed id is persisted so a rerun resumes from there.
+        """
+        return self._chunked(name, table, f"UPDATE {table} SET {set_sql}", where_sql, params, chunk_size)
+
+    def purge(self, name: str, table: str, where_sql: str,
+              params: dict = None, chunk_size: int = BACKFILL_CHUNK_SIZE) -> int:
+        """Run `DELETE FROM table WHERE where_sql` in resumable chunks, like backfill."""
+        return self._chunked(name, table, f"DELETE FROM {table}", where_sql, params, chunk_size)
+
+    def _chunked(self, name: str, table: str, statement: str, where_sql: str,
+                 params: dict, chunk_size: int) -> int:
+        if not self.manages(table) or not self.has_table(table):
+            return 0
+
+        with self.engine.begin() as conn:
+            row = conn.execute(
+                select(backfill_progress_table.c.last_id, backfill_progress_table.c.done)
+                .where(backfill_progress_table.c.name == name)
+            ).first()
+            if row and row.done:
+                return 0
+            last_id = row.last_id if row else 0
+            if not row:
+                conn.execute(backfill_progress_table.insert().values(
+                    name=name, last_id=0, done=False, updated_at=datetime.utcnow()
+                ))
+            max_id = conn.execute(text(f"SELECT MAX(id) FROM {table}")).scalar() or 0
+
+        updated = 0
+        while last_id < max_id:
+            upper = min(last_id + chunk_size, max_id)
+            with self.engine.begin() as conn:
+                result = conn.execute(
+                    text(f"{statement} WHERE id > :_lo AND id <= :_hi AND ({where_sql})"),
+                    {"_lo": last_id, "_hi": upper, **(params or {})},
+                )
+                conn.execute(
+                    backfill_progress_table.update()
+                    .where(backfill_progress_table.c.name == name)
+                    .values(last_id=upper, updated_at=datetime.utcnow())
+                )
+            updated += max(result.rowcount, 0)
+            last_id = upper
+            self.progress(f"   {name}: id {last_id}/{max_id}, {updated} rows")
+
+        with self.engine.begin() as conn:
+            conn.execute(
+                backfill_progress_table.update()
+                .where(backfill_progress_table.c.name == name)
+                .values(done=True, updated_at=datetime.utcnow())
+            )
+        return updated
+
+
+# ---------------------------------------------------------------------------
+# Migration steps
+# ---------------------------------------------------------------------------
+
+@migration(1, "Baseline schema")
+def _baseline(ctx: MigrationContext):
+    # Creates missing tables only; existing tables are upgraded by the steps below
+    tables = [table for name, table in Base.metadata.tables.items() if ctx.manages(name)]
+    Base.metadata.create_all(bind=ctx.engine, tables=tables)
+
+
+@migration(2, "User first and last name")
+def _user_names(ctx: MigrationContext):
+    ctx.add_column("users", "first_name", "VARCHAR")
+    ctx.add_column("users", "last_name", "VARCHAR")
+
+
+@migration(3, "Multi-tenancy: family_id on family-owned tables")
+def _family_ids(ctx: MigrationContext):
+    for table in ["users", "movements", "budgets", "categories", "recurring_expenses"]:
+        backfill_name = f"{table}.family_id"
+        added = ctx.add_column(table, "family_id", "INTEGER REFERENCES families(id)")
+        if not (added or ctx.backfill_pending(backfill_name)):
+            continue
+        if not ctx.has_table("families"):
+            continue  # tenant database: rows are already scoped by file
+
+        # Pre multi-tenancy data all belongs to the default family
+        family_id = ctx.execute("SELECT id FROM families WHERE name = 'Famiglia Rossi'").scalar()
+        if family_id is None:
+            ctx.execute(
+                "INSERT INTO families (name, created_at) VALUES ('Famiglia Rossi', :now)",
+                {"now": datetime.utcnow()},
+            )
+            family_id = ctx.execute("SELECT id FROM families WHERE name = 'Famiglia Rossi'").scalar()
+        ctx.backfill(backfill_name, table, "family_id = :family_id", "family_id IS NULL", {"family_id": family_id})
+
+
+@migration(4, "Movement audit fields")
+def _movement_audit(ctx: MigrationContext):
+    ctx.add_column("movements", "created_by_user_id", "INTEGER REFERENCES users(id)")
+    ctx.add_column("movements", "last_modified_by_user_id", "INTEGER REFERENCES users(id)")
+    ctx.add_column("movements", "last_modified_at", "DATETIME")
+    ctx.backfill(
+        "movements.audit_fields", "movements",
+        "created_by_user_id = COALESCE(created_by_user_id, user_id), "
+        "last_modified_by_user_id = COALESCE(last_modified_by_user_id, user_id), "
+        "last_modified_at = COALESCE(last_modified_at, created_at)",
+        "created_by_user_id IS NULL OR last_modified_by_user_id IS NULL OR last_modified_at IS NULL",
+    )
+
+
+@migration(5, "Money as integer cents")
+def _integer_cents(ctx: MigrationContext):
+    money_columns = [
+        ("movements", "amount", "amount_cents"),
+        ("budgets", "amount", "amount_cents"),
+        ("recurring_expenses", "amount", "amount_cents"),
+        ("savings_goals", "target_amount", "target_amount_cents"),
+        ("savings_goals", "current_amount", "current_amount_cents"),
+    ]
+    for table, old, new in money_columns:
+        if not ctx.manages(table) or not ctx.has_table(table) or old not in ctx.columns(table):
+            continue  # created with cents by the baseline, or already converted
+        ctx.add_column(table, new, "INTEGER")
+        ctx.backfill(
+            f"{table}.{new}", table,
+            # Round to 2 decimals first, as schemas.to_cents does (0.285 -> 29, not 28)
+            f"{new} = CAST(ROUND(ROUND(CAST({old} AS NUMERIC), 2) * 100) AS INTEGER)",
+            f"{new} IS NULL AND {old} IS NOT NULL",
+        )
+        # The float column goes away so inserts don't trip over its NOT NULL constraint
+        ctx.execute(f"ALTER TABLE {table} DROP COLUMN {old}")
+        ctx.progress(f"   - {table}.{old}")
+
+
+@migration(6, "Index movements by recurring expense")
+def _movement_recurring_index(ctx: MigrationContext):
+    if ctx.manages("movements"):
+        ctx.execute("CREATE INDEX IF NOT EXISTS ix_movements_from_recurring_id ON movements (from_recurring_id)")
+
+
+@migration(7, "Project recurring expenses instead of storing planned rows")
+def _drop_planned_recurring_rows(ctx: MigrationContext):
+    # Unconfirmed occurrences are now computed on the fly; only confirmed ones are movements
+    ctx.purge("movements.planned_recurring", "movements",
+              "from_recurring_id IS NOT NULL AND is_confirmed = 0 AND is_planned = 1")
+
+
+@migration(8, "Background job tables")
+def _job_tables(ctx: MigrationContext):
+    tables = [Base.metadata.tables[name] for name in ("jobs", "job_runs") if ctx.manages(name)]
+    Base.metadata.create_all(bind=ctx.engine, tables=tables)
+
+
+@migration(9, "Budget applicable months as a 12-bit mask")
+def _budget_month_mask(ctx: MigrationContext):
+    if not ctx.manages("budgets") or not ctx.has_table("budgets"):
+        return
+    if "applicable_months" in ctx.columns("budgets"):
+        ctx.add_column("budgets", "applicable_months_mask", "INTEGER NOT NULL DEFAULT 4095")
+        ctx.backfill(
+            "budgets.applicable_months_mask", "budgets",
+            # JSON list of month numbers -> bit (month - 1); NULL or [] means every month
+            "applicable_months_mask = COALESCE("
+            "(SELECT SUM(DISTINCT 1 << (value - 1)) FROM json_each(budgets.applicable_months)), 4095)",
+            "applicable_months IS NOT NULL AND applicable_months NOT IN ('', '[]', 'null')",
+        )
+        ctx.execute("ALTER TABLE budgets DROP COLUMN applicable_months")
+        ctx.progress("   - budgets.applicable_months")
+    ctx.execute("CREATE INDEX IF NOT EXISTS ix_budgets_applicable_months_mask ON budgets (applicable_months_mask)")
+
+
+@migration(10, "Index movements by family and date")
+def _movement_family_date_index(ctx: MigrationContext):
+    # Family + date range is the filter of nearly every movement query; without it
+    # SQLite tends to pick the low-selectivity is_planned/type indexes
+    if ctx.manages("movements"):
+        ctx.execute("CREATE INDEX IF NOT EXISTS ix_movements_family_date ON movements (family_id, date)")
+
+
+@migration(11, "Category spending statistics for anomaly detection")
+def _category_stats(ctx: MigrationContext):
+    tables = [Base.metadata.tables[name] for name in ("category_month_totals", "category_stats") if ctx.manages(name)]
+    if not tables or not ctx.has_table("movements"):
+        return
+    Base.metadata.create_all(bind=ctx.engine, tables=tables)
+    import anomalies
+    with Session(bind=ctx.engine) as session:
+        ctx.progress(f"   - {anomalies.backfill(session)} category-months")
+
+
+@migration(12, "Notifications table")
+def _notifications(ctx: MigrationContext):
+    if ctx.manages("notifications"):
+        Base.metadata.create_all(bind=ctx.engine, tables=[Base.metadata.tables["notifications"]])
+
+
+@migration(13, "Sync log for delta sync")
+def _sync_log(ctx: MigrationContext):
+    if not ctx.manages("sync_log"):
+        return
+    Base.metadata.create_all(bind=ctx.engine, tables=[Base.metadata.tables["sync_log"]])
+    # Existing rows get a first version, so a client syncing from 0 receives them
+    for entity, table, deleted in (
+        ("category", "categories", "0"),
+        ("budget", "budgets", "0"),
+        ("recurring", "recurring_expenses", "COALESCE(NOT is_active, 0)"),
+        ("goal", "savings_goals", "0"),
+        ("movement", "movements", "0"),
+    ):
+        if ctx.manages(table) and ctx.has_table(table):
+            ctx.execute(
+                f"INSERT OR IGNORE INTO sync_log (family_id, entity, entity_id, deleted) "
+                f"SELECT family_id, '{entity}', id, {deleted} FROM {table} ORDER BY id"
+            )
+            ctx.progress(f"   - {table}")
+
+
+@migration(14, "Money columns NOT NULL where the models declare it")
+def _money_not_null(ctx: MigrationContext):
+    # Step 5 had to add the cents columns as nullable (SQLite cannot add a NOT NULL
+    # column without a default); the floats they replace were NOT NULL here
+    for table, column in (("recurring_expenses", "amount_cents"), ("savings_goals", "target_amount_cents")):
+        if ctx.manages(table) and ctx.has_table(table) and ctx.nullable(table, column):
+            ctx.rebuild(table)
+
+
+SCHEMA_VERSION = _MIGRATIONS[-1][0]
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+def current_version(engine=default_engine) -> int:
+    if not inspect(engine).has_table(schema_version_table.name):
+        return 0
+    with engine.connect() as conn:
+        return conn.execute(select(func.max(schema_version_table.c.version))).scalar() or 0
+
+
+def upgrade(engine=default_engine, tables=None, progress=print) -> int:
+    """Apply every pending migration step. Returns the resulting schema version."""
+    _meta.create_all(bind=engine)
+    ctx = MigrationContext(engine, tables=tables, progress=progress)
+    version = current_version(engine)
+
+    for step_version, description, fn in _MIGRATIONS:
+        if step_version <= version:
+            continue
+        ctx.progress(f"Applying migration {step_version}: {description}")
+        fn(ctx)
+        with engine.begin() as conn:
+            conn.execute(schema_version_table.insert().values(
+                version=step_version, description=description, applied_at=datetime.utcnow()
+            ))
+        version = step_version
+    return version
+
+
+def verify_schema(engine=default_engine):
+    """Raise if the database is not at the schema version this code expects."""
+    version = current_version(engine)
+    if version < SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {SCHEMA_VERSION}. "
+            f"Run `python migrator.py` to upgrade."
+        )
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema version {version} is newer than this code ({SCHEMA_VERSION})."
+        )
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        print(f"Schema version: {current_version()} (expected {SCHEMA_VERSION})")
+    else:
+        print(f"Schema version {upgrade()} (latest {SCHEMA_VERSION})")
@@ -1,10 +1,51 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Enum, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Date, DateTime, Enum, Boolean, ForeignKey, Text, Index, Float, UniqueConstraint, literal
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
+from sqlalchemy.ext.hybrid import hybrid_property
 import enum
+import json
 from database import Base
+from schemas import Money, to_cents
 from datetime import datetime
 
+# Months as a 12-bit mask: bit 0 is January, bit 11 December
+ALL_MONTHS = (1 << 12) - 1
+
+def months_to_mask(months) -> int:
+    """Month numbers (or a legacy JSON list) to a mask; none means every month."""
+    if isinstance(months, str):
+        months = json.loads(months) if months else None
+    if not months:
+        return ALL_MONTHS
+    return sum(1 << (month - 1) for month in set(months))
+
+def mask_to_months(mask):
+    """Sorted month numbers, or None when the mask covers every month."""
+    if mask is None or mask == ALL_MONTHS:
+        return None
+    return [month for month in range(1, 13) if mask & (1 << (month - 1))]
+
+def month_list(mask_attr: str):
+    """List view of a month-mask column: None (every month) or the month numbers."""
+    return hybrid_property(
+        lambda self: mask_to_months(getattr(self, mask_attr)),
+        lambda self, value: setattr(self, mask_attr, months_to_mask(value)),
+        expr=lambda cls: getattr(cls, mask_attr),
+        update_expr=lambda cls, value: [(getattr(cls, mask_attr), months_to_mask(value))],
+    )
+
+def money(cents_attr: str):
+    """
+    Euro view of an integer-cents column: reads as Money, accepts euro amounts on
+    assignment and in ORM UPDATE values, and is `cents / 100.0` in SQL.
+    """
+    return hybrid_property(
+        lambda self: Money.from_cents(getattr(self, cents_attr)),
+        lambda self, value: setattr(self, cents_attr, to_cents(value)),
+        expr=lambda cls: getattr(cls, cents_attr) / 100.0,
+        update_expr=lambda cls, value: [(getattr(cls, cents_attr), to_cents(value))],
+    )
+
 class MovementType(str, enum.Enum):
     INCOME = "INCOME"
     EXPENSE = "EXPENSE"
@@ -53,16 +94,19 @@ class Category(Base):
 
 class Movement(Base):
     __tablename__ = "movements"
+    # Server-side defaults come back with the INSERT/UPDATE (RETURNING) instead of a refresh
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (Index("ix_movements_family_date", "family_id", "date"),)
 
     id = Column(Integer, primary_key=True, index=True)
     type = Column(String, index=True)
     date = Column(Date, index=True)
-    amount = Column(Float)
+    amount_cents = Column(Integer)
     category = Column(String, index=True) # Legacy string column
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
     description = Column(String, nullable=True)
     is_planned = Column(Boolean, default=False, index=True)
-    from_recurring_id = Column(Integer, ForeignKey("recurring_expenses.id"), nullable=True)
+    from_recurring_id = Column(Integer, ForeignKey("recurring_expenses.id"), nullable=True, index=True)
     is_confirmed = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
@@ -73,6 +117,8 @@ class Movement(Base):
     last_modified_by_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     last_modified_at = Column(DateTime(timezone=True), nullable=True)
 
+    amount = money("amount_cents")
+
     user = relationship("User", foreign_keys=[user_id])
     family = relationship("Family", back_populates="movements")
     category_rel = relationship("Category", back_populates="movements")
@@ -82,10 +128,11 @@ class Movement(Base):
 
 class RecurringExpense(Base):
     __tablename__ = "recurring_expenses"
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
-    amount = Column(Float, nullable=False)
+    amount_cents = Column(Integer, nullable=False)
     category = Column(String, index=True)
     description = Column(String, nullable=True)
     recurrence_type = Column(String, default="monthly")
@@ -98,6 +145,8 @@ class RecurringExpense(Base):
     family_id = Column(Integer, ForeignKey("families.id"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    amount = money("amount_cents")
+
     user = relationship("User")
     family = relationship("Family", back_populates="recurring_expenses")
     generated_movements = relationship("Movement", back_populates="recurring_source")
@@ -107,31 +156,110 @@ class Budget(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     category = Column(String, index=True)
-    amount = Column(Float)
+    amount_cents = Column(Integer)
     month = Column(Integer)
     year = Column(Integer)
-    applicable_months = Column(Text, nullable=True)
+    applicable_months_mask = Column(Integer, nullable=False, default=ALL_MONTHS, index=True)
     family_id = Column(Integer, ForeignKey("families.id"), nullable=True)
 
+    amount = money("amount_cents")
+    applicable_months = month_list("applicable_months_mask")
+
+    @classmethod
+    def applies_in(cls, month):
+        """SQL test: the budget applies in `month` (a number or a month expression)."""
+        return cls.applicable_months_mask.op("&")(literal(1).op("<<")(month - 1)) != 0
+
     family = relationship("Family", back_populates="budgets")
 
 class SavingsGoal(Base):
     __tablename__ = "savings_goals"
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
-    target_amount = Column(Float, nullable=False)
-    current_amount = Column(Float, default=0.0)
+    target_amount_cents = Column(Integer, nullable=False)
+    current_amount_cents = Column(Integer, default=0)
     deadline = Column(Date, nullable=True)
     color = Column(String, default="#10b981")
     icon = Column(String, nullable=True)
     family_id = Column(Integer, ForeignKey("families.id"), nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    target_amount = money("target_amount_cents")
+    current_amount = money("current_amount_cents")
+
     family = relationship("Family", back_populates="savings_goals")
 
+class CategoryMonthTotal(Base):
+    """Actual expenses of a category in a month, kept up to date on every movement write."""
+    __tablename__ = "category_month_totals"
+    __table_args__ = (UniqueConstraint("family_id", "category", "month_index"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    family_id = Column(Integer, ForeignKey("families.id"), nullable=True, index=True)
+    category = Column(String, nullable=False)
+    month_index = Column(Integer, nullable=False)  # year * 12 + month - 1
+    expense_cents = Column(Integer, nullable=False, default=0)
+
+class CategoryStats(Base):
+    """EWMA mean and variance of a category's monthly totals, folded up to `last_month`."""
+    __tablename__ = "category_stats"
+    __table_args__ = (UniqueConstraint("family_id", "category"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    family_id = Column(Integer, ForeignKey("families.id"), nullable=True, index=True)
+    category = Column(String, nullable=False)
+    first_month = Column(Integer, nullable=False)
+    last_month = Column(Integer, nullable=False)
+    months = Column(Integer, nullable=False)
+    mean_cents = Column(Float, nullable=False)
+    variance = Column(Float, nullable=False)
+
+class SyncLog(Base):
+    """
+    Latest change of every synced row, one entry per row. The id is the sync
+    version: rewriting the entry on each change gives it a new, higher id
+    (AUTOINCREMENT never reuses ids). Deleted rows stay as tombstones.
+    """
+    __tablename__ = "sync_log"
+    __table_args__ = (
+        UniqueConstraint("entity", "entity_id"),
+        Index("ix_sync_log_family_version", "family_id", "id"),
+        {"sqlite_autoincrement": True},
+    )
+
+    id = Column(Integer, primary_key=True)
+    family_id = Column(Integer, ForeignKey("families.id"), nullable=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    deleted = Column(Boolean, default=False, nullable=False)
+
+class Notification(Base):
+    """Alert shown to a family; the unique key makes each alert fire once per month."""
+    __tablename__ = "notifications"
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (UniqueConstraint("family_id", "kind", "category", "year", "month", "threshold"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    family_id = Column(Integer, ForeignKey("families.id"), nullable=True, index=True)
+    kind = Column(String, nullable=False)  # budget_threshold
+    category = Column(String, nullable=True)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    threshold = Column(Integer, nullable=True)  # percent of the budget
+    spent_cents = Column(Integer, nullable=True)
+    limit_cents = Column(Integer, nullable=True)
+    message = Column(String, nullable=False)
+    is_read = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    spent = money("spent_cents")
+    limit = money("limit_cents")
+
 class SMTPConfig(Base):
     __tablename__ = "smtp_config"
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True)
     smtp_server = Column(String, nullable=False)
@@ -144,6 +272,7 @@ class SMTPConfig(Base):
 
 class PasswordResetToken(Base):
     __tablename__ = "password_reset_tokens"
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -151,3 +280,36 @@ class PasswordResetToken(Base):
     expires_at = Column(DateTime(timezone=True), nullable=False)
     used = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class Job(Base):
+    """A scheduled unit of work: periodic (cron `schedule`) or one-shot (enqueued)."""
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, nullable=False)  # periodic: handler name; one-shot: handler name + suffix
+    handler = Column(String, nullable=False)
+    schedule = Column(String, nullable=True)  # cron expression, None for one-shot jobs
+    payload = Column(Text, nullable=True)  # JSON
+    status = Column(String, nullable=False, default="scheduled")  # scheduled, done, failed
+    next_run_at = Column(DateTime, nullable=False, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    last_error = Column(Text, nullable=True)
+
+    # Lease: the worker that claimed the job owns it until lease_until
+    lease_owner = Column(String, nullable=True)
+    lease_until = Column(DateTime, nullable=True)
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("jobs.id", ondelete="CASCADE"), nullable=False, index=True)
+    job_name = Column(String, nullable=False)
+    worker = Column(String, nullable=False)
+    attempt = Column(Integer, nullable=False)
+    started_at = Column(DateTime, nullable=False, index=True)
+    finished_at = Column(DateTime, nullable=True)
+    duration_ms = Column(Integer, nullable=True)
+    status = Column(String, nullable=False)  # running, success, error
+    error = Column(Text, nullable=True)
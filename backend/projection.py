@@ -0,0 +1,112 @@
+"""
+Virtual projection of recurring expenses.
+
+Planned occurrences are not stored: they are computed on the fly from the
+active RecurringExpense definitions for the requested period. An occurrence
+becomes a real Movement row only once it is confirmed, and confirmed
+occurrences are left out of the projection.
+"""
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import models, recurrence, refcache
+from schemas import Money
+
+
+@dataclass(frozen=True)
+class ProjectedMovement:
+    """A planned occurrence, shaped like schemas.Movement so it can be listed with real rows."""
+    id: int  # negative, derived from the rule and the date: never clashes with a real row
+    type: str
+    date: date
+    amount_cents: int
+    category: str
+    description: Optional[str]
+    from_recurring_id: int
+    user_id: Optional[int]
+    family_id: int
+    created_at: datetime
+    is_planned: bool = True
+    is_confirmed: bool = False
+    created_by_user_id: Optional[int] = None
+    last_modified_by_user_id: Optional[int] = None
+    last_modified_at: Optional[datetime] = None
+
+    @property
+    def amount(self):
+        return Money.from_cents(self.amount_cents)
+
+
+def projected_id(recurring_id: int, occurrence: date) -> int:
+    return -(recurring_id * 1_000_000 + occurrence.toordinal())
+
+
+def describe(recurring) -> str:
+    return f"[Ricorrente] {recurring.name}" + (f" - {recurring.description}" if recurring.description else "")
+
+
+def active_rules(db: Session, family_id: int, category: str = None):
+    rules = refcache.recurring(db, family_id)
+    return [rule for rule in rules if rule.category == category] if category else list(rules)
+
+
+def confirmed_keys(db: Session, rules, start: date = None, end: date = None) -> set:
+    """(recurring id, occurrence key) of the occurrences already confirmed as movements."""
+    if not rules:
+        return set()
+    by_id = {rule.id: rule for rule in rules}
+    stmt = select(models.Movement.from_recurring_id, models.Movement.date).where(
+        models.Movement.from_recurring_id.in_(list(by_id))
+    )
+    if start:
+        stmt = stmt.where(models.Movement.date >= start)
+    if end:
+        stmt = stmt.where(models.Movement.date <= end)
+    return {
+        (recurring_id, recurrence.occurrence_key(by_id[recurring_id], occurrence))
+        for recurring_id, occurrence in db.execute(stmt)
+    }
+
+
+def project(db: Session, family_id: int, start: date = None, end: date = None,
+            category: str = None, rules=None) -> List[ProjectedMovement]:
+    """Unconfirmed planned occurrences of the family's recurring expenses in [start, end]."""
+    if rules is None:
+        rules = active_rules(db, family_id, category)
+    elif category:
+        rules = [rule for rule in rules if rule.category == category]
+    if not rules:
+        return []
+
+    confirmed = confirmed_keys(db, rules, start, end)
+    projected = []
+    for rule in rules:
+        description = describe(rule)
+        for occurrence in recurrence.occurrences(rule, start, end):
+            if (rule.id, recurrence.occurrence_key(rule, occurrence)) in confirmed:
+                continue
+            projected.append(ProjectedMovement(
+                id=projected_id(rule.id, occurrence),
+                type="EXPENSE",
+                date=occurrence,
+                amount_cents=rule.amount_cents,
+                category=rule.category,
+                description=description,
+                from_recurring_id=rule.id,
+                user_id=rule.user_id,
+                family_id=rule.family_id,
+                created_at=rule.created_at,
+            ))
+    return projected
+
+
+def totals_by_category(projected: List[ProjectedMovement]) -> dict:
+    """Integer cents per category."""
+    totals = {}
+    for movement in projected:
+        totals[movement.category] = totals.get(movement.category, 0) + movement.amount_cents
+    return totals
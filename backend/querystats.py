@@ -0,0 +1,352 @@
+"""
+Per-request SQL instrumentation.
+
+QueryStatsMiddleware opens a RequestStats for every HTTP request; SQLAlchemy
+cursor events on every engine (tenant engines included) add each statement's
+count and duration to it. Statements with the same shape (the SQL text, IN
+lists collapsed) run N_PLUS_ONE_THRESHOLD times or more in one request are
+flagged as N+1 suspects: typically a lazy-loaded relationship or a query in
+a loop.
+
+Each response carries a Server-Timing header, shown by the browser devtools:
+
+    Server-Timing: db;desc="12 queries";dur=4.1, serialize;dur=0.8, app;dur=9.3
+
+and the totals are aggregated per route for GET /api/debug/queries.
+
+Slow-query log: any statement (requests and background jobs alike) taking
+SLOW_QUERY_MS or more is logged with its shape, the types of its bound
+parameters (never the values), the route, the family and the duration, and
+kept in a ring of the last SLOW_QUERY_LOG_SIZE entries for GET
+/api/debug/slow-queries. The query plan is captured once per shape
+(EXPLAIN QUERY PLAN on SQLite, EXPLAIN on PostgreSQL), with the full table
+scans it reveals.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from datetime import datetime
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import routing
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("QUERY_STATS_ENABLED", "1").lower() not in ("0", "false", "no")
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+MAX_SHAPES = 20  # N+1 suspects kept per route
+
+# SLOW_QUERY_MS=0 turns the slow-query log off
+SLOW_QUERY_SECONDS = float(os.getenv("SLOW_QUERY_MS", "100")) / 1000
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "500"))
+MAX_PLANS = 256
+
+_IN_LIST = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def shape(statement: str) -> str:
+    return _WHITESPACE.sub(" ", _IN_LIST.sub("(?)", statement)).strip()
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds", "serialize_seconds", "shapes", "scope", "family_id")
+
+    def __init__(self, scope=None):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.shapes = Counter()
+        self.scope = scope
+        self.family_id = None
+
+    def suspects(self):
+        return {statement: count for statement, count in self.shapes.items() if count >= N_PLUS_ONE_THRESHOLD}
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("query_stats", default=None)
+
+
+def current() -> Optional[RequestStats]:
+    return _current.get()
+
+
+def set_family(family_id: Optional[int]):
+    """Tag the current request with the family it serves (for the slow-query log)."""
+    stats = _current.get()
+    if stats is not None:
+        stats.family_id = family_id
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if SLOW_QUERY_SECONDS > 0 or _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_started")
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        stats.shapes[shape(statement)] += 1
+    if SLOW_QUERY_SECONDS > 0 and elapsed >= SLOW_QUERY_SECONDS:
+        _log_slow(conn, statement, parameters, executemany, elapsed, stats)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    started = context.connection.info.get("query_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+
+@contextmanager
+def serializing():
+    """Time a block as serialization of the current request's response."""
+    stats = _current.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            stats.serialize_seconds += time.perf_counter() - start
+
+
+# FastAPI validates and encodes response_model results in routing.serialize_response
+_serialize_response = routing.serialize_response
+
+
+async def _timed_serialize_response(*args, **kwargs):
+    with serializing():
+        return await _serialize_response(*args, **kwargs)
+
+
+routing.serialize_response = _timed_serialize_response
+
+
+class _RouteStats:
+    __slots__ = ("requests", "queries", "max_queries", "db_seconds", "max_db_seconds",
+                 "serialize_seconds", "app_seconds", "n_plus_one", "suspects")
+
+    def __init__(self):
+        self.requests = self.queries = self.max_queries = self.n_plus_one = 0
+        self.db_seconds = self.max_db_seconds = self.serialize_seconds = self.app_seconds = 0.0
+        self.suspects = Counter()  # statement shape -> requests where it was a suspect
+
+
+_routes = {}
+_lock = threading.Lock()
+
+
+def _record(route: str, stats: RequestStats, app_seconds: float):
+    suspects = stats.suspects()
+    if suspects:
+        logger.warning("N+1 suspect on %s: %s", route,
+                       "; ".join(f"{count}x {statement[:200]}" for statement, count in suspects.items()))
+    with _lock:
+        entry = _routes.get(route)
+        if entry is None:
+            entry = _routes[route] = _RouteStats()
+        entry.requests += 1
+        entry.queries += stats.queries
+        entry.max_queries = max(entry.max_queries, stats.queries)
+        entry.db_seconds += stats.db_seconds
+        entry.max_db_seconds = max(entry.max_db_seconds, stats.db_seconds)
+        entry.serialize_seconds += stats.serialize_seconds
+        entry.app_seconds += app_seconds
+        if suspects:
+            entry.n_plus_one += 1
+            entry.suspects.update(suspects.keys())
+            for statement, _ in entry.suspects.most_common()[MAX_SHAPES:]:
+                del entry.suspects[statement]
+
+
+def report(limit: int = 20, order_by: str = "db_ms"):
+    """The worst routes: totals and per-request averages, sorted by `order_by` (descending)."""
+    with _lock:
+        rows = [
+            {
+                "route": route,
+                "requests": entry.requests,
+                "queries": entry.queries,
+                "avg_queries": round(entry.queries / entry.requests, 1),
+                "max_queries": entry.max_queries,
+                "db_ms": round(entry.db_seconds * 1000, 1),
+                "avg_db_ms": round(entry.db_seconds * 1000 / entry.requests, 2),
+                "max_db_ms": round(entry.max_db_seconds * 1000, 2),
+                "avg_serialize_ms": round(entry.serialize_seconds * 1000 / entry.requests, 2),
+                "avg_app_ms": round(entry.app_seconds * 1000 / entry.requests, 2),
+                "n_plus_one_requests": entry.n_plus_one,
+                "n_plus_one_suspects": [statement for statement, _ in entry.suspects.most_common(5)],
+            }
+            for route, entry in _routes.items()
+        ]
+    if rows and order_by not in rows[0]:
+        raise ValueError(f"Unknown order_by: {order_by}")
+    return sorted(rows, key=lambda row: row[order_by], reverse=True)[:limit]
+
+
+def reset():
+    with _lock:
+        _routes.clear()
+
+
+_slow = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+_plans = OrderedDict()  # shape -> {"plan": [...], "full_scans": [...]}
+
+
+def parameter_shape(parameters, executemany: bool) -> str:
+    """Types of the bound parameters, e.g. "(int, str, date)" or "(int) x 40" for executemany."""
+    rows = parameters if executemany else [parameters]
+    first = rows[0] if rows else ()
+    values = first.values() if isinstance(first, dict) else (first or ())
+    text = "(" + ", ".join(type(value).__name__ for value in values) + ")"
+    return f"{text} x {len(rows)}" if executemany else text
+
+
+_EXPLAIN = {"sqlite": "EXPLAIN QUERY PLAN ", "postgresql": "EXPLAIN "}
+_EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE")
+_FULL_SCAN = re.compile(r"^SCAN (?:TABLE )?(\w+)(?! USING)(?:\s|$)|Seq Scan on (\w+)")
+
+
+def explain(conn, statement: str, parameters, executemany: bool) -> dict:
+    """The plan of `statement`, on a separate DBAPI cursor (EXPLAIN never runs the statement)."""
+    prefix = _EXPLAIN.get(conn.dialect.name)
+    if prefix is None or not statement.lstrip().upper().startswith(_EXPLAINABLE):
+        return {"plan": None, "full_scans": []}
+    if executemany:
+        parameters = parameters[0] if parameters else ()
+    try:
+        cursor = conn.connection.dbapi_connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    except Exception as e:
+        return {"plan": None, "error": str(e), "full_scans": []}
+    # SQLite: (id, parent, notused, detail); PostgreSQL: one text column per line
+    plan = [str(row[-1]) for row in rows]
+    full_scans = sorted({match.group(1) or match.group(2) for line in plan
+                         for match in [_FULL_SCAN.search(line.strip())] if match})
+    return {"plan": plan, "full_scans": full_scans}
+
+
+def _log_slow(conn, statement, parameters, executemany, elapsed, stats):
+    statement_shape = shape(statement)
+    with _lock:
+        plan = _plans.get(statement_shape)
+        if plan is not None:
+            _plans.move_to_end(statement_shape)
+    if plan is None:
+        plan = explain(conn, statement, parameters, executemany)
+        with _lock:
+            _plans[statement_shape] = plan
+            while len(_plans) > MAX_PLANS:
+                _plans.popitem(last=False)
+
+    entry = {
+        "at": datetime.utcnow().isoformat(timespec="seconds"),
+        "ms": round(elapsed * 1000, 1),
+        "statement": statement_shape,
+        "parameters": parameter_shape(parameters, executemany),
+        "route": _route_name(stats.scope) if stats is not None and stats.scope is not None else None,
+        "family_id": stats.family_id if stats is not None else None,
+        "full_scans": plan["full_scans"],
+    }
+    logger.warning("Slow query %.1f ms on %s (family %s): %s %s%s", entry["ms"], entry["route"] or "background",
+                   entry["family_id"], statement_shape[:500], entry["parameters"],
+                   f" [full scan: {', '.join(plan['full_scans'])}]" if plan["full_scans"] else "")
+    with _lock:
+        _slow.append(entry)
+
+
+def slow_queries(limit: int = 100, family_id: int = None, full_scans_only: bool = False):
+    """
+    Recent slow statements (newest first) and the same grouped by shape (slowest total
+    first), each shape with its captured plan.
+    """
+    with _lock:
+        entries = list(_slow)
+        plans = dict(_plans)
+    if family_id is not None:
+        entries = [entry for entry in entries if entry["family_id"] == family_id]
+    if full_scans_only:
+        entries = [entry for entry in entries if entry["full_scans"]]
+
+    grouped = {}
+    for entry in entries:
+        group = grouped.get(entry["statement"])
+        if group is None:
+            group = grouped[entry["statement"]] = {
+                "statement": entry["statement"], "count": 0, "total_ms": 0.0, "max_ms": 0.0,
+                "routes": set(), "families": set(), **plans.get(entry["statement"], {"plan": None, "full_scans": []}),
+            }
+        group["count"] += 1
+        group["total_ms"] = round(group["total_ms"] + entry["ms"], 1)
+        group["max_ms"] = max(group["max_ms"], entry["ms"])
+        group["routes"].add(entry["route"])
+        group["families"].add(entry["family_id"])
+    for group in grouped.values():
+        group["routes"] = sorted(route or "background" for route in group["routes"])
+        group["families"] = sorted(family for family in group["families"] if family is not None)
+    return {
+        "threshold_ms": SLOW_QUERY_SECONDS * 1000,
+        "statements": sorted(grouped.values(), key=lambda group: group["total_ms"], reverse=True)[:limit],
+        "recent": entries[::-1][:limit],
+    }
+
+
+def reset_slow_queries():
+    with _lock:
+        _slow.clear()
+        _plans.clear()
+
+
+def server_timing(stats: RequestStats, app_seconds: float) -> str:
+    return (f'db;desc="{stats.queries} queries";dur={stats.db_seconds * 1000:.1f}, '
+            f"serialize;dur={stats.serialize_seconds * 1000:.1f}, app;dur={app_seconds * 1000:.1f}")
+
+
+def _route_name(scope) -> str:
+    route = scope.get("route")
+    return f"{scope['method']} {route.path}" if route is not None else f"{scope['method']} (unmatched)"
+
+
+class QueryStatsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not ENABLED:
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(stats, time.perf_counter() - start).encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            _record(_route_name(scope), stats, time.perf_counter() - start)
@@ -0,0 +1,96 @@
+"""
+Occurrence dates of recurring expenses.
+
+The whole occurrence set of a rule is computed arithmetically in one pass,
+instead of walking the calendar month by month.
+"""
+import calendar
+import json
+from datetime import date, timedelta
+from typing import List, Optional, Set
+
+from dateutil.relativedelta import relativedelta
+
+# Month-based rules: number of months between occurrences
+MONTH_STEPS = {
+    "monthly": 1,
+    "bimonthly": 2,
+    "quarterly": 3,
+    "yearly": 12,
+}
+WEEKLY = "weekly"
+
+# Without an end date a rule is projected one year ahead of today (or of its start),
+# so the horizon rolls forward on its own
+DEFAULT_HORIZON = relativedelta(years=1)
+
+
+def applicable_months(recurring) -> Optional[Set[int]]:
+    """Months (1-12) the rule is limited to, or None for every month."""
+    months = recurring.applicable_months
+    if not months:
+        return None
+    if isinstance(months, str):
+        months = json.loads(months)
+    return set(months) or None
+
+
+def rule_bounds(recurring, today: date = None):
+    today = today or date.today()
+    start = recurring.start_date or today
+    end = recurring.end_date or (max(start, today) + DEFAULT_HORIZON)
+    return start, end
+
+
+def clamp_day(year: int, month: int, day: int) -> date:
+    """Day `day` of the month, or its last day if shorter (31 -> 30 Apr, 28/29 Feb)."""
+    return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+
+
+def occurrences(recurring, period_start: date = None, period_end: date = None, today: date = None) -> List[date]:
+    """
+    All occurrence dates of a recurring expense, optionally restricted to a period.
+
+    Month-based rules fall on `day_of_month` of every Nth month counting from the
+    start month; weekly rules fall on the weekday of the start date.
+    """
+    start, end = rule_bounds(recurring, today)
+    if period_end is not None:
+        end = min(end, period_end)
+    months = applicable_months(recurring)
+
+    if recurring.recurrence_type == WEEKLY:
+        first = start
+        if period_start is not None and period_start > first:
+            # Jump straight to the first occurrence inside the period
+            first = start + timedelta(days=-(-(period_start - start).days // 7) * 7)
+        result = [first + timedelta(days=7 * i) for i in range(max(0, (end - first).days // 7 + 1))]
+    else:
+        step = MONTH_STEPS.get(recurring.recurrence_type, 1)
+        day = recurring.day_of_month or 1
+        first_index = start.year * 12 + start.month - 1
+        last_index = end.year * 12 + end.month - 1
+        if period_start is not None:
+            lower = period_start.year * 12 + period_start.month - 1
+            if lower > first_index:
+                # Align to the rule's step so the cadence is kept
+                first_index += -(-(lower - first_index) // step) * step
+        result = [
+            clamp_day(index // 12, index % 12 + 1, day)
+            for index in range(first_index, last_index + 1, step)
+        ]
+        # In the last month, day_of_month may fall after the end date
+        result = [d for d in result if d <= end]
+
+    if period_start is not None:
+        result = [d for d in result if d >= period_start]
+    if months is not None:
+        result = [d for d in result if d.month in months]
+    return result
+
+
+def occurrence_key(recurring, occurrence: date):
+    """Identity of an occurrence: its month for month-based rules, its date for weekly ones."""
+    if recurring.recurrence_type == WEEKLY:
+        return occurrence
+    return (occurrence.year, occurrence.month)
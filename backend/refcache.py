@@ -0,0 +1,210 @@
+"""
+Read-through cache of per-family reference data: categories, budgets and
+active recurring expenses.
+
+These collections are tiny, read on almost every request (modals, budget
+status, recurring projection) and rarely written. They are cached as tuples of
+frozen dataclasses (detached from any session, safe to share between threads)
+and dropped precisely when crud publishes a change of the same kind for the
+family (see changes.py).
+
+- A session whose own uncommitted writes touched the collection reads the
+  database directly, so it always sees its writes.
+- Writes made by other processes are picked up after REFCACHE_TTL_SECONDS,
+  or on the next read with the shared response cache (RESPONSE_CACHE_PATH):
+  an entry is only used while the family's shared generation is the one it
+  was loaded under, so no worker caches a response built from rows older
+  than that generation.
+- At most REFCACHE_MAX_FAMILIES families per collection are kept (LRU), and
+  collections above MAX_ITEMS rows are not cached.
+
+stats() reports hits, misses, bypasses and evictions per collection; they are
+also exported to Prometheus as spesecasa_refcache_events_total.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, fields
+from datetime import date, datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import changes, metrics, models, responsecache
+from schemas import Money
+
+TTL_SECONDS = float(os.getenv("REFCACHE_TTL_SECONDS", "30"))
+MAX_FAMILIES = int(os.getenv("REFCACHE_MAX_FAMILIES", "512"))
+MAX_ITEMS = 1000
+
+EVENTS = metrics.counter("refcache_events_total", "Reference cache hits, misses, bypasses, evictions, invalidations",
+                         ["collection", "event"])
+
+
+@dataclass(frozen=True)
+class CategoryRef:
+    id: int
+    name: str
+    icon: Optional[str]
+    color: Optional[str]
+    family_id: Optional[int]
+
+
+@dataclass(frozen=True)
+class BudgetRef:
+    id: int
+    category: str
+    amount_cents: int
+    applicable_months_mask: int
+    family_id: Optional[int]
+
+    @property
+    def amount(self):
+        return Money.from_cents(self.amount_cents)
+
+    @property
+    def applicable_months(self):
+        return models.mask_to_months(self.applicable_months_mask)
+
+    def applies_in(self, month: int) -> bool:
+        return bool(self.applicable_months_mask & (1 << (month - 1)))
+
+
+@dataclass(frozen=True)
+class RecurringRef:
+    id: int
+    name: str
+    amount_cents: int
+    category: str
+    description: Optional[str]
+    recurrence_type: str
+    applicable_months: Optional[Tuple[int, ...]]
+    day_of_month: int
+    start_date: Optional[date]
+    end_date: Optional[date]
+    is_active: bool
+    user_id: Optional[int]
+    family_id: Optional[int]
+    created_at: datetime
+
+    @property
+    def amount(self):
+        return Money.from_cents(self.amount_cents)
+
+
+def _row(ref_type, obj):
+    values = {field.name: getattr(obj, field.name) for field in fields(ref_type)}
+    if ref_type is RecurringRef and isinstance(values["applicable_months"], str):
+        values["applicable_months"] = tuple(json.loads(values["applicable_months"])) or None
+    return ref_type(**values)
+
+
+class _Collection:
+    def __init__(self, name: str, entity: str, ref_type, query):
+        self.name = name
+        self.entity = entity
+        self.ref_type = ref_type
+        self.query = query  # family_id -> select()
+        self.entries = OrderedDict()  # family_id -> (loaded_at, shared generation, rows)
+        self.generations = {}
+        self.counters = dict(hits=0, misses=0, bypasses=0, evictions=0, invalidations=0)
+        self.lock = threading.Lock()
+
+    def get(self, db: Session, family_id: int):
+        if any(change.family_id == family_id and change.entity == self.entity
+               for change in db.info.get("pending_changes", ())):
+            # Uncommitted writes of this session: read them from the database
+            with self.lock:
+                self._count("bypasses")
+            return self.load(db, family_id)
+
+        shared = responsecache.shared_generation(family_id)
+        with self.lock:
+            entry = self.entries.get(family_id)
+            if entry is not None and time.monotonic() - entry[0] < TTL_SECONDS and entry[1] == shared:
+                self.entries.move_to_end(family_id)
+                self._count("hits")
+                return entry[2]
+            self._count("misses")
+            generation = self.generations.get(family_id, 0)
+
+        rows = self.load(db, family_id)
+        if len(rows) <= MAX_ITEMS:
+            with self.lock:
+                # Not stored if a write committed while loading
+                if self.generations.get(family_id, 0) == generation:
+                    self.entries[family_id] = (time.monotonic(), shared, rows)
+                    self.entries.move_to_end(family_id)
+                    while len(self.entries) > MAX_FAMILIES:
+                        self.entries.popitem(last=False)
+                        self._count("evictions")
+        return rows
+
+    def _count(self, event: str):
+        # Under self.lock
+        self.counters[event] += 1
+        EVENTS.labels(self.name, event).inc()
+
+    def load(self, db: Session, family_id: int):
+        return tuple(_row(self.ref_type, obj) for obj in db.execute(self.query(family_id)).scalars())
+
+    def invalidate(self, family_id: int):
+        with self.lock:
+            self.generations[family_id] = self.generations.get(family_id, 0) + 1
+            if self.entries.pop(family_id, None) is not None:
+                self._count("invalidations")
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, families=len(self.entries),
+                        rows=sum(len(rows) for _, _, rows in self.entries.values()))
+
+
+_collections = {
+    collection.entity: collection for collection in (
+        _Collection("categories", changes.CATEGORY, CategoryRef,
+                    lambda family_id: select(models.Category).where(models.Category.family_id == family_id)
+                    .order_by(models.Category.id)),
+        _Collection("budgets", changes.BUDGET, BudgetRef,
+                    lambda family_id: select(models.Budget).where(models.Budget.family_id == family_id)
+                    .order_by(models.Budget.id)),
+        _Collection("recurring", changes.RECURRING, RecurringRef,
+                    lambda family_id: select(models.RecurringExpense).where(
+                        models.RecurringExpense.family_id == family_id,
+                        models.RecurringExpense.is_active == True,
+                    ).order_by(models.RecurringExpense.id)),
+    )
+}
+
+
+@changes.listen
+def _invalidate(change: changes.Change):
+    collection = _collections.get(change.entity)
+    if collection is not None:
+        collection.invalidate(change.family_id)
+
+
+def categories(db: Session, family_id: int) -> Tuple[CategoryRef, ...]:
+    return _collections[changes.CATEGORY].get(db, family_id)
+
+
+def budgets(db: Session, family_id: int) -> Tuple[BudgetRef, ...]:
+    return _collections[changes.BUDGET].get(db, family_id)
+
+
+def recurring(db: Session, family_id: int) -> Tuple[RecurringRef, ...]:
+    """Active recurring expenses of the family."""
+    return _collections[changes.RECURRING].get(db, family_id)
+
+
+def clear():
+    for collection in _collections.values():
+        with collection.lock:
+            collection.entries.clear()
+
+
+def stats():
+    return {collection.name: collection.stats() for collection in _collections.values()}
@@ -0,0 +1,206 @@
+"""
+Response cache for family-scoped GET endpoints, with ETags.
+
+    return responsecache.respond(request, current_user.family_id, lambda: crud.get_...(...))
+
+The serialized response is cached under (family, path, sorted query params,
+today, family generation). Every committed write of the family bumps its
+generation (see changes.py), so cached responses are never stale: a bump
+just makes the old entries unreachable until the LRU drops them.
+
+Responses carry a strong ETag (hash of the body) and `Cache-Control:
+private, no-cache`: browsers revalidate each time and get 304 Not Modified
+while the content is unchanged, even across generations.
+
+Bodies above compressor.MIN_SIZE are sent in the encoding negotiated with
+the client (see compressor.py). The compressed variant is cached next to the
+plain body under the same key plus the encoding, so it is compressed once per
+generation, not on every hit.
+
+Storage:
+- default: in-process LRU bounded to RESPONSE_CACHE_MAX_BYTES. With several
+  workers, each one only sees its own writes: use the shared store.
+- RESPONSE_CACHE_PATH=/path/cache.db: a SQLite file shared by all workers on
+  the host, holding entries and generations.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+import changes, compressor, metrics, querystats
+
+ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+SHARED_PATH = os.getenv("RESPONSE_CACHE_PATH")
+
+LOOKUPS = metrics.counter("response_cache_lookups_total", "Response cache lookups", ["result"])
+
+
+class MemoryStore:
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def generation(self, family_id: int) -> int:
+        with self._lock:
+            return self._generations.get(family_id, 0)
+
+    def bump(self, family_id: int):
+        with self._lock:
+            self._generations[family_id] = self._generations.get(family_id, 0) + 1
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, etag: str, body: bytes):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[1])
+            self._entries[key] = (etag, body)
+            self._size += len(body)
+            while self._size > self.max_bytes and self._entries:
+                _, (_, dropped) = self._entries.popitem(last=False)
+                self._size -= len(dropped)
+
+
+class SqliteStore:
+    """Shared by the workers of a host through one SQLite file (WAL)."""
+
+    EVICT_EVERY = 100  # sets between size checks
+
+    def __init__(self, path: str, max_bytes: int = MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._sets = 0
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, etag TEXT NOT NULL, "
+                "body BLOB NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_entries_used ON entries (used)")
+            conn.execute("CREATE TABLE IF NOT EXISTS generations (family_id INTEGER PRIMARY KEY, generation INTEGER NOT NULL)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def generation(self, family_id: int) -> int:
+        row = self._connection().execute("SELECT generation FROM generations WHERE family_id = ?", (family_id,)).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, family_id: int):
+        self._connection().execute(
+            "INSERT INTO generations (family_id, generation) VALUES (?, 1) "
+            "ON CONFLICT (family_id) DO UPDATE SET generation = generation + 1",
+            (family_id,),
+        )
+
+    def get(self, key: str):
+        conn = self._connection()
+        row = conn.execute("SELECT etag, body FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            conn.execute("UPDATE entries SET used = ? WHERE key = ?", (time.time(), key))
+        return row
+
+    def set(self, key: str, etag: str, body: bytes):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries (key, etag, body, size, used) VALUES (?, ?, ?, ?, ?)",
+            (key, etag, body, len(body), time.time()),
+        )
+        self._sets += 1
+        if self._sets % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        """Drop the least recently used entries beyond max_bytes."""
+        conn = self._connection()
+        conn.execute(
+            "DELETE FROM entries WHERE key IN ("
+            " SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY used DESC) AS running FROM entries)"
+            " WHERE running > ?)",
+            (self.max_bytes,),
+        )
+
+
+store = SqliteStore(SHARED_PATH) if SHARED_PATH else MemoryStore()
+
+
+@changes.listen
+def _bump(change: changes.Change):
+    store.bump(change.family_id)
+
+
+def shared_generation(family_id: int):
+    """The family generation shared by all the workers (RESPONSE_CACHE_PATH), else None."""
+    return store.generation(family_id) if isinstance(store, SqliteStore) else None
+
+
+def _key(request: Request, family_id: int, generation: int) -> str:
+    params = "&".join(f"{name}={value}" for name, value in sorted(request.query_params.multi_items()))
+    return f"{family_id}:{generation}:{date.today().isoformat()}:{request.url.path}?{params}"
+
+
+def _render(content) -> bytes:
+    # Same encoding as FastAPI's JSONResponse
+    with querystats.serializing():
+        return json.dumps(
+            jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+        ).encode("utf-8")
+
+
+def respond(request: Request, family_id: int, build) -> Response:
+    """JSON response for `build()`, served from the cache while the family is unchanged."""
+    key = _key(request, family_id, store.generation(family_id)) if ENABLED else None
+    cached = store.get(key) if key else None
+    if key:
+        LOOKUPS.labels("hit" if cached is not None else "miss").inc()
+    if cached is not None:
+        etag, body = cached
+    else:
+        body = _render(build())
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        if key:
+            # A write committed meanwhile bumped the generation: the entry is simply never read
+            store.set(key, etag, body)
+
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    encoding = compressor.negotiate(request.headers.get("accept-encoding")) if compressor.ENABLED else None
+    if encoding and len(body) >= compressor.MIN_SIZE:
+        headers["ETag"] = compressor.encoded_etag(etag, encoding)
+        headers["Content-Encoding"] = encoding
+
+    if headers["ETag"] in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    if "Content-Encoding" in headers:
+        # Compressed once and kept next to the plain body, so hits are not recompressed
+        variant = store.get(f"{key}#{encoding}") if key else None
+        if variant is not None:
+            body = variant[1]
+        else:
+            body = compressor.compress(body, encoding)
+            if key:
+                store.set(f"{key}#{encoding}", headers["ETag"], body)
+    return Response(body, media_type="application/json", headers=headers)
@@ -0,0 +1,93 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, Response
+from sqlalchemy.orm import Session
+from typing import Optional, List
+from datetime import date
+import models, analytics, anomalies, snapshots
+from database import get_db
+from auth import get_current_active_user
+
+router = APIRouter(
+    prefix="/api/analytics",
+    tags=["analytics"],
+)
+
+@router.get("/series")
+def read_series(
+    granularity: str = "month",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    group_by: Optional[str] = None,
+    split: bool = False,
+    type: Optional[str] = "EXPENSE",
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Totals per time bucket (day/week/month/quarter/year) as dense, zero-filled arrays.
+    Optionally one series per category, type or user_id, and split into actual/planned.
+    """
+    try:
+        return analytics.compute_series(
+            db, family_id=current_user.family_id, granularity=granularity, start=start, end=end,
+            group_by=group_by, split=split, type=type,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/anomalies")
+def read_anomalies(
+    month: Optional[int] = Query(None, ge=1, le=12),
+    year: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Categories spending well above their usual monthly level (EWMA of past months)."""
+    try:
+        return anomalies.detect(db, family_id=current_user.family_id, year=year, month=month)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/pivot")
+def read_pivot(
+    rows: str = Query("category", description="Comma-separated dimensions: " + ", ".join(snapshots.DIMENSIONS)),
+    metric: str = "sum",
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    type: Optional[str] = None,
+    category: Optional[List[str]] = Query(None),
+    user_id: Optional[int] = None,
+    is_planned: Optional[bool] = None,
+    include_planned: bool = True,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Ad-hoc group-by/aggregate over the family's columnar snapshot (not the live tables)."""
+    try:
+        return snapshots.pivot(
+            db, family_id=current_user.family_id, rows=[r for r in rows.split(",") if r], metric=metric,
+            start=start, end=end, type=type, categories=category, user_id=user_id,
+            is_planned=is_planned, include_planned=include_planned,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/snapshot")
+def download_snapshot(
+    format: str = "parquet",
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """The family's movements as a Parquet file or an Arrow IPC stream, for BI tools."""
+    try:
+        result = snapshots.export(db, family_id=current_user.family_id, format=format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format == "parquet":
+        return FileResponse(result, media_type="application/vnd.apache.parquet", filename="movimenti.parquet")
+    return Response(
+        result, media_type="application/vnd.apache.arrow.stream",
+        headers={"Content-Disposition": 'attachment; filename="movimenti.arrows"'},
+    )
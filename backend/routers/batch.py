@@ -0,0 +1,117 @@
+import asyncio
+import os
+from urllib.parse import urlsplit
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+import models, schemas
+from auth import get_current_active_user
+
+router = APIRouter(
+    prefix="/api/batch",
+    tags=["batch"],
+)
+
+MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+MAX_REDIRECTS = 2
+# Long-lived streams and the batch itself cannot be sub-requests
+EXCLUDED_PREFIXES = ("/api/batch", "/api/events")
+
+# Hop-by-hop and body headers of the batch request, not meaningful for a GET sub-request.
+# Accept-Encoding is dropped too: the batch response is compressed as a whole.
+_DROPPED_HEADERS = {b"content-length", b"content-type", b"accept-encoding", b"if-none-match", b"transfer-encoding"}
+
+
+def _check(item: schemas.BatchItem):
+    path = urlsplit(item.path).path
+    if not path.startswith("/api/") or path.startswith(EXCLUDED_PREFIXES):
+        raise ValueError(f"Percorso non consentito: {item.path}")
+
+
+async def _dispatch(request: Request, user: models.User, target: str):
+    """Run GET `target` through the app in-process; returns (status, headers, body)."""
+    parts = urlsplit(target)
+    scope = dict(request.scope)
+    scope.update(
+        method="GET",
+        path=parts.path,
+        raw_path=parts.path.encode(),
+        query_string=parts.query.encode(),
+        headers=[(name, value) for name, value in request.scope["headers"] if name not in _DROPPED_HEADERS],
+        batch_user=user,
+    )
+    scope.pop("route", None)
+    scope.pop("endpoint", None)
+    scope["state"] = dict(request.scope.get("state", {}))
+    done = asyncio.Event()
+    response = {"status": 500, "headers": [], "body": []}
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+            if not message.get("more_body", False):
+                done.set()
+
+    try:
+        await request.app(scope, receive, send)
+    except Exception:
+        response["status"] = 500  # already logged by the server error middleware
+    done.set()
+    return response["status"], dict(response["headers"]), b"".join(response["body"])
+
+
+async def _run(request: Request, user: models.User, item: schemas.BatchItem, slots: asyncio.Semaphore):
+    async with slots:
+        target = item.path
+        for _ in range(MAX_REDIRECTS + 1):
+            status, headers, body = await _dispatch(request, user, target)
+            location = headers.get(b"location")
+            if status not in (307, 308) or location is None:
+                break
+            # Trailing-slash redirects: follow them in-process, within /api
+            parts = urlsplit(location.decode("latin-1"))
+            target = parts.path + ("?" + parts.query if parts.query else "")
+            if not target.startswith("/api/"):
+                break
+
+    content_type = headers.get(b"content-type", b"").decode("latin-1")
+    if not body:
+        content = None
+    elif content_type.startswith("application/json"):
+        content = orjson.loads(body)
+    else:
+        content = body.decode("utf-8", errors="replace")
+    return {"id": item.id, "status": status, "body": content}
+
+
+@router.post("/", response_model=schemas.BatchResponse)
+async def batch(batch: schemas.BatchRequest, request: Request, current_user: models.User = Depends(get_current_active_user)):
+    """
+    Several GET requests in one round trip, e.g. {"requests": [{"id": "a", "path": "/api/recurring/"}]}.
+    The token is checked once; the sub-requests run concurrently in-process and their
+    responses come back in the same order, each with its status and JSON body.
+    """
+    if len(batch.requests) > MAX_REQUESTS:
+        raise HTTPException(status_code=400, detail=f"Massimo {MAX_REQUESTS} richieste per batch")
+    try:
+        for item in batch.requests:
+            _check(item)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    slots = asyncio.Semaphore(CONCURRENCY)
+    responses = await asyncio.gather(*(_run(request, current_user, item, slots) for item in batch.requests))
+    return Response(orjson.dumps({"responses": responses}), media_type="application/json")
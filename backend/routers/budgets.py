@@ -15,6 +15,11 @@ def read_budgets(db: Session = Depends(get_db), current_user: models.User = Depe
     budgets = crud.get_budgets(db, family_id=current_user.family_id)
     return budgets
 
+@router.get("/matrix")
+def read_budget_matrix(year: int, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
+    """Yearly category x month budget view (limit, actual, planned, remaining)"""
+    return crud.get_budget_matrix(db, year=year, family_id=current_user.family_id)
+
 @router.post("/", response_model=schemas.Budget)
 def create_budget(budget: schemas.BudgetCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
     return crud.create_or_update_budget(db=db, budget=budget, family_id=current_user.family_id)
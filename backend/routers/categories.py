@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from typing import List
-import crud, schemas, models, auth
+import crud, schemas, models, auth, responsecache
 from database import get_db
 
 router = APIRouter(
@@ -10,9 +10,9 @@ router = APIRouter(
 )
 
 @router.get("/", response_model=List[schemas.Category])
-def read_categories(db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_active_user)):
-    categories = crud.get_categories(db, family_id=current_user.family_id)
-    return categories
+def read_categories(request: Request, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_active_user)):
+    return responsecache.respond(request, current_user.family_id,
+                                 lambda: crud.get_categories(db, family_id=current_user.family_id))
 
 @router.post("/", response_model=schemas.Category)
 def create_category(category: schemas.CategoryCreate, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_active_user)):
@@ -8,6 +8,7 @@ import crud
 from database import get_db
 from auth import get_current_user, get_password_hash
 import email_service
+import scheduler
 from encryption import encrypt_smtp_password, decrypt_smtp_password
 
 router = APIRouter(
@@ -54,7 +55,6 @@ def update_smtp_config(
         existing_config.from_email = smtp_config.from_email
         existing_config.use_tls = smtp_config.use_tls
         db.commit()
-        db.refresh(existing_config)
         return existing_config
     else:
         # Create new
@@ -68,7 +68,6 @@ def update_smtp_config(
         )
         db.add(new_config)
         db.commit()
-        db.refresh(new_config)
         return new_config
 
 @router.post("/smtp/test")
@@ -118,8 +117,8 @@ def forgot_password(
     db.add(reset_token)
     db.commit()
     
-    # Send email
-    email_service.send_password_reset_email(db, user.email, token, user.username)
+    # Send email in the background (retried if the SMTP server is unavailable)
+    scheduler.enqueue(db, "send_password_reset_email", {"token_id": reset_token.id})
     
     return {"message": "If this email exists, a password reset link has been sent"}
 
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, Request
 from sqlalchemy.orm import Session
 from typing import Optional
-import crud, models
+import crud, models, responsecache
 from database import get_db
 from auth import get_current_active_user
 from datetime import date
@@ -13,6 +13,7 @@ router = APIRouter(
 
 @router.get("/summary")
 def get_summary(
+    request: Request,
     month: Optional[int] = Query(None, ge=1, le=12, description="Month (1-12)"),
     year: Optional[int] = Query(None, ge=2000, description="Year (YYYY)"),
     db: Session = Depends(get_db),
@@ -23,12 +24,15 @@ def get_summary(
     month_num = month if month is not None else today.month
     year_num = year if year is not None else today.year
     
-    result = crud.get_monthly_aggregates(db, year_num, month_num, family_id=current_user.family_id)
-    result["period"] = {"month": month_num, "year": year_num}
-    return result
+    def build():
+        result = crud.get_monthly_aggregates(db, year_num, month_num, family_id=current_user.family_id)
+        result["period"] = {"month": month_num, "year": year_num}
+        return result
+    return responsecache.respond(request, current_user.family_id, build)
 
 @router.get("/chart-data")
 def get_chart_data(
+    request: Request,
     month: Optional[int] = Query(None, ge=1, le=12, description="Month (1-12)"),
     year: Optional[int] = Query(None, ge=2000, description="Year (YYYY)"),
     db: Session = Depends(get_db),
@@ -39,14 +43,17 @@ def get_chart_data(
     month_num = month if month is not None else today.month
     year_num = year if year is not None else today.year
     
-    expenses_by_category = crud.get_expenses_by_category(db, year_num, month_num, family_id=current_user.family_id)
-    return {
-        "expenses_by_category": [{"category": c, "amount": a} for c, a in expenses_by_category],
-        "period": {"month": month_num, "year": year_num}
-    }
+    def build():
+        expenses_by_category = crud.get_expenses_by_category(db, year_num, month_num, family_id=current_user.family_id)
+        return {
+            "expenses_by_category": [{"category": c, "amount": a} for c, a in expenses_by_category],
+            "period": {"month": month_num, "year": year_num}
+        }
+    return responsecache.respond(request, current_user.family_id, build)
 
 @router.get("/budget-status")
 def get_budget_status(
+    request: Request,
     month: Optional[int] = Query(None, ge=1, le=12, description="Month (1-12)"),
     year: Optional[int] = Query(None, ge=2000, description="Year (YYYY)"),
     db: Session = Depends(get_db),
@@ -57,14 +64,19 @@ def get_budget_status(
     month_num = month if month is not None else today.month
     year_num = year if year is not None else today.year
     
-    result = crud.get_budget_status(db, year_num, month_num, family_id=current_user.family_id)
-    return {"budgets": result, "period": {"month": month_num, "year": year_num}}
+    return responsecache.respond(request, current_user.family_id, lambda: {
+        "budgets": crud.get_budget_status(db, year_num, month_num, family_id=current_user.family_id),
+        "period": {"month": month_num, "year": year_num},
+    })
 
 @router.get("/available-years")
 def get_available_years(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
     """Get list of years that have movement data."""
-    years = crud.get_available_years(db, family_id=current_user.family_id)
-    return {"years": years if years else [date.today().year]}
+    def build():
+        years = crud.get_available_years(db, family_id=current_user.family_id)
+        return {"years": years if years else [date.today().year]}
+    return responsecache.respond(request, current_user.family_id, build)
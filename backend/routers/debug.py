@@ -0,0 +1,42 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+import models, auth, querystats
+
+router = APIRouter(
+    prefix="/api/debug",
+    tags=["debug"],
+)
+
+@router.get("/queries")
+def read_query_stats(
+    limit: int = Query(20, ge=1, le=200),
+    order_by: str = Query("db_ms", description="db_ms, avg_db_ms, queries, avg_queries, n_plus_one_requests, ..."),
+    current_user: models.User = Depends(auth.get_current_superuser)
+):
+    """SQL statements and time per route since startup, worst first, with N+1 suspects (superadmin only)"""
+    try:
+        return {"n_plus_one_threshold": querystats.N_PLUS_ONE_THRESHOLD, "routes": querystats.report(limit, order_by)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/slow-queries")
+def read_slow_queries(
+    limit: int = Query(100, ge=1, le=1000),
+    family_id: Optional[int] = None,
+    full_scans_only: bool = False,
+    current_user: models.User = Depends(auth.get_current_superuser)
+):
+    """Statements slower than SLOW_QUERY_MS, by shape with their query plan and one by one (superadmin only)"""
+    return querystats.slow_queries(limit, family_id=family_id, full_scans_only=full_scans_only)
+
+@router.post("/slow-queries/reset")
+def reset_slow_queries(current_user: models.User = Depends(auth.get_current_superuser)):
+    """Empty the slow-query log and the captured plans (superadmin only)"""
+    querystats.reset_slow_queries()
+    return {"ok": True}
+
+@router.post("/queries/reset")
+def reset_query_stats(current_user: models.User = Depends(auth.get_current_superuser)):
+    """Start the per-route aggregation over (superadmin only)"""
+    querystats.reset()
+    return {"ok": True}
@@ -0,0 +1,51 @@
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+import auth, events, models, schemas
+from database import SessionLocal
+from auth import get_current_active_user
+
+router = APIRouter(
+    prefix="/api/events",
+    tags=["events"],
+)
+
+@router.post("/ticket", response_model=schemas.StreamTicket)
+async def create_stream_ticket(current_user: models.User = Depends(get_current_active_user)):
+    """Single-use ticket to open the stream within a few seconds: GET /api/events?ticket=..."""
+    return {"ticket": auth.create_stream_ticket(current_user), "expires_in": auth.STREAM_TICKET_SECONDS}
+
+@router.get("")
+async def stream_events(
+    request: Request,
+    ticket: Optional[str] = None,
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Server-Sent Events feed of the family's changes (see events.py).
+    EventSource cannot send headers: it authenticates with a ticket from
+    POST /api/events/ticket, never with the access token. A ticket opens one
+    stream: to reconnect, get a new one (and pass ?last_event_id=).
+    """
+    if not ticket:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    # Short-lived session: the stream itself never touches the database
+    db = SessionLocal()
+    try:
+        current_user = await get_current_active_user(auth.redeem_stream_ticket(ticket, db))
+    finally:
+        db.close()
+
+    try:
+        subscription, replay = events.hub.subscribe(
+            current_user.family_id, asyncio.get_running_loop(),
+            last_event_id or request.query_params.get("last_event_id"),
+        )
+    except events.TooManyConnections as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return StreamingResponse(
+        events.stream(subscription, replay),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+import models, forecast
+from database import get_db
+from auth import get_current_active_user
+
+router = APIRouter(
+    prefix="/api/forecast",
+    tags=["forecast"],
+)
+
+@router.get("/")
+def read_forecast(
+    months: int = Query(12, ge=6, le=24, description="Horizon in months"),
+    granularity: str = Query("monthly", description="daily or monthly"),
+    history_years: int = Query(forecast.DEFAULT_HISTORY_YEARS, ge=1, le=10, description="Years of history for the seasonal averages"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Projected balance: current balance + recurring expenses + seasonal averages per category."""
+    try:
+        return forecast.compute_forecast(
+            db, family_id=current_user.family_id, months=months, granularity=granularity, history_years=history_years
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
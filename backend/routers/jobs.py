@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import schemas, models, auth
+from database import get_db
+
+router = APIRouter(
+    prefix="/api/jobs",
+    tags=["jobs"],
+)
+
+@router.get("/", response_model=List[schemas.Job])
+def read_jobs(db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_superuser)):
+    """Scheduled jobs with their next run and current lease (superadmin only)"""
+    return db.execute(
+        select(models.Job).where(models.Job.status == "scheduled").order_by(models.Job.next_run_at)
+    ).scalars().all()
+
+@router.get("/runs", response_model=List[schemas.JobRun])
+def read_job_runs(
+    job_name: Optional[str] = None,
+    status: Optional[str] = None,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_superuser)
+):
+    """Most recent job runs with their duration and error, if any (superadmin only)"""
+    stmt = select(models.JobRun).order_by(models.JobRun.started_at.desc(), models.JobRun.id.desc()).limit(min(limit, 1000))
+    if job_name:
+        stmt = stmt.where(models.JobRun.job_name == job_name)
+    if status:
+        stmt = stmt.where(models.JobRun.status == status)
+    return db.execute(stmt).scalars().all()
+
+@router.get("/{job_id}/runs", response_model=List[schemas.JobRun])
+def read_runs_of_job(
+    job_id: int,
+    limit: int = 100,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_superuser)
+):
+    if db.get(models.Job, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return db.execute(
+        select(models.JobRun).where(models.JobRun.job_id == job_id)
+        .order_by(models.JobRun.started_at.desc(), models.JobRun.id.desc()).limit(min(limit, 1000))
+    ).scalars().all()
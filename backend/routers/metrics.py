@@ -0,0 +1,18 @@
+import secrets
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+import metrics
+
+router = APIRouter(
+    tags=["metrics"],
+)
+
+@router.get("/metrics", include_in_schema=False)
+def read_metrics(request: Request):
+    """Prometheus exposition, aggregated over the workers when PROMETHEUS_MULTIPROC_DIR is set"""
+    if metrics.TOKEN and not secrets.compare_digest(
+        request.headers.get("authorization", ""), f"Bearer {metrics.TOKEN}"
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(metrics.render(), media_type=CONTENT_TYPE_LATEST)
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
-from typing import List, Optional
-import crud, models, schemas
+from typing import List, Optional, Union
+import crud, models, schemas, responsecache, fastjson
 from database import get_db
 from auth import get_current_active_user
 
@@ -12,7 +12,16 @@ router = APIRouter(
 
 from datetime import date
 
-@router.get("/", response_model=List[schemas.Movement])
+# Encoded by fastjson, not validated against a response_model: the shape depends on ?fields and ?format
+MOVEMENT_LIST_RESPONSES = {
+    200: {
+        "model": Union[List[schemas.Movement], List[schemas.MovementFields], schemas.MovementColumns],
+        "description": "List of Movement; with ?fields only the requested keys of each movement; "
+                       "with ?format=columnar one list of values per key (MovementColumns)",
+    },
+}
+
+@router.get("/", response_model=None, responses=MOVEMENT_LIST_RESPONSES)
 def read_movements(
     skip: int = 0, 
     limit: int = 100, 
@@ -23,10 +32,17 @@ def read_movements(
     category: Optional[str] = None,
     type: Optional[str] = None,
     include_planned: bool = True,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. id,date,amount,category"),
+    format: str = Query("rows", description="rows (list of objects) or columnar ({columns, data: {column: [values]}})"),
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
     """Get movements, optionally filtered by date range, category, type, etc."""
+    try:
+        keys = fastjson.select_fields(fields, crud.MOVEMENT_KEYS)
+        fastjson.check_format(format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     movements = crud.get_movements(
         db, 
         family_id=current_user.family_id, 
@@ -38,16 +54,20 @@ def read_movements(
         end_date=end_date,
         category=category,
         type=type,
-        include_planned=include_planned
+        include_planned=include_planned,
+        as_rows=True,
+        fields=keys
     )
-    return movements
+    # Same JSON as List[schemas.Movement], without validating every row
+    return fastjson.rows_response(keys, movements, format)
 
 @router.get("/years", response_model=List[int])
 def get_available_years(
+    request: Request,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    return crud.get_available_years(db, family_id=current_user.family_id)
+    return responsecache.respond(request, current_user.family_id, lambda: crud.get_available_years(db, family_id=current_user.family_id))
 
 @router.post("/", response_model=schemas.Movement)
 def create_movement(movement: schemas.MovementCreate, db: Session = Depends(get_db), current_user: models.User = Depends(get_current_active_user)):
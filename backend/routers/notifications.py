@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from typing import List
+import crud, models, schemas
+import alerts  # noqa: F401  (registers the budget alert listener)
+from database import get_db
+from auth import get_current_active_user
+
+router = APIRouter(
+    prefix="/api/notifications",
+    tags=["notifications"],
+)
+
+@router.get("/", response_model=List[schemas.Notification])
+def read_notifications(
+    unread_only: bool = False,
+    limit: int = 50,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """Budget alerts of the family, newest first (see alerts.py)."""
+    return crud.get_notifications(db, family_id=current_user.family_id, unread_only=unread_only, limit=min(limit, 200))
+
+@router.post("/read")
+def mark_all_read(
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    return {"updated": crud.mark_notifications_read(db, family_id=current_user.family_id)}
+
+@router.post("/{notification_id}/read")
+def mark_read(
+    notification_id: int,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    return {"updated": crud.mark_notifications_read(db, family_id=current_user.family_id, notification_id=notification_id)}
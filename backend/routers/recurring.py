@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
+from datetime import date
 import crud, models, schemas
 from database import get_db
 from auth import get_current_active_user
@@ -23,7 +24,7 @@ def create_recurring_expense(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    """Create recurring expense and auto-generate movements"""
+    """Create recurring expense; its occurrences are projected into the movements"""
     return crud.create_recurring_expense(db=db, recurring=recurring, user_id=current_user.id, family_id=current_user.family_id)
 
 @router.put("/{recurring_id}", response_model=schemas.RecurringExpense)
@@ -33,7 +34,7 @@ def update_recurring_expense(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    """Update recurring expense and regenerate unconfirmed movements"""
+    """Update recurring expense; unconfirmed occurrences follow the new definition"""
     db_recurring = crud.update_recurring_expense(db, recurring_id=recurring_id, recurring=recurring, family_id=current_user.family_id)
     if db_recurring is None:
         raise HTTPException(status_code=404, detail="Recurring expense not found")
@@ -45,20 +46,24 @@ def delete_recurring_expense(
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    """Soft delete recurring expense and remove unconfirmed movements"""
+    """Soft delete recurring expense; confirmed movements are kept"""
     db_recurring = crud.delete_recurring_expense(db, recurring_id=recurring_id, family_id=current_user.family_id)
     if db_recurring is None:
         raise HTTPException(status_code=404, detail="Recurring expense not found")
     return db_recurring
 
-@router.post("/{movement_id}/confirm", response_model=schemas.Movement)
-def confirm_recurring_movement(
-    movement_id: int,
+@router.post("/{recurring_id}/confirm", response_model=schemas.Movement)
+def confirm_recurring_occurrence(
+    recurring_id: int,
+    occurrence_date: date,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_active_user)
 ):
-    """Confirm a recurring movement (mark as paid)"""
-    movement = crud.confirm_recurring_movement(db, movement_id=movement_id, family_id=current_user.family_id)
+    """Confirm a planned occurrence (mark as paid): it becomes a real movement"""
+    movement = crud.confirm_recurring_occurrence(
+        db, recurring_id=recurring_id, occurrence_date=occurrence_date,
+        family_id=current_user.family_id, user_id=current_user.id
+    )
     if not movement:
-        raise HTTPException(status_code=404, detail="Movement not found or not a recurring movement")
+        raise HTTPException(status_code=404, detail="Recurring expense not found or no occurrence on this date")
     return movement
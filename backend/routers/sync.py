@@ -0,0 +1,26 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+import models, schemas, sync
+from database import get_db
+from auth import get_current_active_user
+
+router = APIRouter(
+    prefix="/api/sync",
+    tags=["sync"],
+)
+
+@router.get("/", response_model=schemas.SyncResponse)
+def read_changes(
+    since: int = Query(0, ge=0, description="Version returned by the previous call (0 = everything)"),
+    limit: int = Query(500, ge=1, le=sync.MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_active_user)
+):
+    """
+    Movements, categories, budgets, recurring expenses and goals created, updated
+    or deleted after version `since`. Call again with the returned version while has_more.
+    """
+    try:
+        return sync.changes_since(db, family_id=current_user.family_id, since=since, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
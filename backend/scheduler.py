@@ -0,0 +1,385 @@
+"""
+In-process background job scheduler.
+
+Jobs live in the `jobs` table, so they survive restarts and are shared by every
+worker of a multi-worker deployment. A worker claims a due job by taking a lease
+on its row with a conditional UPDATE: only one worker wins, and if that worker
+dies mid-run the lease expires and another worker picks the job up again.
+
+Periodic jobs are registered with @job(name, schedule="<cron>"), one-shot jobs
+are queued with enqueue(). Failed runs are retried with exponential backoff up
+to `max_attempts`; every run is recorded in `job_runs`.
+
+Times are UTC, cron schedules included.
+"""
+import json
+import os
+import socket
+import threading
+import traceback
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, delete, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal, unit_of_work
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+POLL_SECONDS = int(os.getenv("SCHEDULER_POLL_SECONDS", "30"))
+LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "300"))  # must exceed the longest run
+RETRY_BASE_SECONDS = 60
+JOB_RUNS_KEPT_DAYS = 30
+
+
+# ---------------------------------------------------------------------------
+# Cron expressions
+# ---------------------------------------------------------------------------
+
+class Cron:
+    """
+    Standard 5-field cron expression: minute hour day-of-month month day-of-week.
+    Fields accept `*`, numbers, ranges `a-b`, steps `*/n` or `a-b/n` and lists.
+    Day of week is 0-6 from Sunday (7 is Sunday too).
+    """
+    RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = [
+            self._parse(field, low, high) for field, (low, high) in zip(fields, self.RANGES)
+        ]
+        self.weekdays = {day % 7 for day in weekdays}
+        # As in cron, when both day fields are restricted a day matching either one runs
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    @staticmethod
+    def _parse(field: str, low: int, high: int) -> set:
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_text = part.split("/", 1)
+                step = int(step_text)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(value) for value in part.split("-", 1))
+            else:
+                start = end = int(part)
+            if step < 1 or start < low or end > high or start > end:
+                raise ValueError(f"Invalid cron field {field!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, day: datetime) -> bool:
+        in_days = day.day in self.days
+        in_weekdays = (day.isoweekday() % 7) in self.weekdays
+        if self.any_day or self.any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, moment: datetime) -> datetime:
+        """First matching minute strictly after `moment`."""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                # Jump to the first day of the next month
+                candidate = (candidate.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression never matches: {self.expression!r}")
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+HANDLERS = {}      # handler name -> fn(db, payload)
+MAX_ATTEMPTS = {}  # handler name -> runs before giving up
+PERIODIC = {}      # handler name -> cron expression
+
+
+def job(name: str, schedule: str = None, max_attempts: int = 3):
+    """Register a job handler; with `schedule` it also runs periodically."""
+    def decorator(fn):
+        HANDLERS[name] = fn
+        MAX_ATTEMPTS[name] = max_attempts
+        if schedule:
+            Cron(schedule)  # fail fast on a bad expression
+            PERIODIC[name] = schedule
+        return fn
+    return decorator
+
+
+def enqueue(db, handler: str, payload: dict = None, run_at: datetime = None, max_attempts: int = None) -> models.Job:
+    """Queue a one-shot job, run by the next worker poll (or at `run_at`)."""
+    if handler not in HANDLERS:
+        raise ValueError(f"Unknown job handler {handler!r}")
+    db_job = models.Job(
+        name=f"{handler}:{uuid.uuid4().hex}",
+        handler=handler,
+        payload=json.dumps(payload) if payload is not None else None,
+        next_run_at=run_at or datetime.utcnow(),
+        max_attempts=max_attempts or MAX_ATTEMPTS[handler],
+    )
+    with unit_of_work(db):
+        db.add(db_job)
+    return db_job
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+class Scheduler:
+    """Polls the job table from a daemon thread and runs the due jobs it can lease."""
+
+    def __init__(self, session_factory=SessionLocal, worker_id: str = None,
+                 poll_seconds: int = POLL_SECONDS, lease_seconds: int = LEASE_SECONDS):
+        self.session_factory = session_factory
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.poll_seconds = poll_seconds
+        self.lease_seconds = lease_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.sync_periodic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_pending()
+            except Exception:
+                traceback.print_exc()
+            self._stop.wait(self.poll_seconds)
+
+    def sync_periodic(self, now: datetime = None):
+        """Create or update the rows of the registered periodic jobs."""
+        now = now or datetime.utcnow()
+        with self.session_factory() as db:
+            existing = {
+                row.name: row for row in db.execute(
+                    select(models.Job).where(models.Job.name.in_(list(PERIODIC)))
+                ).scalars()
+            }
+            for name, schedule in PERIODIC.items():
+                max_attempts = MAX_ATTEMPTS[name]
+                row = existing.get(name)
+                if row is None:
+                    try:
+                        with unit_of_work(db):
+                            db.add(models.Job(
+                                name=name, handler=name, schedule=schedule, max_attempts=max_attempts,
+                                next_run_at=Cron(schedule).next_after(now),
+                            ))
+                    except IntegrityError:
+                        pass  # another worker registered it first
+                elif (row.schedule, row.max_attempts) != (schedule, max_attempts):
+                    with unit_of_work(db):
+                        db.execute(
+                            update(models.Job).where(models.Job.id == row.id)
+                            .values(schedule=schedule, max_attempts=max_attempts,
+                                    next_run_at=Cron(schedule).next_after(now))
+                        )
+
+    def run_pending(self, now: datetime = None) -> int:
+        """Run every due job this worker manages to lease. Returns the number of runs."""
+        now = now or datetime.utcnow()
+        runs = 0
+        with self.session_factory() as db:
+            due = db.execute(
+                select(models.Job.id)
+                .where(
+                    models.Job.status == "scheduled",
+                    models.Job.next_run_at <= now,
+                    or_(models.Job.lease_until.is_(None), models.Job.lease_until < now),
+                )
+                .order_by(models.Job.next_run_at)
+            ).scalars().all()
+            for job_id in due:
+                if self._stop.is_set():
+                    break
+                db_job = self._lease(db, job_id, now)
+                if db_job is not None:
+                    self._run(db, db_job)
+                    runs += 1
+        return runs
+
+    def _lease(self, db, job_id: int, now: datetime):
+        # Conditional UPDATE: of several workers racing for the row, exactly one matches
+        with unit_of_work(db):
+            return db.execute(
+                update(models.Job)
+                .where(
+                    models.Job.id == job_id,
+                    models.Job.status == "scheduled",
+                    or_(models.Job.lease_until.is_(None), models.Job.lease_until < now),
+                )
+                .values(lease_owner=self.worker_id, lease_until=now + timedelta(seconds=self.lease_seconds))
+                .returning(models.Job)
+            ).scalars().first()
+
+    def _run(self, db, db_job: models.Job):
+        started = datetime.utcnow()
+        attempt = db_job.attempts + 1
+        run = models.JobRun(
+            job_id=db_job.id, job_name=db_job.name, worker=self.worker_id,
+            attempt=attempt, started_at=started, status="running",
+        )
+        with unit_of_work(db):
+            db.add(run)
+
+        error = None
+        try:
+            payload = json.loads(db_job.payload) if db_job.payload else None
+            HANDLERS[db_job.handler](db, payload)
+        except Exception:
+            db.rollback()
+            error = traceback.format_exc(limit=5)
+
+        finished = datetime.utcnow()
+        values = dict(lease_owner=None, lease_until=None)
+        if error is None:
+            values.update(attempts=0, last_error=None)
+            if db_job.schedule:
+                values["next_run_at"] = Cron(db_job.schedule).next_after(finished)
+            else:
+                values["status"] = "done"
+        elif attempt < db_job.max_attempts:
+            values.update(attempts=attempt, last_error=error,
+                          next_run_at=finished + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempt - 1)))
+        elif db_job.schedule:
+            # Out of retries: a periodic job waits for its next slot
+            values.update(attempts=0, last_error=error, next_run_at=Cron(db_job.schedule).next_after(finished))
+        else:
+            values.update(attempts=attempt, last_error=error, status="failed")
+
+        with unit_of_work(db):
+            db.execute(
+                update(models.Job)
+                .where(models.Job.id == db_job.id, models.Job.lease_owner == self.worker_id)
+                .values(**values)
+            )
+            db.execute(
+                update(models.JobRun).where(models.JobRun.id == run.id).values(
+                    finished_at=finished,
+                    duration_ms=int((finished - started).total_seconds() * 1000),
+                    status="success" if error is None else "error",
+                    error=error,
+                )
+            )
+
+
+scheduler = Scheduler()
+
+
+# ---------------------------------------------------------------------------
+# Maintenance jobs
+# ---------------------------------------------------------------------------
+
+@job("purge_password_reset_tokens", schedule="15 3 * * *")
+def purge_password_reset_tokens(db, payload):
+    """Used and expired reset tokens are never needed again."""
+    with unit_of_work(db):
+        db.execute(
+            delete(models.PasswordResetToken).where(
+                or_(models.PasswordResetToken.used == True,
+                    models.PasswordResetToken.expires_at < datetime.utcnow())
+            )
+        )
+
+
+@job("purge_finished_jobs", schedule="30 3 * * *")
+def purge_finished_jobs(db, payload):
+    """Keep the job tables small: drop old runs and completed one-shot jobs."""
+    cutoff = datetime.utcnow() - timedelta(days=JOB_RUNS_KEPT_DAYS)
+    with unit_of_work(db):
+        db.execute(delete(models.JobRun).where(models.JobRun.started_at < cutoff))
+        db.execute(
+            delete(models.Job).where(
+                models.Job.schedule.is_(None),
+                models.Job.status != "scheduled",
+                models.Job.next_run_at < cutoff,
+            )
+        )
+
+
+@job("optimize_database", schedule="45 3 * * *")
+def optimize_database(db, payload):
+    """Refresh the query planner statistics (SQLite ANALYZE where useful)."""
+    db.connection().exec_driver_sql("PRAGMA optimize")
+    db.commit()
+
+
+@job("fold_category_stats", schedule="0 4 * * *")
+def fold_category_stats(db, payload):
+    """Fold the month just closed into the anomaly statistics of every family."""
+    import anomalies, tenancy
+    if not tenancy.is_enabled():
+        anomalies.fold_all(db)
+        return
+    # Per-family tenancy: each family's statistics live in its own database
+    for family_id in db.execute(select(models.Family.id).order_by(models.Family.id)).scalars().all():
+        if not os.path.exists(tenancy.tenant_db_path(family_id)):
+            continue  # no family database yet: nothing to fold
+        with Session(bind=db.get_bind()) as family_db:
+            tenancy.bind_session(family_db, family_id)
+            anomalies.fold_all(family_db)
+
+
+@job("send_password_reset_email", max_attempts=5)
+def send_password_reset_email(db, payload):
+    import email_service
+    reset_token = db.get(models.PasswordResetToken, payload["token_id"])
+    if reset_token is None or reset_token.used or reset_token.expires_at < datetime.utcnow():
+        return  # nothing left to send
+    user = db.get(models.User, reset_token.user_id)
+    if not email_service.send_password_reset_email(db, user.email, reset_token.token, user.username):
+        raise RuntimeError("Password reset email not sent")
+
+
+@job("send_budget_alert_email", max_attempts=5)
+def send_budget_alert_email(db, payload):
+    import email_service, tenancy
+    # A session of its own: the scheduler's session serves the next jobs and must stay unbound
+    with Session(bind=db.get_bind()) as family_db:
+        tenancy.bind_session(family_db, payload.get("family_id"))
+        notification = family_db.get(models.Notification, payload["notification_id"])
+        if notification is None or email_service.get_smtp_config(family_db) is None:
+            return  # deleted, or no mail server configured
+        members = family_db.execute(
+            select(models.User).where(
+                models.User.family_id == notification.family_id,
+                models.User.is_active == True,
+                models.User.email.is_not(None),
+            )
+        ).scalars().all()
+        failed = [
+            user.email for user in members
+            if not email_service.send_budget_alert_email(family_db, user.email, user.username, notification.message)
+        ]
+    if failed:
+        raise RuntimeError(f"Budget alert not sent to {', '.join(failed)}")
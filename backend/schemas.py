@@ -1,12 +1,38 @@
 from pydantic import BaseModel, EmailStr
 from datetime import date, datetime
-from typing import Optional, List
+from datetime import date as date_type
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, Optional, List
 from enum import Enum
 
 class MovementType(str, Enum):
     INCOME = "INCOME"
     EXPENSE = "EXPENSE"
 
+# Money
+def to_cents(amount) -> Optional[int]:
+    """Euro amount -> integer cents, rounding half up (12.345 -> 1235)."""
+    if amount is None:
+        return None
+    return int((Decimal(str(amount)) * 100).to_integral_value(ROUND_HALF_UP))
+
+class Money(float):
+    """
+    Euro amount at the API edge. Amounts are stored and summed as integer cents
+    and converted once, so totals are exact (1234.56, never 1234.5600000001).
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_cents(cls, cents):
+        if cents is None:
+            return None
+        return cls(int(cents) / 100)
+
+    @property
+    def cents(self) -> int:
+        return to_cents(self)
+
 # Token
 class Token(BaseModel):
     access_token: str
@@ -15,6 +41,10 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
 
+class StreamTicket(BaseModel):
+    ticket: str
+    expires_in: int  # seconds
+
 # Family
 class FamilyBase(BaseModel):
     name: str
@@ -139,6 +169,29 @@ class Movement(MovementBase):
     class Config:
         orm_mode = True
 
+class MovementFields(BaseModel):
+    """A movement with only the keys requested with ?fields= (same keys and order as Movement)"""
+    type: Optional[MovementType] = None
+    date: Optional[date_type] = None  # `date` would resolve to the field's own default here
+    amount: Optional[float] = None
+    category: Optional[str] = None
+    description: Optional[str] = None
+    is_planned: Optional[bool] = None
+    is_confirmed: Optional[bool] = None
+    from_recurring_id: Optional[int] = None
+    id: Optional[int] = None
+    created_at: Optional[datetime] = None
+    user_id: Optional[int] = None
+    family_id: Optional[int] = None
+    created_by_user_id: Optional[int] = None
+    last_modified_by_user_id: Optional[int] = None
+    last_modified_at: Optional[datetime] = None
+
+class MovementColumns(BaseModel):
+    """?format=columnar: the keys once, then one list of values per key"""
+    columns: List[str]
+    data: Dict[str, List[Any]]
+
 # Budget
 class BudgetBase(BaseModel):
     category: str
@@ -190,6 +243,41 @@ class Budget(BudgetBase):
     class Config:
         orm_mode = True
 
+# Delta sync
+class SyncDeleted(BaseModel):
+    movements: List[int] = []
+    categories: List[int] = []
+    budgets: List[int] = []
+    recurring_expenses: List[int] = []
+    savings_goals: List[int] = []
+
+class SyncResponse(BaseModel):
+    version: int  # pass as ?since= on the next call
+    has_more: bool
+    movements: List[Movement] = []
+    categories: List[Category] = []
+    budgets: List[Budget] = []
+    recurring_expenses: List[RecurringExpense] = []
+    savings_goals: List[SavingsGoal] = []
+    deleted: SyncDeleted = SyncDeleted()
+
+# Notifications
+class Notification(BaseModel):
+    id: int
+    kind: str
+    category: Optional[str] = None
+    year: int
+    month: int
+    threshold: Optional[int] = None
+    spent: Optional[float] = None
+    limit: Optional[float] = None
+    message: str
+    is_read: bool
+    created_at: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
 # SMTP Configuration
 class SMTPConfigCreate(BaseModel):
     smtp_server: str
@@ -222,3 +310,51 @@ class PasswordReset(BaseModel):
 
 class ForgotPassword(BaseModel):
     email: EmailStr
+
+# Background jobs
+class Job(BaseModel):
+    id: int
+    name: str
+    handler: str
+    schedule: Optional[str] = None
+    status: str
+    next_run_at: datetime
+    attempts: int
+    max_attempts: int
+    last_error: Optional[str] = None
+    lease_owner: Optional[str] = None
+    lease_until: Optional[datetime] = None
+
+    class Config:
+        orm_mode = True
+
+class JobRun(BaseModel):
+    id: int
+    job_id: int
+    job_name: str
+    worker: str
+    attempt: int
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    duration_ms: Optional[int] = None
+    status: str
+    error: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+# Batch
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    path: str  # e.g. /api/movements/?month=3&year=2025
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem]
+
+class BatchResult(BaseModel):
+    id: Optional[str] = None
+    status: int
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    responses: List[BatchResult]
@@ -0,0 +1,248 @@
+"""
+Columnar snapshots of the movements, for ad-hoc pivots and BI tools.
+
+Each family has a Parquet file in SNAPSHOT_DIR, kept in memory as an Arrow
+table. A refresh reads from `movements` only what changed since the previous
+one: rows with a higher id or a recent `last_modified_at`, and the family's id
+list only when the row count shows that something was deleted. Pivots then run
+on the Arrow table with pyarrow.compute, away from the live tables.
+
+A snapshot is refreshed when this process saw a movement write of the family,
+or when it is older than SNAPSHOT_MAX_AGE_SECONDS (writes made by other workers).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy import select, func, or_
+from sqlalchemy.orm import Session
+
+import changes, models, projection
+from database import DATA_DIR
+from schemas import Money
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", os.path.join(DATA_DIR, "analytics_snapshots"))
+SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("SNAPSHOT_MAX_AGE_SECONDS", "60"))
+CACHE_MAX_FAMILIES = 32
+# Rows modified this long before the previous refresh are read again: a
+# transaction can commit after a refresh with an earlier timestamp
+MODIFIED_MARGIN = timedelta(minutes=5)
+
+SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("date", pa.date32()),
+    ("type", pa.string()),
+    ("category", pa.string()),
+    ("user_id", pa.int64()),
+    ("amount_cents", pa.int64()),
+    ("is_planned", pa.bool_()),
+    ("is_confirmed", pa.bool_()),
+    ("from_recurring_id", pa.int64()),
+    ("description", pa.string()),
+    ("last_modified_at", pa.timestamp("us")),
+])
+_COLUMNS = [getattr(models.Movement, field.name) for field in SCHEMA]
+
+DIMENSIONS = ("category", "type", "user_id", "is_planned", "year", "quarter", "month", "date")
+METRICS = {"sum": "sum", "count": "count", "avg": "mean", "min": "min", "max": "max"}
+FORMATS = ("parquet", "arrow")
+
+
+@dataclass
+class Snapshot:
+    table: pa.Table
+    max_id: int
+    refreshed_at: datetime  # database clock (utcnow, as crud's last_modified_at)
+    generation: int
+    checked: float  # time.monotonic() of the last refresh
+
+
+_snapshots = OrderedDict()
+_lock = threading.Lock()
+_family_locks = {}
+_generations = {}
+
+
+@changes.listen
+def _mark_stale(change: changes.Change):
+    if change.entity != changes.MOVEMENT:
+        return
+    with _lock:
+        _generations[change.family_id] = _generations.get(change.family_id, 0) + 1
+
+
+def snapshot_path(family_id: int) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"family_{family_id}.parquet")
+
+
+# ---------------------------------------------------------------------------
+# Refresh
+# ---------------------------------------------------------------------------
+
+def _to_table(rows) -> pa.Table:
+    return pa.Table.from_pylist([dict(row._mapping) for row in rows], schema=SCHEMA)
+
+
+def _read(family_id: int):
+    try:
+        table = pq.read_table(snapshot_path(family_id), schema=SCHEMA)
+        meta = pq.read_schema(snapshot_path(family_id)).metadata or {}
+    except (FileNotFoundError, pa.ArrowInvalid):
+        return None
+    # generation -1: a snapshot read from disk is always brought up to date once
+    return Snapshot(table, int(meta[b"max_id"]), datetime.fromisoformat(meta[b"refreshed_at"].decode()), -1, 0.0)
+
+
+def _write(family_id: int, entry: Snapshot):
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path(family_id)
+    table = entry.table.replace_schema_metadata({
+        "max_id": str(entry.max_id), "refreshed_at": entry.refreshed_at.isoformat(),
+    })
+    pq.write_table(table, path + ".tmp")
+    os.replace(path + ".tmp", path)  # readers never see a half-written file
+
+
+def _refresh(db: Session, family_id: int, entry: Snapshot, generation: int) -> Snapshot:
+    started = datetime.utcnow()
+    by_family = models.Movement.family_id == family_id # Filter by family
+    count, max_id = db.execute(select(func.count(models.Movement.id), func.max(models.Movement.id)).where(by_family)).one()
+    if entry is None:
+        table = _to_table(db.execute(select(*_COLUMNS).where(by_family)))
+        changed = True
+    else:
+        rows = db.execute(select(*_COLUMNS).where(
+            by_family,
+            or_(models.Movement.id > entry.max_id,
+                models.Movement.last_modified_at >= entry.refreshed_at - MODIFIED_MARGIN),
+        )).all()
+        table = entry.table
+        if rows:
+            fresh = _to_table(rows)
+            table = pa.concat_tables([table.filter(pc.invert(pc.is_in(table["id"], value_set=fresh["id"]))), fresh])
+        changed = bool(rows)
+        if table.num_rows != count:
+            # Some rows were deleted
+            ids = pa.array(db.execute(select(models.Movement.id).where(by_family)).scalars().all(), pa.int64())
+            table = table.filter(pc.is_in(table["id"], value_set=ids))
+            changed = True
+    entry = Snapshot(table.combine_chunks(), max_id or 0, started, generation, time.monotonic())
+    if changed:
+        _write(family_id, entry)
+    return entry
+
+
+def load(db: Session, family_id: int) -> pa.Table:
+    """The family's movements as an Arrow table, refreshed if needed."""
+    with _lock:
+        lock = _family_locks.setdefault(family_id, threading.Lock())
+    with lock:
+        with _lock:
+            entry = _snapshots.get(family_id)
+            generation = _generations.get(family_id, 0)
+        if entry is None:
+            entry = _read(family_id)
+        if entry is None or entry.generation != generation or time.monotonic() - entry.checked > SNAPSHOT_MAX_AGE_SECONDS:
+            entry = _refresh(db, family_id, entry, generation)
+        with _lock:
+            _snapshots[family_id] = entry
+            _snapshots.move_to_end(family_id)
+            while len(_snapshots) > CACHE_MAX_FAMILIES:
+                _snapshots.popitem(last=False)
+    return entry.table
+
+
+def export(db: Session, family_id: int, format: str = "parquet"):
+    """Up-to-date snapshot for download: a file path (parquet) or bytes (Arrow IPC stream)."""
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    table = load(db, family_id)
+    if format == "parquet":
+        return snapshot_path(family_id)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+# ---------------------------------------------------------------------------
+# Pivot
+# ---------------------------------------------------------------------------
+
+def _projected(db: Session, family_id: int, start: date, end: date) -> pa.Table:
+    occurrences = projection.project(db, family_id, start, end)
+    return pa.Table.from_pylist(
+        [{field.name: getattr(occurrence, field.name) for field in SCHEMA} for occurrence in occurrences],
+        schema=SCHEMA,
+    )
+
+
+def pivot(db: Session, family_id: int, rows=("category",), metric: str = "sum", start: date = None,
+          end: date = None, type: str = None, categories=None, user_id: int = None,
+          is_planned: bool = None, include_planned: bool = True):
+    """
+    Group-by / filter / aggregate over the family's snapshot.
+
+    `rows` are the grouping dimensions (DIMENSIONS; year/quarter/month/date are
+    derived from the movement date, the periods as their first day). Planned
+    recurring occurrences up to `end` (default today) are included unless
+    `include_planned` is false.
+    """
+    rows = list(rows)
+    unknown = [dimension for dimension in rows if dimension not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown dimension {', '.join(unknown)}: use {', '.join(DIMENSIONS)}")
+    if len(set(rows)) != len(rows):
+        raise ValueError("Duplicate dimension")
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {', '.join(METRICS)}")
+    if start and end and start > end:
+        raise ValueError("start must not be after end")
+
+    table = load(db, family_id)
+    if include_planned:
+        table = pa.concat_tables([table, _projected(db, family_id, start, end or date.today())])
+
+    mask = pa.array([True] * table.num_rows, pa.bool_())
+    if start:
+        mask = pc.and_(mask, pc.greater_equal(table["date"], pa.scalar(start, pa.date32())))
+    if end:
+        mask = pc.and_(mask, pc.less_equal(table["date"], pa.scalar(end, pa.date32())))
+    if type:
+        mask = pc.and_(mask, pc.equal(table["type"], type))
+    if categories:
+        mask = pc.and_(mask, pc.is_in(table["category"], value_set=pa.array(categories, pa.string())))
+    if user_id is not None:
+        mask = pc.and_(mask, pc.equal(table["user_id"], user_id))
+    if is_planned is not None:
+        mask = pc.and_(mask, pc.equal(table["is_planned"], is_planned))
+    table = table.filter(mask)
+
+    for period in ("year", "quarter", "month"):
+        if period in rows:
+            table = table.append_column(period, pc.floor_temporal(table["date"], unit=period))
+
+    grouped = table.group_by(rows).aggregate([("amount_cents", METRICS[metric])])
+    if rows:
+        grouped = grouped.sort_by([(dimension, "ascending") for dimension in rows])
+    value_column = f"amount_cents_{METRICS[metric]}"
+
+    def value(cents):
+        if metric == "count":
+            return cents
+        return Money.from_cents(round(cents)) if cents is not None else None
+
+    return {
+        "rows": rows,
+        "metric": metric,
+        "data": [
+            {**{dimension: record[dimension] for dimension in rows}, "value": value(record[value_column])}
+            for record in grouped.to_pylist()
+        ],
+    }
@@ -0,0 +1,81 @@
+"""
+Split the shared database into one SQLite file per family.
+
+Run once before switching to TENANCY_MODE=per_family:
+
+    python split_tenants.py            # copy family rows into data/families/family_<id>.db
+    python split_tenants.py --purge    # ...and delete them from the shared database
+
+The copy is idempotent: a table that already has rows in the family database is skipped.
+"""
+import sys
+from sqlalchemy import select, func
+
+from database import engine
+import models
+import tenancy
+
+CHUNK_SIZE = 1000
+
+
+def copy_table(table, family_id: int, tenant_engine) -> int:
+    with tenant_engine.connect() as tenant_conn:
+        already = tenant_conn.execute(select(func.count()).select_from(table)).scalar()
+    if already:
+        print(f"   {table.name}: {already} rows already present, skipped")
+        return 0
+
+    copied = 0
+    last_id = 0
+    with engine.connect() as shared_conn, tenant_engine.begin() as tenant_conn:
+        while True:
+            rows = shared_conn.execute(
+                select(table)
+                .where(table.c.family_id == family_id, table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(CHUNK_SIZE)
+            ).mappings().all()
+            if not rows:
+                break
+            tenant_conn.execute(table.insert(), [dict(row) for row in rows])
+            last_id = rows[-1]["id"]
+            copied += len(rows)
+    print(f"   {table.name}: {copied} rows copied")
+    return copied
+
+
+def purge_family(family_id: int):
+    # Children before parents
+    with engine.begin() as conn:
+        for table in reversed(tenancy.TENANT_TABLES):
+            result = conn.execute(table.delete().where(table.c.family_id == family_id))
+            print(f"   {table.name}: {result.rowcount} rows removed from shared database")
+
+
+def split(purge: bool = False):
+    with engine.connect() as conn:
+        families = conn.execute(select(models.Family.id, models.Family.name).order_by(models.Family.id)).all()
+
+    for family_id, name in families:
+        print(f"Family {family_id} ({name}) -> {tenancy.tenant_db_path(family_id)}")
+        tenant_engine = tenancy.router.get_engine(family_id)
+        for table in tenancy.TENANT_TABLES:
+            copy_table(table, family_id, tenant_engine)
+        if purge:
+            purge_family(family_id)
+        tenancy.router.dispose(family_id)
+
+    # Rows without a family cannot be routed anywhere: report them
+    with engine.connect() as conn:
+        for table in tenancy.TENANT_TABLES:
+            orphans = conn.execute(
+                select(func.count()).select_from(table).where(table.c.family_id.is_(None))
+            ).scalar()
+            if orphans:
+                print(f"WARNING: {orphans} rows in {table.name} have no family_id and were not copied")
+
+    print("Split completed. Set TENANCY_MODE=per_family to use the family databases.")
+
+
+if __name__ == "__main__":
+    split(purge="--purge" in sys.argv)
@@ -0,0 +1,80 @@
+"""
+Delta sync: "what changed since version N".
+
+Every write published by crud (see changes.py) rewrites the sync_log entry of
+each row it touched, inside the same transaction. The entry's id is the row's
+version, so `/api/sync?since=N` only has to read the family's entries with
+id > N (ix_sync_log_family_version) and load those rows by primary key.
+Deletes leave the entry as a tombstone; soft-deleted recurring expenses count
+as deleted.
+
+Versions increase in commit order because SQLite allows one writer at a time:
+a client that stored version N has seen every change up to N.
+
+A client starts with since=0 and keeps calling with the returned `version`
+while `has_more` is true; then it has an up-to-date replica.
+"""
+from sqlalchemy import select, delete, insert, func
+from sqlalchemy.orm import Session
+
+import changes, models
+
+MAX_PAGE_SIZE = 1000
+
+# entity -> (response key, model)
+ENTITIES = {
+    changes.MOVEMENT: ("movements", models.Movement),
+    changes.CATEGORY: ("categories", models.Category),
+    changes.BUDGET: ("budgets", models.Budget),
+    changes.RECURRING: ("recurring_expenses", models.RecurringExpense),
+    changes.GOAL: ("savings_goals", models.SavingsGoal),
+}
+
+
+def record(db: Session, family_id: int, entity: str, ids, deleted: bool = False):
+    """Give the rows a new version (replacing their previous entry)."""
+    ids = list(ids)
+    if not ids:
+        return
+    db.execute(delete(models.SyncLog).where(models.SyncLog.entity == entity, models.SyncLog.entity_id.in_(ids)))
+    db.execute(insert(models.SyncLog), [
+        dict(family_id=family_id, entity=entity, entity_id=entity_id, deleted=deleted) for entity_id in ids
+    ])
+
+
+def _on_change(db: Session, change: changes.Change):
+    if change.entity in ENTITIES:
+        record(db, change.family_id, change.entity, change.ids, deleted=change.action == "delete")
+
+
+changes.listen(_on_change, in_transaction=True)
+
+
+def current_version(db: Session, family_id: int) -> int:
+    return db.execute(
+        select(func.max(models.SyncLog.id)).where(models.SyncLog.family_id == family_id)
+    ).scalar() or 0
+
+
+def changes_since(db: Session, family_id: int, since: int = 0, limit: int = MAX_PAGE_SIZE):
+    """Rows created or updated and ids deleted after version `since`, at most `limit` of them."""
+    if since < 0:
+        raise ValueError("since must be >= 0")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    entries = db.execute(
+        select(models.SyncLog.id, models.SyncLog.entity, models.SyncLog.entity_id, models.SyncLog.deleted)
+        .where(models.SyncLog.family_id == family_id, models.SyncLog.id > since) # Filter by family
+        .order_by(models.SyncLog.id)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    result = {"version": entries[-1].id if entries else since, "has_more": has_more, "deleted": {}}
+    for entity, (key, model) in ENTITIES.items():
+        live = [entry.entity_id for entry in entries if entry.entity == entity and not entry.deleted]
+        result["deleted"][key] = [entry.entity_id for entry in entries if entry.entity == entity and entry.deleted]
+        result[key] = db.execute(
+            select(model).where(model.id.in_(live), model.family_id == family_id) # Filter by family
+        ).scalars().all() if live else []
+    return result
@@ -0,0 +1,116 @@
+"""
+Database-per-family tenancy.
+
+By default (TENANCY_MODE=shared) every family lives in the shared database and
+is isolated by the `family_id` filters in crud. With TENANCY_MODE=per_family the
+family-owned tables (categories, movements, budgets, recurring expenses, goals)
+live in one SQLite file per family, while users, families and configuration stay
+in the shared database. Writes from different families then no longer contend
+for the same SQLite lock, and backing up or deleting a family is a file copy.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from database import DATA_DIR
+import models
+import migrator
+
+TENANCY_MODE = os.getenv("TENANCY_MODE", "shared")
+TENANTS_DIR = os.getenv("TENANTS_DIR", os.path.join(DATA_DIR, "families"))
+TENANT_MAX_ENGINES = int(os.getenv("TENANT_MAX_ENGINES", "32"))
+TENANT_IDLE_SECONDS = int(os.getenv("TENANT_IDLE_SECONDS", "600"))
+
+# Tables stored in the family database, in foreign-key order
+TENANT_MODELS = [
+    models.Category,
+    models.RecurringExpense,
+    models.Movement,
+    models.Budget,
+    models.SavingsGoal,
+    models.CategoryMonthTotal,
+    models.CategoryStats,
+    models.Notification,
+    models.SyncLog,
+]
+TENANT_TABLES = [model.__table__ for model in TENANT_MODELS]
+
+
+def is_enabled() -> bool:
+    return TENANCY_MODE == "per_family"
+
+
+def tenant_db_path(family_id: int) -> str:
+    return os.path.join(TENANTS_DIR, f"family_{family_id}.db")
+
+
+class TenantEngineRouter:
+    """Resolve a family to its engine, keeping open engines in an LRU with idle eviction."""
+
+    def __init__(self, max_engines: int = TENANT_MAX_ENGINES, idle_seconds: int = TENANT_IDLE_SECONDS):
+        self.max_engines = max_engines
+        self.idle_seconds = idle_seconds
+        self._engines = OrderedDict()  # family_id -> (engine, last_used)
+        self._migrated = set()
+        self._lock = threading.Lock()
+
+    def get_engine(self, family_id: int):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._engines.pop(family_id, None)
+            engine = entry[0] if entry else self._open(family_id)
+            self._engines[family_id] = (engine, now)
+            self._evict(now)
+
+            # Schema is brought up to date lazily, the first time a tenant is touched
+            if family_id not in self._migrated:
+                self._migrate(engine)
+                self._migrated.add(family_id)
+        return engine
+
+    def dispose(self, family_id: int):
+        """Close the engine of a family, e.g. before moving or deleting its file."""
+        with self._lock:
+            entry = self._engines.pop(family_id, None)
+            self._migrated.discard(family_id)
+        if entry:
+            entry[0].dispose()
+
+    def open_engines(self):
+        with self._lock:
+            return list(self._engines.keys())
+
+    def _open(self, family_id: int):
+        os.makedirs(TENANTS_DIR, exist_ok=True)
+        return create_engine(
+            f"sqlite:///{tenant_db_path(family_id)}", connect_args={"check_same_thread": False}
+        )
+
+    def _migrate(self, engine):
+        migrator.upgrade(engine, tables=[table.name for table in TENANT_TABLES], progress=None)
+
+    def _evict(self, now: float):
+        # The most recently used engine sits at the end and is never evicted here
+        while len(self._engines) > 1:
+            family_id, (engine, last_used) = next(iter(self._engines.items()))
+            if len(self._engines) <= self.max_engines and now - last_used < self.idle_seconds:
+                break
+            del self._engines[family_id]
+            self._migrated.discard(family_id)
+            engine.dispose()
+
+
+router = TenantEngineRouter()
+
+
+def bind_session(db: Session, family_id: int):
+    """Route the family-owned tables of this session to the family database."""
+    if not is_enabled() or family_id is None:
+        return
+    engine = router.get_engine(family_id)
+    for model in TENANT_MODELS:
+        db.bind_mapper(model, engine)
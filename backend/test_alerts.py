@@ -0,0 +1,80 @@
+"""
+Budget alerts: thresholds are checked on write, each fires once per month, and
+emails are queued only when enabled and sent from the family's database.
+"""
+import json
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import select
+
+from database import SessionLocal
+import alerts, crud, email_service, models, scheduler, schemas, tenancy
+
+TODAY = date.today()
+
+
+def test_thresholds_fire_once_per_month(db, family, add_movement):
+    crud.create_or_update_budget(db, schemas.BudgetCreate(category="Casa", amount=100), family_id=family.id)
+
+    add_movement(family.id, 50, TODAY)
+    assert crud.get_notifications(db, family.id) == []
+    add_movement(family.id, 35, TODAY)  # 85%
+    notifications = crud.get_notifications(db, family.id)
+    assert [(n.threshold, n.spent) for n in notifications] == [(80, 85)]
+
+    moved = add_movement(family.id, 5, TODAY)  # still above 80%: no new alert
+    assert len(crud.get_notifications(db, family.id)) == 1
+    crud.delete_movement(db, moved.id, family_id=family.id)
+    add_movement(family.id, 20, TODAY)  # 105%
+    assert [n.threshold for n in crud.get_notifications(db, family.id, unread_only=True)] == [100, 80]
+    assert "superato" in crud.get_notifications(db, family.id)[0].message
+
+    # Past months and other categories do not alert
+    add_movement(family.id, 500, TODAY - relativedelta(months=1))
+    add_movement(family.id, 500, TODAY, "Svago")
+    assert len(crud.get_notifications(db, family.id)) == 2
+
+    assert crud.mark_notifications_read(db, family.id) == 2
+    assert crud.get_notifications(db, family.id, unread_only=True) == []
+
+
+def test_jump_past_both_thresholds_and_budget_change(db, family, add_movement):
+    add_movement(family.id, 150, TODAY)
+    assert crud.get_notifications(db, family.id) == []  # no budget yet
+
+    # A new budget is checked against the month so far; only the highest threshold is unread
+    crud.create_or_update_budget(db, schemas.BudgetCreate(category="Casa", amount=100), family_id=family.id)
+    assert [(n.threshold, n.is_read) for n in crud.get_notifications(db, family.id)] == [(100, False), (80, True)]
+
+
+def test_email_job_queued_when_enabled(monkeypatch, db, family, add_movement):
+    monkeypatch.setattr(alerts, "EMAILS_ENABLED", True)
+    crud.create_or_update_budget(db, schemas.BudgetCreate(category="Casa", amount=100), family_id=family.id)
+    add_movement(family.id, 90, TODAY)
+
+    jobs = db.execute(select(models.Job).where(models.Job.handler == "send_budget_alert_email")).scalars().all()
+    notification = crud.get_notifications(db, family.id)[0]
+    assert [json.loads(job.payload) for job in jobs] == [{"notification_id": notification.id, "family_id": family.id}]
+
+
+def test_email_sent_from_family_database(monkeypatch, per_family, engine, db, family, add_movement):
+    monkeypatch.setattr(alerts, "EMAILS_ENABLED", True)
+    monkeypatch.setattr(email_service, "get_smtp_config", lambda db: object())
+    sent = []
+    monkeypatch.setattr(email_service, "send_budget_alert_email",
+                        lambda db, email, username, message: sent.append((email, message)) or True)
+    crud.create_user(db, schemas.UserCreate(username="alerts", email="alerts@example.com", password="x", family_id=family.id))
+    tenancy.bind_session(db, family.id)
+    crud.create_or_update_budget(db, schemas.BudgetCreate(category="Viaggi", amount=100), family_id=family.id)
+    add_movement(family.id, 90, TODAY, "Viaggi")
+    notification = crud.get_notifications(db, family.id)[0]
+
+    job = db.execute(select(models.Job).where(models.Job.handler == "send_budget_alert_email")
+                     .order_by(models.Job.id.desc())).scalars().first()
+    # The scheduler's session is not bound to any family
+    with SessionLocal(bind=engine) as job_db:
+        scheduler.send_budget_alert_email(job_db, json.loads(job.payload))
+        # ...and stays so for the next jobs
+        assert job_db.get_bind(models.Notification) is engine
+    assert sent == [("alerts@example.com", notification.message)]
@@ -0,0 +1,55 @@
+"""
+Time series: SQL buckets agree with the Python ones, arrays are dense, and
+cached series are invalidated only by writes inside their range.
+"""
+from datetime import date, timedelta
+
+from sqlalchemy import select, literal
+
+import analytics, crud, schemas
+
+
+def test_sql_buckets_match_python(engine):
+    with engine.connect() as conn:
+        for granularity in analytics.GRANULARITIES:
+            for offset in range(0, 400, 13):
+                day = date(2024, 1, 1) + timedelta(days=offset)
+                sql = conn.execute(select(analytics.bucket_expression(literal(day.isoformat()), granularity, "sqlite"))).scalar()
+                assert date.fromisoformat(sql) == analytics.bucket_start(day, granularity), (granularity, day)
+
+
+def test_dense_series(db, family, add_movement):
+    add_movement(family.id, 10, date(2025, 1, 10))
+    add_movement(family.id, 5, date(2025, 1, 20), "Svago")
+    add_movement(family.id, 7, date(2025, 3, 2))
+
+    result = analytics.compute_series(db, family.id, "month", date(2025, 1, 1), date(2025, 4, 30), group_by="category", split=True)
+    assert result["buckets"] == [date(2025, m, 1) for m in range(1, 5)]
+    series = {entry["key"]: entry for entry in result["series"]}
+    assert series["Casa"]["total"] == [10, 0, 7, 0]
+    assert series["Svago"]["actual"] == [5, 0, 0, 0] and series["Svago"]["planned"] == [0, 0, 0, 0]
+
+    quarters = analytics.compute_series(db, family.id, "quarter", date(2025, 1, 1), date(2025, 12, 31))
+    assert quarters["series"][0]["total"] == [22, 0, 0, 0]
+
+
+def test_cache_invalidated_by_writes_in_range(db, family, add_movement, statements):
+    add_movement(family.id, 10, date(2025, 1, 10))
+    january = (db, family.id, "day", date(2025, 1, 1), date(2025, 1, 31))
+
+    analytics.compute_series(*january)
+    statements.clear()
+    assert analytics.compute_series(*january)["series"][0]["total"][9] == 10
+    assert statements == []  # served from the cache
+
+    add_movement(family.id, 99, date(2025, 6, 1))  # outside the range: cache kept
+    statements.clear()
+    analytics.compute_series(*january)
+    assert statements == []
+
+    movement = add_movement(family.id, 5, date(2025, 1, 10))  # inside the range
+    assert analytics.compute_series(*january)["series"][0]["total"][9] == 15
+
+    # Moving a movement out of the range invalidates through its old date
+    crud.update_movement(db, movement.id, schemas.MovementCreate(type="EXPENSE", date=date(2025, 7, 1), amount=5, category="Casa"), family_id=family.id)
+    assert analytics.compute_series(*january)["series"][0]["total"][9] == 10
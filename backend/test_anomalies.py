@@ -0,0 +1,111 @@
+"""
+Anomaly statistics: the incrementally maintained tables match a full backfill,
+and a month well above a category's usual level is reported.
+"""
+from datetime import date
+
+import pytest
+from dateutil.relativedelta import relativedelta
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select, update
+
+from database import SessionLocal, get_db
+from routers import analytics
+import anomalies, auth, crud, models, scheduler, schemas, tenancy
+
+THIS_MONTH = date.today().replace(day=1)
+
+
+def snapshot(db, family_id):
+    totals = db.execute(
+        select(models.CategoryMonthTotal.category, models.CategoryMonthTotal.month_index, models.CategoryMonthTotal.expense_cents)
+        .where(models.CategoryMonthTotal.family_id == family_id)
+    ).all()
+    stats = db.execute(
+        select(models.CategoryStats.category, models.CategoryStats.months, models.CategoryStats.last_month,
+               models.CategoryStats.mean_cents, models.CategoryStats.variance)
+        .where(models.CategoryStats.family_id == family_id)
+    ).all()
+    return sorted(totals), sorted((c, n, last, round(mean, 6), round(var, 6)) for c, n, last, mean, var in stats)
+
+
+def test_ewma_matches_scalar_loop():
+    series = [100.0, 120.0, 0.0, 90.0, 300.0]
+    mean, variance = series[0], 0.0
+    for x in series[1:]:
+        diff = x - mean
+        mean += anomalies.ALPHA * diff
+        variance = (1 - anomalies.ALPHA) * (variance + anomalies.ALPHA * diff * diff)
+
+    import numpy as np
+    result = anomalies.ewma(np.array([[0.0] + series, [0.0] * 6]), np.array([1, 6]))
+    assert result[0][0] == mean and abs(result[1][0] - variance) < 1e-9
+    assert result[2].tolist() == [5, 0]
+
+
+def test_incremental_matches_backfill(db, family, add_movement):
+    for months_back in range(1, 7):
+        add_movement(family.id, 100 + months_back, THIS_MONTH - relativedelta(months=months_back))
+    add_movement(family.id, 30, THIS_MONTH - relativedelta(months=2), "Svago")
+    moved = add_movement(family.id, 50, THIS_MONTH - relativedelta(months=3), "Svago")
+    crud.update_movement(db, moved.id, schemas.MovementCreate(
+        type="EXPENSE", date=THIS_MONTH - relativedelta(months=5), amount=50, category="Svago"), family_id=family.id)
+    removed = add_movement(family.id, 80, THIS_MONTH)
+    crud.delete_movement(db, removed.id, family_id=family.id)
+    add_movement(family.id, 20, THIS_MONTH)
+
+    incremental = snapshot(db, family.id)
+    assert incremental[1] and all(last == anomalies.month_index(THIS_MONTH) - 1 for _, _, last, _, _ in incremental[1])
+    anomalies.backfill(db)
+    assert snapshot(db, family.id) == incremental
+
+
+def test_detect_spike(db, family, add_movement):
+    for months_back in range(1, 7):
+        add_movement(family.id, 100, THIS_MONTH - relativedelta(months=months_back))
+        add_movement(family.id, 50, THIS_MONTH - relativedelta(months=months_back), "Svago")
+    add_movement(family.id, 400, THIS_MONTH)
+    add_movement(family.id, 55, THIS_MONTH, "Svago")
+
+    result = anomalies.detect(db, family.id)
+    assert [a["category"] for a in result["anomalies"]] == ["Casa"]
+    assert result["anomalies"][0]["usual"] == 100 and result["anomalies"][0]["ratio"] == 4.0
+
+    # A past month is computed from the monthly totals too
+    last_month = THIS_MONTH - relativedelta(months=1)
+    assert anomalies.detect(db, family.id, last_month.year, last_month.month)["anomalies"] == []
+    with pytest.raises(ValueError):
+        anomalies.detect(db, family.id, year=last_month.year)
+
+
+def test_route_needs_year_and_month_together(override_get_db, db, family):
+    app = FastAPI()
+    app.include_router(analytics.router)
+    app.dependency_overrides[get_db] = override_get_db
+    client = TestClient(app)
+    crud.create_user(db, schemas.UserCreate(username="anomalies", password="x", family_id=family.id))
+    headers = {"Authorization": "Bearer " + auth.create_access_token({"sub": "anomalies"})}
+
+    for params in (dict(year=2025), dict(month=3)):
+        response = client.get("/api/analytics/anomalies", params=params, headers=headers)
+        assert response.status_code == 400 and response.json()["detail"] == "year and month must be given together"
+    for params in (dict(), dict(year=2025, month=3)):
+        assert client.get("/api/analytics/anomalies", params=params, headers=headers).status_code == 200
+
+
+def test_nightly_fold_per_family(per_family, engine, db, family, add_movement):
+    tenancy.bind_session(db, family.id)
+    for months_back in range(1, 5):
+        add_movement(family.id, 100 * months_back, THIS_MONTH - relativedelta(months=months_back))
+    folded = snapshot(db, family.id)
+    # As if the last fold were two months ago
+    db.execute(update(models.CategoryStats).values(last_month=models.CategoryStats.last_month - 2, months=1))
+    db.commit()
+    assert snapshot(db, family.id) != folded
+
+    # The job's session is not bound to any family
+    with SessionLocal(bind=engine) as job_db:
+        scheduler.fold_category_stats(job_db, {})
+    db.expire_all()
+    assert snapshot(db, family.id) == folded
@@ -0,0 +1,47 @@
+"""
+Batch endpoint: sub-requests run in-process with one token check, keep
+their own status and body, and the batch rejects paths it cannot serve.
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from database import get_db
+from routers import batch, categories, recurring
+import auth, crud, schemas
+
+app = FastAPI()
+for module in (batch, categories, recurring):
+    app.include_router(module.router)
+
+
+@pytest.fixture(scope="module")
+def client(override_get_db):
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app)
+
+
+def test_batch(monkeypatch, client, db, family):
+    crud.create_user(db, schemas.UserCreate(username="batch", password="x", family_id=family.id))
+    crud.create_category(db, schemas.CategoryCreate(name="Casa"), family_id=family.id)
+    headers = {"Authorization": "Bearer " + auth.create_access_token({"sub": "batch"})}
+
+    lookups = []
+    get_user = crud.get_user_by_username
+    monkeypatch.setattr(crud, "get_user_by_username", lambda *args, **kwargs: lookups.append(1) or get_user(*args, **kwargs))
+    response = client.post("/api/batch/", headers=headers, json={"requests": [
+        {"id": "categories", "path": "/api/categories/"},
+        {"id": "recurring", "path": "/api/recurring"},  # redirected to the trailing slash in-process
+        {"id": "missing", "path": "/api/recurring/999"},
+    ]})
+    assert response.status_code == 200
+    results = response.json()["responses"]
+    assert [r["id"] for r in results] == ["categories", "recurring", "missing"]
+    assert results[0]["status"] == 200 and [c["name"] for c in results[0]["body"]] == ["Casa"]
+    assert results[1] == {"id": "recurring", "status": 200, "body": []}
+    assert results[2]["status"] in (404, 405)
+    assert len(lookups) == 1  # token decoded and user loaded once for the whole batch
+
+    for path in ("/api/batch/", "/api/events", "/docs"):
+        assert client.post("/api/batch/", headers=headers, json={"requests": [{"path": path}]}).status_code == 400
+    assert client.post("/api/batch/", json={"requests": []}).status_code == 401
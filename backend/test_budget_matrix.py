@@ -0,0 +1,44 @@
+"""
+Budget month masks and the yearly category x month matrix.
+"""
+from datetime import date
+
+import crud, models, schemas
+
+
+def test_month_mask_round_trip():
+    assert models.months_to_mask(None) == models.ALL_MONTHS
+    assert models.months_to_mask([]) == models.ALL_MONTHS
+    assert models.months_to_mask([1, 2, 12]) == 0b100000000011
+    assert models.months_to_mask("[3, 3]") == 0b100  # legacy JSON text
+    assert models.mask_to_months(0b100000000011) == [1, 2, 12]
+    assert models.mask_to_months(models.ALL_MONTHS) is None
+
+
+def test_budget_matrix(db, family, add_movement, statements):
+    crud.create_or_update_budget(db, schemas.BudgetCreate(category="Casa", amount=500), family_id=family.id)
+    crud.create_or_update_budget(db, schemas.BudgetCreate(category="Svago", amount=100, applicable_months=[6, 7, 8]), family_id=family.id)
+    for day, amount, category in [(date(2025, 6, 3), 40, "Svago"), (date(2025, 6, 20), 25.5, "Svago"), (date(2025, 2, 1), 300, "Casa"), (date(2025, 2, 1), 12, "Auto")]:
+        add_movement(family.id, amount, day, category)
+    crud.create_recurring_expense(
+        db, schemas.RecurringExpenseCreate(name="Affitto", amount=450, category="Casa",
+                                           start_date=date(2025, 1, 1), end_date=date(2025, 12, 31)),
+        user_id=1, family_id=family.id
+    )
+
+    # Month filter is done in SQL on the mask
+    assert [b["category"] for b in crud.get_budget_status(db, 2025, 6, family.id)] == ["Casa", "Svago"]
+    assert [b["category"] for b in crud.get_budget_status(db, 2025, 5, family.id)] == ["Casa"]
+
+    statements.clear()
+    matrix = crud.get_budget_matrix(db, 2025, family.id)
+    # budgets + one grouped expense query + the recurring projection (rules, confirmed occurrences)
+    assert len(statements) <= 4, statements
+
+    rows = {row["category"]: row["months"] for row in matrix["categories"]}
+    assert list(rows) == ["Auto", "Casa", "Svago"]
+    assert rows["Svago"][5] == {"month": 6, "has_budget": True, "limit": 100, "actual": 65.5, "planned": 0, "remaining": 34.5}
+    assert rows["Svago"][4]["has_budget"] is False and rows["Svago"][4]["limit"] == 0
+    assert rows["Casa"][1]["actual"] == 300 and rows["Casa"][1]["planned"] == 450 and rows["Casa"][1]["remaining"] == -250
+    assert rows["Auto"][1]["actual"] == 12 and not rows["Auto"][1]["has_budget"]
+    assert matrix["totals"][5]["limit"] == 600
@@ -0,0 +1,88 @@
+"""
+Compression: Accept-Encoding negotiation, the size threshold, streamed and
+pre-encoded responses passing through, and cached compressed variants.
+"""
+import gzip
+
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+import compressor, responsecache
+
+
+def test_negotiate():
+    assert compressor.negotiate("gzip, deflate") == "gzip"
+    assert compressor.negotiate("gzip;q=0") is None
+    assert compressor.negotiate("*") == compressor.PREFERENCE[0]
+    assert compressor.negotiate("identity") is None
+    assert compressor.negotiate(None) is None
+    assert compressor.negotiate("br;q=0.5, gzip;q=0.9") == "gzip"
+
+
+app = FastAPI()
+app.add_middleware(compressor.CompressionMiddleware, min_size=100)
+
+
+@app.get("/big")
+def big():
+    return {"items": list(range(500))}
+
+
+@app.get("/small")
+def small():
+    return {"ok": True}
+
+
+@app.get("/events")
+def events():
+    return StreamingResponse(iter([b"data: 1\n\n"] * 50), media_type="text/event-stream")
+
+
+@app.get("/encoded")
+def encoded():
+    return Response(gzip.compress(b"x" * 500), media_type="application/json", headers={"Content-Encoding": "gzip"})
+
+
+@app.get("/tagged")
+def tagged():
+    return Response(b"x" * 500, media_type="application/json", headers={"ETag": '"abc"'})
+
+
+@app.get("/cached")
+def cached(request: Request):
+    return responsecache.respond(request, 1, lambda: {"items": list(range(500))})
+
+
+client = TestClient(app)
+
+
+def test_middleware():
+    response = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip" and response.headers["vary"] == "Accept-Encoding"
+    assert response.json() == {"items": list(range(500))}
+    assert int(response.headers["content-length"]) < len(response.content)
+
+    assert "content-encoding" not in client.get("/big", headers={"Accept-Encoding": "identity"}).headers
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/events", headers={"Accept-Encoding": "gzip"}).headers
+    assert client.get("/encoded", headers={"Accept-Encoding": "gzip"}).content == b"x" * 500
+
+    # The plain and the compressed body do not share a validator
+    assert client.get("/tagged", headers={"Accept-Encoding": "gzip"}).headers["etag"] == '"abc-gzip"'
+    assert client.get("/tagged", headers={"Accept-Encoding": "identity"}).headers["etag"] == '"abc"'
+
+
+def test_cached_variants(monkeypatch):
+    monkeypatch.setattr(responsecache, "store", responsecache.MemoryStore())
+    calls = []
+    monkeypatch.setattr(compressor, "compress", lambda body, encoding: calls.append(encoding) or gzip.compress(body))
+
+    first = client.get("/cached", headers={"Accept-Encoding": "gzip"})
+    again = client.get("/cached", headers={"Accept-Encoding": "gzip"})
+    assert first.headers["content-encoding"] == "gzip" and again.json() == first.json()
+    assert calls == ["gzip"]  # the hit reused the stored variant
+
+    plain = client.get("/cached", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and plain.headers["etag"] != first.headers["etag"]
+    assert client.get("/cached", headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]}).status_code == 304
@@ -0,0 +1,143 @@
+"""
+Live change feed: committed writes reach the family's streams, reconnects
+replay from the ring buffer or reset, and slow clients are cut off.
+"""
+import asyncio
+from datetime import date
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from database import SessionLocal, get_db
+from routers import events as events_router
+import auth, changes, crud, events, schemas
+
+app = FastAPI()
+app.include_router(events_router.router)
+
+
+def change(family_id, day=date(2025, 3, 1)):
+    return changes.Change(family_id, changes.MOVEMENT, "create", (1,), (day,))
+
+
+def test_writes_are_streamed_after_commit(family, add_movement):
+    async def scenario():
+        subscription, replay = events.hub.subscribe(family.id, asyncio.get_running_loop())
+        assert replay == []
+        body = events.stream(subscription, replay)
+        assert (await body.__anext__()).startswith("retry:")
+
+        add_movement(family.id, 5, date(2025, 3, 10))
+        message = await asyncio.wait_for(body.__anext__(), 1)
+        assert "event: change" in message
+        assert '"entity": "movement", "action": "create"' in message and '"periods": ["2025-03"]' in message
+
+        await body.aclose()
+        assert events.hub.connections(family.id) == 0
+
+    asyncio.run(scenario())
+
+
+def test_replay_and_reset():
+    async def scenario():
+        hub = events.Hub(ring_size=3)
+        loop = asyncio.get_running_loop()
+        first = hub.publish(change(1))
+        hub.publish(change(2))  # another family
+        second = hub.publish(change(1))
+
+        subscription, replay = hub.subscribe(1, loop, first.event_id)
+        assert replay == [second]
+        hub.unsubscribe(subscription)
+
+        for _ in range(3):
+            hub.publish(change(1))
+        # `second` was evicted: replay impossible
+        assert hub.subscribe(1, loop, first.event_id)[1] is None
+        assert hub.subscribe(1, loop, "otherboot-1")[1] is None
+        assert len(hub.subscribe(1, loop, second.event_id)[1]) == 3
+
+    asyncio.run(scenario())
+
+
+def test_slow_client_gets_reset_and_connection_limit():
+    async def scenario():
+        hub = events.Hub(max_connections=1)
+        subscription, replay = hub.subscribe(1, asyncio.get_running_loop())
+        try:
+            hub.subscribe(1, asyncio.get_running_loop())
+            assert False, "connection limit not enforced"
+        except events.TooManyConnections:
+            pass
+
+        for _ in range(events.QUEUE_MAX_EVENTS + 10):
+            hub.publish(change(1))
+        await asyncio.sleep(0)  # let the queued pushes run
+        assert subscription.queue.qsize() == 1  # backlog dropped, only the overflow marker
+
+        body = events.stream(subscription, replay)
+        messages = [message async for message in body]
+        assert "event: reset" in messages[-1]
+        assert hub.connections(1) == 0
+
+    asyncio.run(scenario())
+
+
+async def open_stream(query_string: bytes, headers=()):
+    """
+    Call the /api/events route as a server would; returns the response start,
+    the first body chunk and a function that disconnects the client.
+    """
+    disconnected = asyncio.Event()
+    sent = asyncio.Queue()
+
+    async def receive():
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/api/events", "raw_path": b"/api/events", "root_path": "", "query_string": query_string,
+        "headers": list(headers), "client": ("testclient", 1), "server": ("testserver", 80),
+    }
+    task = asyncio.create_task(app(scope, receive, sent.put))
+    start = await asyncio.wait_for(sent.get(), 1)
+    first = await asyncio.wait_for(sent.get(), 1)
+
+    async def disconnect():
+        disconnected.set()
+        await asyncio.wait_for(task, 1)
+
+    return start, first, disconnect
+
+
+def test_stream_route(monkeypatch, engine, override_get_db, db, family):
+    crud.create_user(db, schemas.UserCreate(username="events", password="x", family_id=family.id))
+    monkeypatch.setattr(events_router, "SessionLocal", lambda: SessionLocal(bind=engine))
+    app.dependency_overrides[get_db] = override_get_db
+    client = TestClient(app)
+    token = auth.create_access_token({"sub": "events"})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    ticket = client.post("/api/events/ticket", headers=headers).json()
+    assert ticket["expires_in"] == auth.STREAM_TICKET_SECONDS
+
+    async def scenario():
+        start, first, disconnect = await open_stream(f"ticket={ticket['ticket']}".encode())
+        assert start["status"] == 200
+        assert first["body"].startswith(b"retry:")
+        assert events.hub.connections(family.id) == 1
+        await disconnect()
+        assert events.hub.connections(family.id) == 0
+
+    asyncio.run(scenario())
+
+    # Single use; the access token itself is refused, in the query and in the header
+    assert client.get("/api/events", params={"ticket": ticket["ticket"]}).status_code == 401
+    assert client.get("/api/events", params={"ticket": token}).status_code == 401
+    assert client.get("/api/events", params={"token": token}).status_code == 401
+    assert client.get("/api/events", headers=headers).status_code == 401
+    assert client.post("/api/events/ticket").status_code == 401
+    # A ticket is not an access token either
+    fresh = client.post("/api/events/ticket", headers=headers).json()["ticket"]
+    assert client.post("/api/events/ticket", headers={"Authorization": f"Bearer {fresh}"}).status_code == 401
@@ -0,0 +1,92 @@
+"""
+Fast list path: the movements encoded from plain rows are byte-for-byte the
+JSON of the validated List[schemas.Movement] response, projected
+occurrences included; sparse fieldsets and the columnar format.
+"""
+import json
+from datetime import date
+from typing import List
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+
+from database import get_db
+from routers import movements
+import auth, crud, fastjson, schemas
+
+
+def validated_json(movements) -> bytes:
+    # What FastAPI does with response_model=List[schemas.Movement]
+    content = TypeAdapter(List[schemas.Movement]).dump_python(
+        TypeAdapter(List[schemas.Movement]).validate_python(movements, from_attributes=True), mode="json"
+    )
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def test_rows_match_validated_response(db, family, add_movement):
+    first = add_movement(family.id, 12.34, date(2025, 3, 2), description="Caffè €")
+    add_movement(family.id, 1500, date(2025, 3, 5), "Stipendio", "INCOME")
+    crud.update_movement(db, first.id, schemas.MovementCreate(type="EXPENSE", date=date(2025, 3, 2), amount=0.1,
+                                                             category="Casa"), family_id=family.id, user_id=1)
+    crud.create_recurring_expense(db, schemas.RecurringExpenseCreate(name="Affitto", amount=700, category="Casa",
+                                                                     start_date=date(2025, 1, 1)),
+                                  user_id=1, family_id=family.id)
+
+    for filters in (dict(month=3, year=2025), dict(month=3, year=2025, skip=1, limit=2), dict(include_planned=False)):
+        rows = crud.get_movements(db, family.id, as_rows=True, **filters)
+        movements = crud.get_movements(db, family.id, **filters)
+        assert len(rows) == len(movements) > 0
+        body = fastjson.dumps(crud.MOVEMENT_KEYS, rows)
+        assert body == validated_json(movements)
+        assert (b'"is_planned":true' in body) == filters.get("include_planned", True)
+    assert crud.MOVEMENT_KEYS == tuple(schemas.Movement.model_fields) == tuple(schemas.MovementFields.model_fields)
+
+
+def test_sparse_fields_and_columnar(db, family, add_movement):
+    for day, amount in ((3, 5), (4, 7.5)):
+        add_movement(family.id, amount, date(2025, 4, day))
+    crud.create_recurring_expense(db, schemas.RecurringExpenseCreate(name="Palestra", amount=30, category="Svago",
+                                                                     start_date=date(2025, 1, 1)),
+                                  user_id=1, family_id=family.id)
+
+    keys = fastjson.select_fields("category, amount", crud.MOVEMENT_KEYS)
+    assert keys == ("amount", "category")
+    rows = crud.get_movements(db, family.id, month=4, year=2025, as_rows=True, fields=keys)
+    assert json.loads(fastjson.dumps(keys, rows)) == [
+        {"amount": 7.5, "category": "Casa"}, {"amount": 5.0, "category": "Casa"}, {"amount": 30.0, "category": "Svago"},
+    ]
+    assert json.loads(fastjson.dumps(keys, rows, "columnar")) == {
+        "columns": ["amount", "category"], "data": {"amount": [7.5, 5.0, 30.0], "category": ["Casa", "Casa", "Svago"]},
+    }
+    assert json.loads(fastjson.dumps(keys, [], "columnar")) == {"columns": ["amount", "category"], "data": {"amount": [], "category": []}}
+
+    for fields in ("amount,password", ","):
+        with pytest.raises(ValueError):
+            fastjson.select_fields(fields, crud.MOVEMENT_KEYS)
+    with pytest.raises(ValueError):
+        fastjson.check_format("xml")
+
+
+def test_route_documents_every_format(override_get_db, db, family, add_movement):
+    app = FastAPI()
+    app.include_router(movements.router)
+    app.dependency_overrides[get_db] = override_get_db
+    client = TestClient(app)
+    crud.create_user(db, schemas.UserCreate(username="formats", password="x", family_id=family.id))
+    headers = {"Authorization": "Bearer " + auth.create_access_token({"sub": "formats"})}
+    add_movement(family.id, 5, date(2025, 4, 3))
+
+    schema = app.openapi()["paths"]["/api/movements/"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+    assert [ref.get("items", ref)["$ref"].rsplit("/", 1)[1] for ref in schema["anyOf"]] == [
+        "Movement", "MovementFields", "MovementColumns",
+    ]
+    # Every format validates against the documented shapes
+    for params, shape in ((dict(), List[schemas.Movement]),
+                          (dict(fields="date,amount"), List[schemas.MovementFields]),
+                          (dict(fields="date,amount", format="columnar"), schemas.MovementColumns)):
+        response = client.get("/api/movements/", params=dict(params, month=4, year=2025), headers=headers)
+        assert response.status_code == 200
+        TypeAdapter(shape).validate_python(response.json())
+    assert client.get("/api/movements/", params=dict(format="xml"), headers=headers).status_code == 400
@@ -0,0 +1,44 @@
+"""
+Cash-flow forecast: the balance as of the given day, scheduled recurring
+flows, seasonal averages and what is left of them once movements are entered.
+"""
+from datetime import date
+
+import crud, forecast, schemas
+
+
+def test_forecast(db, family, add_movement):
+    today = date(2025, 3, 10)
+    # Two years of history: 2000 income and 300 groceries every month, 600 more every December
+    for year in (2023, 2024):
+        for month in range(1, 13):
+            add_movement(family.id, 2000, date(year, month, 1), "Stipendio", "INCOME")
+            add_movement(family.id, 300, date(year, month, 5), "Spesa")
+        add_movement(family.id, 600, date(year, 12, 20), "Regali")
+    for month in (1, 2, 3):
+        add_movement(family.id, 2000, date(2025, month, 1), "Stipendio", "INCOME")
+    add_movement(family.id, 100, date(2025, 3, 5), "Spesa")  # 200 of groceries still expected in March
+    # Entered in advance: scheduled, and taken off the seasonal average of their month
+    add_movement(family.id, 300, date(2025, 4, 5), "Spesa")
+    add_movement(family.id, 600, date(2025, 12, 20), "Regali")
+    crud.create_recurring_expense(
+        db, schemas.RecurringExpenseCreate(name="Affitto", amount=800, category="Casa", day_of_month=15,
+                                           start_date=date(2025, 1, 1), end_date=date(2026, 12, 31)),
+        user_id=1, family_id=family.id
+    )
+
+    result = forecast.compute_forecast(db, family.id, months=12, today=today)
+    start = result["start_balance"]
+    # As of `today`: the history and the rent of January and February, nothing entered later
+    assert start == 2000 * 27 - 300 * 24 - 600 * 2 - 100 - 800 * 2
+    assert result["dates"][0] == date(2025, 3, 31) and len(result["dates"]) == 13
+    # March: rent + the rest of the groceries, the salary was already received
+    assert result["income"][0] == 0 and result["expense"][0] == 800 + 200
+    assert result["balance"][0] == round(start - 1000, 2)
+    # A full month: salary in, groceries and rent out; December adds the presents
+    assert result["income"][1] == 2000 and result["expense"][1] == 1100
+    assert result["expense"][9] == 1700
+
+    daily = forecast.compute_forecast(db, family.id, months=24, granularity="daily", today=today)
+    assert len(daily["dates"]) == (date(2027, 3, 10) - today).days
+    assert abs(daily["balance"][20] - result["balance"][0]) < 0.01  # 31 March
@@ -0,0 +1,46 @@
+"""
+Metrics: requests are counted per route template and status, the latency
+histogram and the exposition include them.
+"""
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+import metrics
+
+app = FastAPI()
+app.add_middleware(metrics.MetricsMiddleware)
+
+
+@app.get("/items/{item_id}")
+def read_item(item_id: int):
+    if item_id == 0:
+        raise HTTPException(status_code=404, detail="Not found")
+    return {"id": item_id}
+
+
+client = TestClient(app)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value("spesecasa_" + name, labels) or 0
+
+
+def test_route_templates_and_status():
+    ok = sample("http_requests_total", method="GET", route="/items/{item_id}", status="200")
+    missing = sample("http_requests_total", method="GET", route="/items/{item_id}", status="404")
+    observed = sample("http_request_duration_seconds_count", method="GET", route="/items/{item_id}")
+
+    for item_id in (1, 2, 0):
+        client.get(f"/items/{item_id}")
+    client.get("/nowhere")
+
+    assert sample("http_requests_total", method="GET", route="/items/{item_id}", status="200") == ok + 2
+    assert sample("http_requests_total", method="GET", route="/items/{item_id}", status="404") == missing + 1
+    assert sample("http_request_duration_seconds_count", method="GET", route="/items/{item_id}") == observed + 3
+    assert sample("http_requests_total", method="GET", route="unmatched", status="404") >= 1
+    assert sample("http_requests_in_flight") == 0
+
+    exposition = metrics.render().decode()
+    assert 'spesecasa_http_requests_total{method="GET",route="/items/{item_id}",status="200"}' in exposition
+    assert "spesecasa_db_pool_checked_out" in exposition
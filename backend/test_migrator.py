@@ -0,0 +1,262 @@
+"""
+Migrations: a database with the schema the app shipped with before
+migrator.py is upgraded to the models' schema with its data converted, and
+an interrupted chunked backfill resumes where it stopped.
+"""
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from database import Base, SessionLocal
+import crud, migrator
+
+# The tables as created by Base.metadata.create_all before migrator.py existed
+BASELINE_SCHEMA = """
+CREATE TABLE families (
+    id INTEGER NOT NULL,
+    name VARCHAR,
+    created_at DATETIME,
+    PRIMARY KEY (id)
+);
+CREATE INDEX ix_families_id ON families (id);
+CREATE UNIQUE INDEX ix_families_name ON families (name);
+CREATE TABLE smtp_config (
+    id INTEGER NOT NULL,
+    smtp_server VARCHAR NOT NULL,
+    smtp_port INTEGER NOT NULL,
+    smtp_username VARCHAR NOT NULL,
+    smtp_password TEXT NOT NULL,
+    from_email VARCHAR NOT NULL,
+    use_tls BOOLEAN,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id)
+);
+CREATE INDEX ix_smtp_config_id ON smtp_config (id);
+CREATE TABLE users (
+    id INTEGER NOT NULL,
+    username VARCHAR,
+    email VARCHAR,
+    first_name VARCHAR,
+    last_name VARCHAR,
+    hashed_password VARCHAR,
+    is_active BOOLEAN,
+    is_superuser BOOLEAN,
+    created_at DATETIME,
+    family_id INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(family_id) REFERENCES families (id)
+);
+CREATE UNIQUE INDEX ix_users_username ON users (username);
+CREATE INDEX ix_users_id ON users (id);
+CREATE UNIQUE INDEX ix_users_email ON users (email);
+CREATE TABLE categories (
+    id INTEGER NOT NULL,
+    name VARCHAR,
+    icon VARCHAR,
+    color VARCHAR,
+    family_id INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(family_id) REFERENCES families (id)
+);
+CREATE INDEX ix_categories_id ON categories (id);
+CREATE INDEX ix_categories_name ON categories (name);
+CREATE TABLE budgets (
+    id INTEGER NOT NULL,
+    category VARCHAR,
+    amount FLOAT,
+    month INTEGER,
+    year INTEGER,
+    applicable_months TEXT,
+    family_id INTEGER,
+    PRIMARY KEY (id),
+    FOREIGN KEY(family_id) REFERENCES families (id)
+);
+CREATE INDEX ix_budgets_category ON budgets (category);
+CREATE INDEX ix_budgets_id ON budgets (id);
+CREATE TABLE savings_goals (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    target_amount FLOAT NOT NULL,
+    current_amount FLOAT,
+    deadline DATE,
+    color VARCHAR,
+    icon VARCHAR,
+    family_id INTEGER NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id),
+    FOREIGN KEY(family_id) REFERENCES families (id)
+);
+CREATE INDEX ix_savings_goals_id ON savings_goals (id);
+CREATE TABLE recurring_expenses (
+    id INTEGER NOT NULL,
+    name VARCHAR NOT NULL,
+    amount FLOAT NOT NULL,
+    category VARCHAR,
+    description VARCHAR,
+    recurrence_type VARCHAR,
+    applicable_months TEXT,
+    day_of_month INTEGER,
+    start_date DATE,
+    end_date DATE,
+    is_active BOOLEAN,
+    user_id INTEGER,
+    family_id INTEGER,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id),
+    FOREIGN KEY(family_id) REFERENCES families (id)
+);
+CREATE INDEX ix_recurring_expenses_id ON recurring_expenses (id);
+CREATE INDEX ix_recurring_expenses_category ON recurring_expenses (category);
+CREATE TABLE password_reset_tokens (
+    id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    token VARCHAR NOT NULL,
+    expires_at DATETIME NOT NULL,
+    used BOOLEAN,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id),
+    FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE UNIQUE INDEX ix_password_reset_tokens_token ON password_reset_tokens (token);
+CREATE INDEX ix_password_reset_tokens_id ON password_reset_tokens (id);
+CREATE TABLE movements (
+    id INTEGER NOT NULL,
+    type VARCHAR,
+    date DATE,
+    amount FLOAT,
+    category VARCHAR,
+    category_id INTEGER,
+    description VARCHAR,
+    is_planned BOOLEAN,
+    from_recurring_id INTEGER,
+    is_confirmed BOOLEAN,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    user_id INTEGER,
+    family_id INTEGER,
+    created_by_user_id INTEGER,
+    last_modified_by_user_id INTEGER,
+    last_modified_at DATETIME,
+    PRIMARY KEY (id),
+    FOREIGN KEY(category_id) REFERENCES categories (id),
+    FOREIGN KEY(from_recurring_id) REFERENCES recurring_expenses (id),
+    FOREIGN KEY(user_id) REFERENCES users (id),
+    FOREIGN KEY(family_id) REFERENCES families (id),
+    FOREIGN KEY(created_by_user_id) REFERENCES users (id),
+    FOREIGN KEY(last_modified_by_user_id) REFERENCES users (id)
+);
+CREATE INDEX ix_movements_date ON movements (date);
+CREATE INDEX ix_movements_type ON movements (type);
+CREATE INDEX ix_movements_category ON movements (category);
+CREATE INDEX ix_movements_id ON movements (id);
+CREATE INDEX ix_movements_is_planned ON movements (is_planned);
+"""
+
+SAMPLE_ROWS = """
+INSERT INTO families (id, name) VALUES (1, 'Famiglia Rossi');
+INSERT INTO users (id, username, hashed_password, is_active, is_superuser, family_id) VALUES (1, 'mario', 'x', 1, 0, 1);
+INSERT INTO categories (id, name, family_id) VALUES (1, 'Casa', 1);
+INSERT INTO budgets (id, category, amount, applicable_months, family_id) VALUES
+    (1, 'Casa', 500.0, NULL, 1), (2, 'Svago', 99.99, '[1, 2, 12]', 1), (3, 'Auto', 0.285, '[]', 1);
+INSERT INTO savings_goals (id, name, target_amount, current_amount, family_id) VALUES (1, 'Vacanze', 1500.5, 0.1, 1);
+INSERT INTO recurring_expenses (id, name, amount, category, recurrence_type, day_of_month, start_date, is_active, user_id, family_id)
+    VALUES (1, 'Affitto', 700.0, 'Casa', 'monthly', 1, '2025-01-01', 1, 1, 1);
+INSERT INTO movements (id, type, date, amount, category, is_planned, from_recurring_id, is_confirmed, user_id, family_id) VALUES
+    (1, 'EXPENSE', '2025-01-10', 12.34, 'Casa', 0, NULL, 1, 1, 1),
+    (2, 'INCOME', '2025-01-27', 1500.0, 'Stipendio', 0, NULL, 1, 1, 1),
+    (3, 'EXPENSE', '2025-01-01', 700.0, 'Casa', 0, 1, 1, 1, 1),
+    (4, 'EXPENSE', '2025-02-01', 700.0, 'Casa', 1, 1, 0, 1, 1),
+    (5, 'EXPENSE', '2025-03-01', 700.0, 'Casa', 1, 1, 0, 1, 1),
+    (6, 'EXPENSE', '2025-02-14', 0.285, 'Svago', 0, NULL, 1, 1, 1);
+"""
+
+
+def baseline_engine(path, rows=SAMPLE_ROWS):
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        for statement in (BASELINE_SCHEMA + rows).split(";"):
+            if statement.strip():
+                conn.execute(text(statement))
+    return engine
+
+
+def rows(engine, sql):
+    with engine.connect() as conn:
+        return conn.execute(text(sql)).all()
+
+
+def test_upgrade_from_baseline(tmp_path):
+    engine = baseline_engine(tmp_path / "spesecasa.db")
+    assert migrator.upgrade(engine, progress=None) == migrator.SCHEMA_VERSION
+
+    # Money in cents, rounded like schemas.to_cents; the float columns are gone
+    assert rows(engine, "SELECT id, amount_cents FROM movements ORDER BY id") == [(1, 1234), (2, 150000), (3, 70000), (6, 29)]
+    assert rows(engine, "SELECT amount_cents FROM budgets ORDER BY id") == [(50000,), (9999,), (29,)]
+    assert rows(engine, "SELECT amount_cents FROM recurring_expenses") == [(70000,)]
+    assert rows(engine, "SELECT target_amount_cents, current_amount_cents FROM savings_goals") == [(150050, 10)]
+    inspector = inspect(engine)
+    for table in ("movements", "budgets", "recurring_expenses"):
+        assert "amount" not in {column["name"] for column in inspector.get_columns(table)}
+    assert not {"target_amount", "current_amount"} & {column["name"] for column in inspector.get_columns("savings_goals")}
+
+    # Month lists as masks; NULL and [] mean every month
+    assert rows(engine, "SELECT applicable_months_mask FROM budgets ORDER BY id") == [(4095,), (0b100000000011,), (4095,)]
+    assert "applicable_months" not in {column["name"] for column in inspector.get_columns("budgets")}
+
+    # Unconfirmed planned occurrences purged (they are projected now), confirmed ones kept
+    assert [row.id for row in rows(engine, "SELECT id FROM movements ORDER BY id")] == [1, 2, 3, 6]
+    assert rows(engine, "SELECT COUNT(*) FROM sync_log WHERE entity = 'movement'") == [(4,)]
+
+    # Same schema as the models: columns, NOT NULL constraints, indexes
+    for name, table in Base.metadata.tables.items():
+        columns = {column["name"]: column for column in inspector.get_columns(name)}
+        assert set(columns) == set(table.columns.keys()), name
+        for column in table.columns:
+            if not column.primary_key:
+                assert columns[column.name]["nullable"] == column.nullable, (name, column.name)
+        indexed = {tuple(index["column_names"]) for index in inspector.get_indexes(name)}
+        assert {tuple(index.columns.keys()) for index in table.indexes} <= indexed, name
+    assert "ix_recurring_expenses_category" in {index["name"] for index in inspector.get_indexes("recurring_expenses")}
+
+    # The application reads the migrated data (projected recurring occurrences have
+    # negative ids); a second run has nothing to do
+    db = SessionLocal(bind=engine)
+    assert sorted((m.id, m.amount) for m in crud.get_movements(db, 1, year=2025) if m.id > 0) == [
+        (1, 12.34), (2, 1500), (3, 700), (6, 0.29),
+    ]
+    assert [budget.category for budget in crud.get_budgets_for_month(db, 3, 1)] == ["Casa", "Auto"]
+    assert crud.get_savings_goals(db, 1)[0].target_amount == 1500.5
+    db.close()
+    progress = []
+    assert migrator.upgrade(engine, progress=progress.append) == migrator.SCHEMA_VERSION
+    assert progress == []
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_interrupted_backfill_resumes(tmp_path):
+    # 2500 movements: the cents backfill runs in three chunks of 1000 ids
+    movements = ",".join(f"({i}, 'EXPENSE', '2025-01-01', {i}.25, 'Casa', 0, 1, 1, 1)" for i in range(1, 2501))
+    engine = baseline_engine(tmp_path / "spesecasa.db", rows=(
+        "INSERT INTO families (id, name) VALUES (1, 'Famiglia Rossi');"
+        "INSERT INTO movements (id, type, date, amount, category, is_planned, is_confirmed, user_id, family_id) VALUES "
+        + movements + ";"
+    ))
+
+    def crash_after_first_chunk(message):
+        if "movements.amount_cents: id 1000/" in message:
+            raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        migrator.upgrade(engine, progress=crash_after_first_chunk)
+    assert migrator.current_version(engine) == 4
+    assert rows(engine, "SELECT last_id, done FROM schema_backfill_progress WHERE name = 'movements.amount_cents'") == [(1000, False)]
+    assert rows(engine, "SELECT COUNT(*) FROM movements WHERE amount_cents IS NOT NULL") == [(1000,)]
+
+    progress = []
+    assert migrator.upgrade(engine, progress=progress.append) == migrator.SCHEMA_VERSION
+    chunks = [message.strip() for message in progress if message.strip().startswith("movements.amount_cents")]
+    assert chunks == ["movements.amount_cents: id 2000/2500, 1000 rows", "movements.amount_cents: id 2500/2500, 1500 rows"]
+    assert rows(engine, "SELECT COUNT(*) FROM movements WHERE amount_cents = id * 100 + 25") == [(2500,)]
+    assert "amount" not in {column["name"] for column in inspect(engine).get_columns("movements")}
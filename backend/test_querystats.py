@@ -0,0 +1,85 @@
+"""
+Query stats: statements counted per request into Server-Timing, repeated
+shapes flagged as N+1, and the per-route report.
+"""
+from datetime import date
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from database import get_db
+import crud, models, querystats, schemas
+
+app = FastAPI()
+app.add_middleware(querystats.QueryStatsMiddleware)
+
+
+@app.get("/authors")
+def authors(db: Session = Depends(get_db)):
+    # Lazy load of Movement.user per row: the classic N+1
+    return [movement.user.username for movement in db.query(models.Movement).all()]
+
+
+@app.get("/count")
+def count(db: Session = Depends(get_db)):
+    return db.query(models.Movement).count()
+
+
+@pytest.fixture(scope="module")
+def client(override_get_db):
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app)
+
+
+def test_server_timing_and_n_plus_one(client, db, family, add_movement):
+    for i in range(6):
+        user = crud.create_user(db, schemas.UserCreate(username=f"qs{i}", password="x", family_id=family.id))
+        add_movement(family.id, 1, date(2025, 1, 1), user_id=user.id)
+    querystats.reset()
+
+    timing = client.get("/count").headers["server-timing"]
+    assert timing.startswith('db;desc="1 queries";dur=') and "app;dur=" in timing
+    assert client.get("/authors").headers["server-timing"].startswith('db;desc="7 queries"')
+
+    routes = {row["route"]: row for row in querystats.report()}
+    assert routes["GET /count"]["n_plus_one_requests"] == 0
+    assert routes["GET /authors"]["n_plus_one_requests"] == 1
+    assert "FROM users WHERE users.id = ?" in routes["GET /authors"]["n_plus_one_suspects"][0]
+    assert querystats.report(order_by="queries")[0]["route"] == "GET /authors"
+
+
+def test_shape():
+    assert querystats.shape("SELECT x FROM t WHERE id IN (?, ?,\n ?)") == "SELECT x FROM t WHERE id IN (?)"
+
+
+@app.get("/search")
+def search(db: Session = Depends(get_db)):
+    querystats.set_family(7)
+    return db.query(models.Movement).filter(models.Movement.description == "x").count()
+
+
+def test_slow_query_log(monkeypatch, client):
+    monkeypatch.setattr(querystats, "SLOW_QUERY_SECONDS", 1e-9)  # everything is slow
+    querystats.reset_slow_queries()
+    explained = []
+    explain = querystats.explain
+    monkeypatch.setattr(querystats, "explain", lambda *args: explained.append(1) or explain(*args))
+
+    client.get("/search")
+    client.get("/search")
+
+    log = querystats.slow_queries(family_id=7)
+    statement = next(group for group in log["statements"] if "movements.description = ?" in group["statement"])
+    assert statement["count"] == 2 and statement["routes"] == ["GET /search"] and statement["families"] == [7]
+    assert statement["full_scans"] == ["movements"] and any("SCAN movements" in line for line in statement["plan"])
+    assert len(explained) == 1  # plan captured once per shape
+    recent = log["recent"][0]
+    assert recent["parameters"] == "(str)" and recent["family_id"] == 7
+    assert all(entry["full_scans"] for entry in querystats.slow_queries(full_scans_only=True)["recent"])
+
+
+def test_parameter_shape():
+    assert querystats.parameter_shape((1, "a"), False) == "(int, str)"
+    assert querystats.parameter_shape([(1,), (2,)], True) == "(int) x 2"
@@ -0,0 +1,60 @@
+"""
+Reference-data cache: repeat reads skip SQL, writes invalidate only their
+collection and family, and a session sees its own uncommitted writes.
+"""
+from sqlalchemy import insert
+
+from database import unit_of_work
+import crud, models, refcache, responsecache, schemas
+
+
+def test_read_through_and_invalidation(db, family, statements):
+    crud.create_category(db, schemas.CategoryCreate(name="Casa"), family_id=family.id)
+    crud.create_or_update_budget(db, schemas.BudgetCreate(category="Casa", amount=300, applicable_months=[1, 2]), family_id=family.id)
+
+    assert [c.name for c in crud.get_categories(db, family.id)] == ["Casa"]
+    budgets = crud.get_budgets(db, family.id)
+    statements.clear()
+    assert crud.get_categories(db, family.id)[0].name == "Casa"
+    assert [b.amount for b in crud.get_budgets_for_month(db, 2, family.id)] == [300]
+    assert crud.get_budgets_for_month(db, 3, family.id) == []
+    assert statements == []
+    assert schemas.Budget.model_validate(budgets[0], from_attributes=True).applicable_months == [1, 2]
+
+    # A category write drops the categories only
+    crud.create_category(db, schemas.CategoryCreate(name="Svago"), family_id=family.id)
+    statements.clear()
+    assert [c.name for c in crud.get_categories(db, family.id)] == ["Casa", "Svago"]
+    crud.get_budgets(db, family.id)
+    assert len(statements) == 1
+
+    stats = refcache.stats()
+    assert stats["categories"]["invalidations"] >= 1 and stats["budgets"]["hits"] >= 3
+
+
+def test_session_sees_its_uncommitted_writes(db, family):
+    assert crud.get_recurring_expenses(db, family.id) == []
+    with unit_of_work(db):
+        crud.create_recurring_expense(db, schemas.RecurringExpenseCreate(name="Palestra", amount=40, category="Svago",
+                                                                         applicable_months=[3, 9]),
+                                      user_id=1, family_id=family.id)
+        rules = crud.get_recurring_expenses(db, family.id)
+        assert [rule.name for rule in rules] == ["Palestra"]
+        assert rules[0].applicable_months == (3, 9) and rules[0].amount == 40
+    assert len(crud.get_recurring_expenses(db, family.id, user_id=1)) == 1
+    assert crud.get_recurring_expenses(db, family.id, user_id=2) == []
+
+
+def test_shared_generation_drops_entries(monkeypatch, tmp_path, db, family):
+    # With the shared response cache, another worker's write (bumping the shared
+    # generation) must not be answered from this worker's copy
+    path = str(tmp_path / "cache.db")
+    monkeypatch.setattr(responsecache, "store", responsecache.SqliteStore(path))
+    crud.create_category(db, schemas.CategoryCreate(name="Casa"), family_id=family.id)
+    assert [c.name for c in crud.get_categories(db, family.id)] == ["Casa"]
+
+    db.execute(insert(models.Category).values(name="Svago", family_id=family.id))  # no change published here
+    db.commit()
+    assert [c.name for c in crud.get_categories(db, family.id)] == ["Casa"]
+    responsecache.SqliteStore(path).bump(family.id)  # the other worker's commit
+    assert [c.name for c in crud.get_categories(db, family.id)] == ["Casa", "Svago"]
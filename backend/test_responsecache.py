@@ -0,0 +1,63 @@
+"""
+Response cache: hits skip the build, family writes invalidate, ETags give 304,
+and the LRU and the shared store stay within bounds.
+"""
+from datetime import date
+
+from fastapi import Request
+
+import crud, responsecache, schemas
+
+
+def request(path="/api/dashboard/summary", query=b"year=2025&month=3", etag=None):
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query, "headers": headers})
+
+
+def test_cache_etag_and_invalidation(monkeypatch, db, family, add_movement):
+    monkeypatch.setattr(responsecache, "store", responsecache.MemoryStore())
+    builds = []
+
+    def build():
+        builds.append(1)
+        return crud.get_monthly_aggregates(db, 2025, 3, family.id)
+
+    first = responsecache.respond(request(), family.id, build)
+    assert first.status_code == 200 and first.headers["etag"]
+    # Same query, parameters in another order: served from the cache
+    again = responsecache.respond(request(query=b"month=3&year=2025"), family.id, build)
+    assert again.body == first.body and len(builds) == 1
+    assert responsecache.respond(request(etag=first.headers["etag"]), family.id, build).status_code == 304
+
+    # Another family's write does not invalidate
+    other = crud.create_family(db, schemas.FamilyCreate(name="Response cache other"))
+    crud.create_category(db, schemas.CategoryCreate(name="Svago"), family_id=other.id)
+    responsecache.respond(request(), family.id, build)
+    assert len(builds) == 1
+
+    add_movement(family.id, 9, date(2025, 3, 2))
+    changed = responsecache.respond(request(etag=first.headers["etag"]), family.id, build)
+    assert len(builds) == 2 and changed.status_code == 200 and changed.headers["etag"] != first.headers["etag"]
+
+
+def test_memory_lru_bound():
+    store = responsecache.MemoryStore(max_bytes=25)
+    for i in range(5):
+        store.set(f"k{i}", "e", b"x" * 10)
+    assert store.get("k0") is None and store.get("k4") == ("e", b"x" * 10)
+    assert store._size <= 25
+
+
+def test_shared_store(tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer, reader = responsecache.SqliteStore(path, max_bytes=25), responsecache.SqliteStore(path, max_bytes=25)
+    writer.bump(7)
+    writer.bump(7)
+    assert reader.generation(7) == 2 and reader.generation(8) == 0
+
+    for i in range(5):
+        writer.set(f"k{i}", "e", b"x" * 10)
+    reader.get("k0")  # recently used
+    writer.evict()
+    assert reader.get("k0") == ("e", b"x" * 10) and reader.get("k4") == ("e", b"x" * 10)
+    assert reader.get("k1") is None
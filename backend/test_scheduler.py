@@ -0,0 +1,85 @@
+"""
+Scheduler checks: cron arithmetic, one lease per job across workers, retries.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, delete
+from sqlalchemy.orm import sessionmaker
+
+import models, scheduler
+
+calls = []
+
+
+@scheduler.job("test_flaky", max_attempts=2)
+def flaky(db, payload):
+    calls.append(payload)
+    if payload.get("fail"):
+        raise RuntimeError("boom")
+
+
+@pytest.fixture
+def Session(engine):
+    # Scheduler sessions, on an empty job table
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    with Session() as db:
+        db.execute(delete(models.JobRun))
+        db.execute(delete(models.Job))
+        db.commit()
+    return Session
+
+
+def test_cron_next_after():
+    moment = datetime(2025, 1, 31, 23, 59, 30)
+    assert scheduler.Cron("*/15 * * * *").next_after(moment) == datetime(2025, 2, 1, 0, 0)
+    assert scheduler.Cron("15 3 * * *").next_after(moment) == datetime(2025, 2, 1, 3, 15)
+    assert scheduler.Cron("0 9 1 */3 *").next_after(moment) == datetime(2025, 4, 1, 9, 0)
+    assert scheduler.Cron("0 8 * * 1-5").next_after(datetime(2025, 2, 7, 9)) == datetime(2025, 2, 10, 8, 0)  # Fri -> Mon
+    assert scheduler.Cron("0 0 29 2 *").next_after(moment) == datetime(2028, 2, 29, 0, 0)
+
+
+def test_one_worker_per_job(Session):
+    now = datetime(2025, 3, 1, 12, 0)
+    with Session() as db:
+        scheduler.enqueue(db, "test_flaky", {"fail": False}, run_at=now)
+
+    first = scheduler.Scheduler(Session, worker_id="a")
+    second = scheduler.Scheduler(Session, worker_id="b")
+    with Session() as db:
+        job_id = db.execute(select(models.Job.id)).scalars().first()
+        assert first._lease(db, job_id, now) is not None
+        assert second._lease(db, job_id, now) is None  # leased by "a"
+        # An expired lease (crashed worker) can be taken over
+        assert second._lease(db, job_id, now + timedelta(seconds=scheduler.LEASE_SECONDS + 1)) is not None
+
+
+def test_retries_then_fails(Session):
+    now = datetime(2025, 3, 1, 12, 0)
+    worker = scheduler.Scheduler(Session, worker_id="a")
+    with Session() as db:
+        db_job = scheduler.enqueue(db, "test_flaky", {"fail": True}, run_at=now)
+
+    calls.clear()
+    assert worker.run_pending(now) == 1
+    with Session() as db:
+        retried = db.get(models.Job, db_job.id)
+        assert retried.status == "scheduled" and retried.attempts == 1 and retried.lease_owner is None
+        assert retried.next_run_at > now
+
+    assert worker.run_pending(retried.next_run_at) == 1
+    with Session() as db:
+        assert db.get(models.Job, db_job.id).status == "failed"
+        runs = db.execute(select(models.JobRun).where(models.JobRun.job_id == db_job.id)).scalars().all()
+        assert [run.status for run in runs] == ["error", "error"]
+        assert all(run.duration_ms is not None for run in runs)
+    assert len(calls) == 2
+
+
+def test_periodic_jobs_are_registered_once(Session):
+    now = datetime(2025, 3, 1, 12, 0)
+    scheduler.Scheduler(Session, worker_id="a").sync_periodic(now)
+    scheduler.Scheduler(Session, worker_id="b").sync_periodic(now)
+    with Session() as db:
+        names = db.execute(select(models.Job.name).where(models.Job.schedule.is_not(None))).scalars().all()
+    assert sorted(names) == sorted(scheduler.PERIODIC)
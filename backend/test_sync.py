@@ -0,0 +1,44 @@
+"""
+Delta sync: a replica built from successive pages matches the database, and
+later calls return only what changed, including deletes.
+"""
+from datetime import date
+
+import crud, schemas, sync
+
+
+def test_paginated_sync_and_deltas(db, family, add_movement):
+    other = crud.create_family(db, schemas.FamilyCreate(name="Sync other"))
+    movements = [add_movement(family.id, amount) for amount in range(1, 6)]
+    add_movement(other.id, 99)
+    category = crud.create_category(db, schemas.CategoryCreate(name="Casa"), family_id=family.id)
+    crud.create_savings_goal(db, schemas.SavingsGoalCreate(name="Vacanze", target_amount=500), family_id=family.id)
+
+    # Initial replica in pages of 3
+    replica, since, pages = {}, 0, 0
+    while True:
+        page = sync.changes_since(db, family.id, since, limit=3)
+        pages += 1
+        for row in page["movements"]:
+            replica[row.id] = row.amount
+        since = page["version"]
+        if not page["has_more"]:
+            break
+    assert pages == 3
+    assert replica == {m.id: m.amount for m in movements}
+
+    # Nothing new: empty delta, same version
+    empty = sync.changes_since(db, family.id, since)
+    assert empty["version"] == since and empty["movements"] == [] and not empty["has_more"]
+
+    crud.update_movement(db, movements[0].id, schemas.MovementCreate(type="EXPENSE", date=date(2025, 3, 1), amount=10, category="Casa"), family_id=family.id)
+    crud.delete_movement(db, movements[1].id, family_id=family.id)
+    crud.delete_category(db, category.id, family_id=family.id)
+    delta = sync.changes_since(db, family.id, since)
+    assert [(m.id, m.amount) for m in delta["movements"]] == [(movements[0].id, 10)]
+    assert delta["deleted"]["movements"] == [movements[1].id]
+    assert delta["deleted"]["categories"] == [category.id]
+    assert delta["savings_goals"] == []
+
+    # Each row appears once, with its latest state
+    assert sync.changes_since(db, family.id, 0, limit=100)["deleted"]["movements"] == [movements[1].id]
@@ -0,0 +1,118 @@
+"""
+Database-per-family tenancy: the engine router keeps a bounded LRU of open
+engines, bound sessions read and write the family's own file, and
+split_tenants moves every family table out of the shared database.
+"""
+import os
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import create_engine, func, select
+
+from database import SessionLocal
+import alerts, anomalies, crud, models, schemas, split_tenants, sync, tenancy  # noqa: F401  (alerts and sync log listeners)
+
+TODAY = date.today()
+
+
+def test_router_evicts_least_recently_used_and_idle_engines(monkeypatch, per_family):
+    clock = [1000.0]
+    monkeypatch.setattr(tenancy.time, "monotonic", lambda: clock[0])
+    router = tenancy.TenantEngineRouter(max_engines=2, idle_seconds=60)
+
+    first = router.get_engine(1)
+    router.get_engine(2)
+    assert router.get_engine(1) is first  # reused, and now the most recently used
+    router.get_engine(3)
+    assert router.open_engines() == [1, 3]  # 2 was the least recently used
+
+    # Engines unused for idle_seconds are closed on the next lookup, whatever the LRU size
+    clock[0] += 30
+    router.get_engine(3)
+    clock[0] += 45
+    router.get_engine(4)
+    assert router.open_engines() == [3, 4]
+    clock[0] += 60
+    router.get_engine(4)
+    assert router.open_engines() == [4]  # the engine in use is never evicted
+
+    # An evicted family gets a new engine on its file, migrated again
+    reopened = router.get_engine(1)
+    assert reopened is not first
+    assert os.path.exists(tenancy.tenant_db_path(1))
+    with reopened.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(models.Category.__table__)).scalar() == 0
+    for family_id in router.open_engines():
+        router.dispose(family_id)
+
+
+def count(engine, model, family_id):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(model.__table__)
+                            .where(model.family_id == family_id)).scalar()
+
+
+def test_bound_session_uses_family_database(per_family, engine, db):
+    rossi = crud.create_family(db, schemas.FamilyCreate(name="Rossi"))
+    bianchi = crud.create_family(db, schemas.FamilyCreate(name="Bianchi"))
+
+    for family, category in ((rossi, "Casa"), (bianchi, "Auto")):
+        with SessionLocal(bind=engine) as family_db:
+            tenancy.bind_session(family_db, family.id)
+            crud.create_category(family_db, schemas.CategoryCreate(name=category), family_id=family.id)
+            movement = schemas.MovementCreate(type="EXPENSE", date=TODAY, amount=10, category=category)
+            crud.create_movement(family_db, movement, user_id=1, family_id=family.id)
+
+    rossi_engine, bianchi_engine = per_family.get_engine(rossi.id), per_family.get_engine(bianchi.id)
+    assert (count(rossi_engine, models.Movement, rossi.id), count(rossi_engine, models.Movement, bianchi.id)) == (1, 0)
+    assert (count(bianchi_engine, models.Movement, bianchi.id), count(bianchi_engine, models.Movement, rossi.id)) == (1, 0)
+    assert count(engine, models.Movement, rossi.id) == count(engine, models.Movement, bianchi.id) == 0
+
+    # Reads go to the family database too; shared tables stay in the shared one
+    with SessionLocal(bind=engine) as family_db:
+        tenancy.bind_session(family_db, rossi.id)
+        assert [category.name for category in crud.get_categories(family_db, rossi.id)] == ["Casa"]
+        assert [movement.category for movement in crud.get_movements(family_db, rossi.id)] == ["Casa"]
+        assert family_db.get(models.Family, bianchi.id).name == "Bianchi"
+
+
+def dump(engine, family_id):
+    """Every tenant-table row of the family, by table, sorted by id."""
+    with engine.connect() as conn:
+        return {
+            table.name: [dict(row) for row in conn.execute(
+                select(table).where(table.c.family_id == family_id).order_by(table.c.id)
+            ).mappings()]
+            for table in tenancy.TENANT_TABLES
+        }
+
+
+def test_split_moves_every_family_table(monkeypatch, per_family, engine, db, add_movement):
+    monkeypatch.setattr(split_tenants, "engine", engine)
+    monkeypatch.setattr(split_tenants, "CHUNK_SIZE", 2)  # several chunks per table
+    families = [crud.create_family(db, schemas.FamilyCreate(name=name)) for name in ("Verdi", "Neri")]
+    for family in families:
+        crud.create_category(db, schemas.CategoryCreate(name="Casa"), family_id=family.id)
+        crud.create_or_update_budget(db, schemas.BudgetCreate(category="Casa", amount=100), family_id=family.id)
+        crud.create_recurring_expense(db, schemas.RecurringExpenseCreate(name="Affitto", amount=700, category="Affitto"),
+                                      user_id=1, family_id=family.id)
+        crud.create_savings_goal(db, schemas.SavingsGoalCreate(name="Vacanze", target_amount=1000), family_id=family.id)
+        for months_back in (1, 2, 3):
+            add_movement(family.id, 50, TODAY - relativedelta(months=months_back))
+        for amount in (20, 30, 40, 5):
+            add_movement(family.id, amount, TODAY)  # the last ones cross the 80% and 100% budget alerts
+    anomalies.fold_all(db)
+    before = {family.id: dump(engine, family.id) for family in families}
+    for rows in before.values():
+        assert all(rows.values()), {table: len(table_rows) for table, table_rows in rows.items()}
+
+    split_tenants.split()
+    split_tenants.split(purge=True)  # the copy is skipped for tables already copied: no duplicates
+
+    for family in families:
+        tenant_engine = create_engine(f"sqlite:///{tenancy.tenant_db_path(family.id)}")
+        assert dump(tenant_engine, family.id) == before[family.id]
+        other = next(f.id for f in families if f.id != family.id)
+        assert not any(dump(tenant_engine, other).values())
+        tenant_engine.dispose()
+        assert not any(dump(engine, family.id).values())
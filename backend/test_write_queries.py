@@ -0,0 +1,138 @@
+"""
+Query-count checks for the crud write paths: each write should issue the
+minimum number of SQL statements (no refresh SELECT after commit).
+"""
+from contextlib import contextmanager
+from datetime import date
+
+import pytest
+
+import changes, crud, schemas
+
+
+@pytest.fixture
+def count_statements(statements):
+    @contextmanager
+    def count():
+        # Only the write itself: derived data maintained in the transaction
+        # (changes.listen(..., in_transaction=True)) is checked in its own tests
+        listeners = changes._in_transaction[:]
+        changes._in_transaction.clear()
+        statements.clear()
+        try:
+            yield statements
+        finally:
+            changes._in_transaction[:] = listeners
+    return count
+
+
+def make_movement(**overrides):
+    data = dict(type="EXPENSE", date=date(2025, 3, 10), amount=12.5, category="Casa")
+    data.update(overrides)
+    return schemas.MovementCreate(**data)
+
+
+def test_movement_writes(db, family, count_statements):
+
+    with count_statements() as executed:
+        movement = crud.create_movement(db, make_movement(), user_id=1, family_id=family.id)
+    assert len(executed) == 1, executed
+    assert movement.id and movement.created_at  # server default came back with the INSERT
+
+    with count_statements() as executed:
+        updated = crud.update_movement(db, movement.id, make_movement(amount=20), family_id=family.id, user_id=1)
+    assert len(executed) == 2, executed  # previous date (for change tracking) + update
+    assert updated.amount == 20
+
+    with count_statements() as executed:
+        deleted = crud.delete_movement(db, movement.id, family_id=family.id)
+    assert len(executed) == 1, executed  # DELETE ... RETURNING, no SELECT first
+    assert executed[0].startswith("DELETE FROM movements") and "RETURNING" in executed[0], executed
+    assert deleted.id == movement.id
+
+    # Other families' rows are not touched
+    with count_statements() as executed:
+        assert crud.delete_movement(db, movement.id, family_id=family.id + 1) is None
+    assert len(executed) == 1, executed
+
+
+def test_reference_data_writes(db, family, count_statements):
+
+    with count_statements() as executed:
+        category = crud.create_category(db, schemas.CategoryCreate(name="Svago"), family_id=family.id)
+    assert len(executed) == 1, executed
+
+    with count_statements() as executed:
+        crud.update_category(db, category.id, schemas.CategoryCreate(name="Tempo libero"), family_id=family.id)
+    assert len(executed) == 1, executed
+
+    with count_statements() as executed:
+        crud.create_or_update_budget(db, schemas.BudgetCreate(category="Svago", amount=100), family_id=family.id)
+    assert len(executed) == 2, executed  # lookup + insert
+
+    with count_statements() as executed:
+        goal = crud.create_savings_goal(db, schemas.SavingsGoalCreate(name="Vacanze", target_amount=1000), family_id=family.id)
+    assert len(executed) == 1, executed
+
+    with count_statements() as executed:
+        crud.update_savings_goal(db, goal.id, schemas.SavingsGoalUpdate(current_amount=50), family_id=family.id)
+    assert len(executed) == 1, executed
+
+
+def test_confirm_recurring_occurrence(db, family, count_statements):
+    db_recurring = crud.create_recurring_expense(
+        db, schemas.RecurringExpenseCreate(name="Palestra", amount=40, category="Svago",
+                                           start_date=date(2024, 5, 1), end_date=date(2024, 5, 31)),
+        user_id=1, family_id=family.id
+    )
+    planned = crud.get_movements(db, family.id)[0]
+    assert planned.id < 0 and planned.is_planned and planned.date == date(2024, 5, 1)
+
+    with count_statements() as executed:
+        confirmed = crud.confirm_recurring_occurrence(db, db_recurring.id, planned.date, family_id=family.id, user_id=1)
+    assert len(executed) == 3, executed  # rule + existing confirmation lookup + insert
+    assert confirmed.id > 0 and confirmed.is_confirmed and not confirmed.is_planned
+
+    # Confirming twice returns the same movement, and the occurrence is no longer projected
+    assert crud.confirm_recurring_occurrence(db, db_recurring.id, planned.date, family_id=family.id).id == confirmed.id
+    assert [m.id for m in crud.get_movements(db, family.id)] == [confirmed.id]
+    # Not an occurrence of the rule
+    assert crud.confirm_recurring_occurrence(db, db_recurring.id, date(2024, 5, 2), family_id=family.id) is None
+
+
+def test_recurring_expense_writes(db, family, count_statements):
+    recurring = schemas.RecurringExpenseCreate(
+        name="Affitto", amount=700, category="Casa", day_of_month=31,
+        start_date=date(2025, 1, 1), end_date=date(2025, 12, 31),
+    )
+
+    # Only the rule is written, whatever the horizon: occurrences are projected
+    with count_statements() as executed:
+        db_recurring = crud.create_recurring_expense(db, recurring, user_id=1, family_id=family.id)
+    assert len(executed) == 1, executed
+    dates = [m.date for m in crud.get_movements(db, family.id, limit=100)]
+    assert len(dates) == 12
+    assert date(2025, 2, 28) in dates and date(2025, 4, 30) in dates  # day 31 clamped per month
+    assert [m.date for m in crud.get_movements(db, family.id, month=4, year=2025)] == [date(2025, 4, 30)]
+    assert crud.get_movements(db, family.id, limit=100, include_planned=False) == []
+
+    quarterly = recurring.copy(update={"recurrence_type": "quarterly", "applicable_months": [1, 7]})
+    with count_statements() as executed:
+        crud.update_recurring_expense(db, db_recurring.id, quarterly, family_id=family.id)
+    assert len(executed) == 1, executed
+    dates = sorted(m.date for m in crud.get_movements(db, family.id, limit=100))
+    assert dates == [date(2025, 1, 31), date(2025, 7, 31)]
+
+    aggregates = crud.get_monthly_aggregates(db, 2025, 7, family.id)
+    assert aggregates["expense"] == 700
+
+    # Soft delete: UPDATE ... RETURNING, no SELECT first
+    with count_statements() as executed:
+        assert crud.delete_recurring_expense(db, db_recurring.id, family_id=family.id + 1) is None
+    assert len(executed) == 1, executed
+    with count_statements() as executed:
+        deleted = crud.delete_recurring_expense(db, db_recurring.id, family_id=family.id)
+    assert len(executed) == 1, executed
+    assert executed[0].startswith("UPDATE recurring_expenses") and "RETURNING" in executed[0], executed
+    assert deleted.id == db_recurring.id and not deleted.is_active
+    assert crud.get_movements(db, family.id, limit=100) == []
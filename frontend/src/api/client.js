@@ -4,4 +4,23 @@ const api = axios.create({
     baseURL: '/api',
 });
 
+// Several GETs in one round trip (POST /api/batch): resolves to [{ data }] in the same order,
+// like Promise.all over api.get, and rejects if any of them failed.
+export const batchGet = async (requests) => {
+    const res = await api.post('/batch/', {
+        requests: requests.map(([path, params]) => {
+            const query = params ? `?${new URLSearchParams(params)}` : '';
+            return { path: `/api${path}${query}` };
+        })
+    });
+    return res.data.responses.map((item, i) => {
+        if (item.status >= 400) {
+            const error = new Error(`GET ${requests[i][0]} failed with status ${item.status}`);
+            error.response = { status: item.status, data: item.body };
+            throw error;
+        }
+        return { data: item.body, status: item.status };
+    });
+};
+
 export default api;
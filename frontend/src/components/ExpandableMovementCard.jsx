@@ -1,5 +1,5 @@
 import React, { useState } from 'react';
-import { TrendingUp, TrendingDown, Edit2, Trash2, ChevronDown, ChevronUp } from 'lucide-react';
+import { TrendingUp, TrendingDown, Edit2, Trash2, ChevronDown, ChevronUp, Check } from 'lucide-react';
 import api from '../api/client';
 
 const ExpandableMovementCard = ({ movement, onUpdate, onDelete }) => {
@@ -59,6 +59,17 @@ const ExpandableMovementCard = ({ movement, onUpdate, onDelete }) => {
         }
     };
 
+    const handleConfirm = async () => {
+        try {
+            await api.post(`/recurring/${movement.from_recurring_id}/confirm`, null, {
+                params: { occurrence_date: movement.date }
+            });
+            onUpdate();
+        } catch (error) {
+            console.error("Error confirming movement", error);
+        }
+    };
+
     const handleCancel = () => {
         setFormData({
             type: movement.type,
@@ -144,6 +155,18 @@ const ExpandableMovementCard = ({ movement, onUpdate, onDelete }) => {
                                     <p className="text-slate-800 mt-1">{movement.description}</p>
                                 </div>
                             )}
+                            {movement.id < 0 ? (
+                            /* Planned recurring occurrence: it can only be confirmed */
+                            <div className="flex space-x-2 pt-2">
+                                <button
+                                    onClick={(e) => { e.stopPropagation(); handleConfirm(); }}
+                                    className="flex-1 bg-emerald-600 text-white px-4 py-2 rounded-lg hover:bg-emerald-700 transition-colors flex items-center justify-center space-x-2 text-sm font-medium"
+                                >
+                                    <Check size={16} />
+                                    <span>Conferma pagamento</span>
+                                </button>
+                            </div>
+                            ) : (
                             <div className="flex space-x-2 pt-2">
                                 <button
                                     onClick={(e) => { e.stopPropagation(); handleEdit(); }}
@@ -160,6 +183,7 @@ const ExpandableMovementCard = ({ movement, onUpdate, onDelete }) => {
                                     <span>Elimina</span>
                                 </button>
                             </div>
+                            )}
                         </div>
                     ) : (
                         /* Edit Mode */
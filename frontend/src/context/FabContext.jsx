@@ -1,20 +1,88 @@
-import React, { createContext, useContext, useState } from 'react';
+import React, { createContext, useContext, useEffect, useRef, useState } from 'react';
+import { useAuth } from './AuthContext';
+import api from '../api/client';
+
+const RECONNECT_DELAY_MS = 3000;
 
 const FabContext = createContext();
 
 export const FabProvider = ({ children }) => {
+    const { user } = useAuth();
+
     // Default date for new movements (defaults to today)
     const [fabDate, setFabDate] = useState(new Date().toISOString().split('T')[0]);
 
     // Trigger to notify pages that a movement was added
     const [lastUpdate, setLastUpdate] = useState(Date.now());
+    // Last change received from the live feed: { entity, action, ids, periods } (null periods = any)
+    const [lastChange, setLastChange] = useState(null);
+    const refreshTimer = useRef(null);
 
     const triggerUpdate = () => {
         setLastUpdate(Date.now());
     };
 
+    // Live feed: changes made by other family members refresh the open pages
+    useEffect(() => {
+        if (!user || typeof EventSource === 'undefined') return;
+
+        // The stream is opened with a single-use ticket, never with the access token in the URL.
+        // A ticket cannot be reused, so reconnections are done here with a new one instead of
+        // by the browser, resuming after the last event received.
+        let source = null;
+        let reconnectTimer = null;
+        let lastEventId = null;
+        let stopped = false;
+
+        const scheduleRefresh = () => {
+            // Bursts of events (bulk edits) cause a single refetch
+            clearTimeout(refreshTimer.current);
+            refreshTimer.current = setTimeout(triggerUpdate, 300);
+        };
+        const reconnect = () => {
+            clearTimeout(reconnectTimer);
+            reconnectTimer = setTimeout(connect, RECONNECT_DELAY_MS);
+        };
+        const connect = async () => {
+            let ticket;
+            try {
+                ticket = (await api.post('/events/ticket')).data.ticket;
+            } catch {
+                if (!stopped) reconnect();
+                return;
+            }
+            if (stopped) return;
+
+            const params = new URLSearchParams({ ticket });
+            if (lastEventId) params.set('last_event_id', lastEventId);
+            source = new EventSource(`/api/events?${params}`);
+            source.addEventListener('change', (e) => {
+                lastEventId = e.lastEventId;
+                setLastChange(JSON.parse(e.data));
+                scheduleRefresh();
+            });
+            source.addEventListener('reset', (e) => {
+                lastEventId = e.lastEventId;
+                setLastChange(null);
+                scheduleRefresh();
+            });
+            source.onerror = () => {
+                source.close();
+                reconnect();
+            };
+        };
+        connect();
+
+        return () => {
+            stopped = true;
+            clearTimeout(reconnectTimer);
+            clearTimeout(refreshTimer.current);
+            if (source) source.close();
+        };
+    }, [user]);
+
     return (
-        <FabContext.Provider value={{ fabDate, setFabDate, lastUpdate, triggerUpdate }}>
+        <FabContext.Provider value={{ fabDate, setFabDate, lastUpdate, lastChange, triggerUpdate }}>
             {children}
         </FabContext.Provider>
     );
@@ -46,17 +46,9 @@ const Budgets = () => {
 
     const handleEdit = (budget) => {
         setEditingBudget(budget);
-        // Parse applicable_months from JSON string
-        let months = null;
-        let applyToAll = true;
-        if (budget.applicable_months) {
-            try {
-                months = JSON.parse(budget.applicable_months);
-                applyToAll = false;
-            } catch (e) {
-                console.error("Error parsing applicable_months", e);
-            }
-        }
+        // applicable_months: null = all months, or the list of month numbers
+        const months = budget.applicable_months || null;
+        const applyToAll = months === null;
         setFormData({
             category: budget.category,
             amount: budget.amount,
@@ -308,17 +300,12 @@ const Budgets = () => {
                                     </div>
                                     {/* NEW: Show applicable months if specified */}
                                     {budget.applicable_months && (() => {
-                                        try {
-                                            const months = JSON.parse(budget.applicable_months);
-                                            const monthNames = ['Gen', 'Feb', 'Mar', 'Apr', 'Mag', 'Giu', 'Lug', 'Ago', 'Set', 'Ott', 'Nov', 'Dic'];
-                                            return (
-                                                <p className="text-xs text-slate-500 mt-1">
-                                                    📅 {months.map(m => monthNames[m - 1]).join(', ')}
-                                                </p>
-                                            );
-                                        } catch (e) {
-                                            return null;
-                                        }
+                                        const monthNames = ['Gen', 'Feb', 'Mar', 'Apr', 'Mag', 'Giu', 'Lug', 'Ago', 'Set', 'Ott', 'Nov', 'Dic'];
+                                        return (
+                                            <p className="text-xs text-slate-500 mt-1">
+                                                📅 {budget.applicable_months.map(m => monthNames[m - 1]).join(', ')}
+                                            </p>
+                                        );
                                     })()}
                                     <p className="text-sm text-slate-500 mt-1">
                                         <span className="font-medium text-slate-700">€ {expense.toFixed(2)}</span>
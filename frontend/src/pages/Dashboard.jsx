@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import api from '../api/client';
+import { batchGet } from '../api/client';
 import { TrendingUp, TrendingDown, Wallet, Target, AlertCircle } from 'lucide-react';
 import MonthSelector from '../components/MonthSelector';
 import { useFab } from '../context/FabContext';
@@ -32,10 +32,10 @@ const Dashboard = () => {
         setIsTransitioning(true);
         try {
             const params = { month: selectedMonth, year: selectedYear };
-            const [summaryRes, budgetRes, movementsRes] = await Promise.all([
-                api.get('/dashboard/summary', { params }),
-                api.get('/dashboard/budget-status', { params }),
-                api.get('/movements', { params }) // Fetch movements
+            const [summaryRes, budgetRes, movementsRes] = await batchGet([
+                ['/dashboard/summary', params],
+                ['/dashboard/budget-status', params],
+                ['/movements/', params] // Fetch movements
             ]);
             setSummary(summaryRes.data);
             setBudgetStatus(budgetRes.data.budgets || budgetRes.data);
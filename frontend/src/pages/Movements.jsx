@@ -1,6 +1,6 @@
 import React, { useEffect, useState, useMemo } from 'react';
 import api from '../api/client';
-import { Plus, Trash2, Edit2, TrendingUp, TrendingDown, Calendar, Repeat, Filter, X } from 'lucide-react';
+import { Plus, Trash2, Edit2, TrendingUp, TrendingDown, Calendar, Repeat, Filter, X, Check } from 'lucide-react';
 import { useFab } from '../context/FabContext';
 
 const Movements = () => {
@@ -188,6 +188,18 @@ const Movements = () => {
         }
     };
 
+    // Planned recurring occurrences (negative id) are not stored: confirming one creates the movement
+    const handleConfirm = async (movement) => {
+        try {
+            await api.post(`/recurring/${movement.from_recurring_id}/confirm`, null, {
+                params: { occurrence_date: movement.date }
+            });
+            fetchMovements();
+        } catch (error) {
+            console.error("Error confirming movement", error);
+        }
+    };
+
     const monthsShort = ['Gen', 'Feb', 'Mar', 'Apr', 'Mag', 'Giu', 'Lug', 'Ago', 'Set', 'Ott', 'Nov', 'Dic'];
 
     return (
@@ -379,6 +391,15 @@ const Movements = () => {
                                                         )}
                                                     </div>
                                                     <div className="flex space-x-1 opacity-0 group-hover:opacity-100 transition-opacity">
+                                                        {m.id < 0 ? (
+                                                        <button
+                                                            onClick={() => handleConfirm(m)}
+                                                            title="Conferma pagamento"
+                                                            className="p-2 text-emerald-600 hover:bg-emerald-50 rounded-lg transition-colors"
+                                                        >
+                                                            <Check size={16} />
+                                                        </button>
+                                                        ) : (<>
                                                         <button
                                                             onClick={() => handleEdit(m)}
                                                             className="p-2 text-blue-600 hover:bg-blue-50 rounded-lg transition-colors"
@@ -391,6 +412,7 @@ const Movements = () => {
                                                         >
                                                             <Trash2 size={16} />
                                                         </button>
+                                                        </>)}
                                                     </div>
                                                 </div>
                                             </div>
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import api from '../api/client';
+import api, { batchGet } from '../api/client';
 import { Plus, Edit2, Trash2, Calendar } from 'lucide-react';
 
 const RecurringExpenses = () => {
@@ -19,9 +19,9 @@ const RecurringExpenses = () => {
 
     const fetchData = async () => {
         try {
-            const [recurringRes, categoriesRes] = await Promise.all([
-                api.get('/recurring'),
-                api.get('/categories')
+            const [recurringRes, categoriesRes] = await batchGet([
+                ['/recurring/'],
+                ['/categories/']
             ]);
             setRecurringExpenses(recurringRes.data);
             setCategories(categoriesRes.data);
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import api from '../api/client';
+import api, { batchGet } from '../api/client';
 import { Plus, Trash2, User, Shield, ShieldAlert, Pencil, Mail } from 'lucide-react';
 
 const Users = () => {
@@ -19,18 +19,21 @@ const Users = () => {
         }
     };
 
-    const fetchFamilies = async () => { // NEW
+    const fetchData = async () => {
         try {
-            const res = await api.get('/families');
-            setFamilies(res.data);
+            const [usersRes, familiesRes] = await batchGet([
+                ['/users/'],
+                ['/families/']
+            ]);
+            setUsers(usersRes.data);
+            setFamilies(familiesRes.data);
         } catch (error) {
-            console.error("Error fetching families", error);
+            console.error("Error fetching data", error);
         }
     };
 
     useEffect(() => {
-        fetchUsers();
-        fetchFamilies(); // NEW
+        fetchData();
     }, []);
 
     const handleSubmit = async (e) => {